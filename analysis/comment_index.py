@@ -0,0 +1,150 @@
+"""
+Comment analytics joined to songs
+Comments are grouped by song once per load: per-song engagement and
+like-weighted sentiment become a song_id-indexed frame, per-artist figures are
+summed from it through the artist credits, and the comments themselves are
+kept sorted by (song_id, likes) so a song's most liked comments are a slice.
+Requests read these tables and never scan the comments again.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis.interned import InternedLists
+from analysis.sentiment_scorer import SENTIMENT_LABELS
+
+# Columns of the per-song and per-artist tables that can be ranked by
+ENGAGEMENT_METRICS = ['comments', 'likes', 'weighted_score', 'weighted_positive_pct', 'weighted_negative_pct']
+
+# Comment columns returned with top comments
+COMMENT_FIELDS = ['song_id', 'content', 'liked_count', 'time', 'sentiment']
+
+# Internal sums the weighted figures are derived from
+_SUMS = ['comments', 'likes', 'weight', 'weighted_score_sum'] + [f'weighted_{label}' for label in SENTIMENT_LABELS]
+
+
+def _json_value(value):
+    """A cell as a plain Python value, missing values (a comment without a time or text) as None"""
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _finish(sums: pd.DataFrame) -> pd.DataFrame:
+    """Engagement table from summed columns: counts, likes and like-weighted sentiment"""
+    weight = sums['weight'].where(sums['weight'] > 0)
+    table = pd.DataFrame({
+        'comments': sums['comments'].astype(np.int64),
+        'likes': sums['likes'].astype(np.int64),
+        'weighted_score': (sums['weighted_score_sum'] / weight).fillna(0.0).round(4),
+    }, index=sums.index)
+    for label in SENTIMENT_LABELS:
+        table[label] = sums[label].astype(np.int64)
+        table[f'weighted_{label}_pct'] = (sums[f'weighted_{label}'] / weight * 100).fillna(0.0).round(2)
+    return table
+
+
+class CommentIndex:
+    """Per-song and per-artist comment engagement plus comments sorted by song and likes"""
+
+    def __init__(self, df_comments: pd.DataFrame, df_songs: pd.DataFrame, credits: InternedLists):
+        self.song_ids = df_songs['id'].values if 'id' in df_songs.columns else np.empty(0, dtype=np.int64)
+        sums = self._song_sums(df_comments)
+
+        # One row per song in df_songs order (songs without comments get zeros)
+        aligned = sums.reindex(self.song_ids, fill_value=0)
+        self.songs = _finish(aligned)
+        self.songs.index.name = 'song_id'
+        for column in ('artist_name', 'name'):
+            if column in df_songs.columns:
+                self.songs.insert(0, column, df_songs[column].values)
+
+        # Artist sums through the credits: every credited artist gets the song's comments
+        if len(credits.values) and len(aligned):
+            credited = aligned.iloc[credits.entry_rows()]
+            artist_sums = credited.groupby(credits.ids, sort=True).sum()
+            artist_sums.index = credits.values[artist_sums.index]
+            self.artists = _finish(artist_sums)
+            self.artists.insert(0, 'songs', np.bincount(credits.ids, minlength=len(credits.values)))
+        else:
+            self.artists = _finish(pd.DataFrame(columns=_SUMS + list(SENTIMENT_LABELS), dtype=np.int64))
+            self.artists.insert(0, 'songs', np.empty(0, dtype=np.int64))
+        self.artists.index.name = 'artist'
+
+        # Comments by song, most liked first within each song; the index makes a song's comments a slice
+        fields = [column for column in COMMENT_FIELDS if column in df_comments.columns]
+        if 'song_id' in df_comments.columns and 'liked_count' in df_comments.columns:
+            order = np.lexsort((-df_comments['liked_count'].values, df_comments['song_id'].values))
+            self.comments = df_comments[fields].iloc[order].set_index('song_id', drop=False)
+        else:
+            self.comments = pd.DataFrame(columns=COMMENT_FIELDS).set_index('song_id', drop=False)
+        # Where each song row's comments start in the sorted comments
+        self.comment_starts = self.comments.index.searchsorted(self.song_ids, side='left').astype(np.int64)
+
+    @staticmethod
+    def _song_sums(df_comments: pd.DataFrame) -> pd.DataFrame:
+        """Summed engagement columns per song_id, one groupby over the comments"""
+        if df_comments.empty or 'song_id' not in df_comments.columns:
+            return pd.DataFrame(columns=_SUMS + list(SENTIMENT_LABELS), dtype=np.int64)
+        likes = (df_comments['liked_count'].fillna(0).values.astype(np.int64) if 'liked_count' in df_comments.columns
+                 else np.zeros(len(df_comments), dtype=np.int64))
+        scores = (df_comments['sentiment_score'].values if 'sentiment_score' in df_comments.columns
+                  else np.zeros(len(df_comments)))
+        # A comment counts once plus once per like
+        weight = 1 + likes
+        columns = {
+            'song_id': df_comments['song_id'].values,
+            'comments': np.ones(len(df_comments), dtype=np.int64),
+            'likes': likes,
+            'weight': weight,
+            'weighted_score_sum': scores * weight,
+        }
+        labels = df_comments['sentiment'] if 'sentiment' in df_comments.columns else None
+        for label in SENTIMENT_LABELS:
+            is_label = (labels == label).values if labels is not None else np.zeros(len(df_comments), dtype=bool)
+            columns[label] = is_label.astype(np.int64)
+            columns[f'weighted_{label}'] = is_label * weight
+        return pd.DataFrame(columns).groupby('song_id', sort=True).sum()
+
+    def song_comment_counts(self) -> np.ndarray:
+        """Number of comments per song row"""
+        return self.songs['comments'].values
+
+    def top_songs(self, metric: str, top_n: int, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Songs (optionally only the given rows) with the highest metric"""
+        songs = self.songs if rows is None else self.songs.iloc[rows]
+        return songs[songs['comments'] > 0].nlargest(top_n, metric)
+
+    def top_artists(self, metric: str, top_n: int) -> pd.DataFrame:
+        """Artists with the highest metric over the songs they are credited on"""
+        return self.artists[self.artists['comments'] > 0].nlargest(top_n, metric)
+
+    def top_comments(self, top_n: int, song_rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Most liked comments, optionally only on the songs at the given rows"""
+        if song_rows is None:
+            return self.comments.nlargest(top_n, 'liked_count')
+        # Each song's comments are sorted by likes, so only its first top_n can make the cut
+        starts = self.comment_starts[song_rows]
+        lengths = np.minimum(self.song_comment_counts()[song_rows], top_n)
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.comments.iloc[positions].nlargest(top_n, 'liked_count')
+
+    def song_comments(self, song_id: int, top_n: int) -> pd.DataFrame:
+        """A song's most liked comments, a slice of the sorted comments"""
+        start = self.comments.index.searchsorted(song_id, side='left')
+        stop = self.comments.index.searchsorted(song_id, side='right')
+        return self.comments.iloc[start:min(stop, start + top_n)]
+
+    def song(self, song_id: int) -> Optional[pd.DataFrame]:
+        """The engagement row of a song, None for unknown ids"""
+        positions = self.songs.index.get_indexer_for([song_id])
+        return self.songs.iloc[positions[:1]] if positions[0] >= 0 else None
+
+    @staticmethod
+    def records(frame: pd.DataFrame) -> List[Dict]:
+        """Rows as JSON-ready dicts"""
+        if frame.index.name is not None and frame.index.name not in frame.columns:
+            frame = frame.reset_index()
+        return [{column: _json_value(value) for column, value in zip(frame.columns, row)}
+                for row in frame.itertuples(index=False)]
@@ -2,91 +2,400 @@
 Data analysis module for music data
 Provides various analysis functions for the visualization
 """
+import functools
+import inspect
 import json
+import os
+import sys
+import threading
 import pandas as pd
 import numpy as np
-from collections import Counter
-from datetime import datetime
-from typing import Dict, List
-import jieba
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from storage.music_store import data_exists, open_store
+except ImportError:  # running as a script: python analysis/data_analyzer.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from storage.music_store import data_exists, open_store
+from analysis.comment_index import ENGAGEMENT_METRICS, CommentIndex
+from analysis.facet_index import SongFacetIndex, SongQuery
+from analysis.genre_classifier import OTHER_GENRE, GenreClassifier
+from analysis.interned import InternedLists
+from analysis.result_cache import CacheEntry, ResultCache
+from analysis.rollups import comment_rollup, release_rollup
+from analysis.sentiment_scorer import SentimentScorer
+from analysis.sketches import DatasetSketches
+from analysis.term_index import TermIndex, document_keys, top_terms
+from monitoring.metrics import REGISTRY
+
+ANALYZER_SECONDS = REGISTRY.histogram('music_analyzer_method_duration_seconds',
+                                      'Analysis method run time on result cache misses', ['method'])
+LOAD_SECONDS = REGISTRY.histogram('music_analyzer_load_duration_seconds',
+                                  'Analyzer (re)load time by stage', ['stage'])
+
+# Term index kind -> (frame attribute, song id column, text column)
+TERM_SOURCES = {
+    'name': ('df_songs', 'id', 'name'),
+    'comment': ('df_comments', 'song_id', 'content'),
+}
+
+# How analyze_top_artists credits a song: to its first artist or to each of them
+ARTIST_CREDITS = ['primary', 'all']
+
+# List-valued song columns, kept interned (see interned) instead of as a Python list per row
+LIST_COLUMNS = ['artists', 'playlists']
+
+# Dashboard section -> the aggregate it shows, computed once per dataset
+DASHBOARD_SECTIONS = {
+    'overview': ('get_data_overview', {}),
+    'release_trend': ('analyze_release_trend', {}),
+    'album_types': ('analyze_album_types', {}),
+    'music_genres': ('analyze_music_genres', {}),
+    'top_album_types': ('analyze_top_album_types', {'top_n': 10}),
+    'top_artists': ('analyze_top_artists', {'top_n': 5}),
+    'wordcloud': ('generate_wordcloud_data', {}),
+    'sentiment': ('analyze_sentiment', {}),
+}
+DASHBOARD_QUERIES = list(DASHBOARD_SECTIONS.values())
+
+
+def cached_analysis(method):
+    """Serve an analysis method from the analyzer's result cache, keyed by its arguments"""
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._cached_entry(method, signature, args, kwargs).result
+    
+    wrapper.signature = signature
+    return wrapper
 
 
 class MusicDataAnalyzer:
     """Analyze music data for visualization"""
     
-    def __init__(self, data_file: str = 'data/music_data.json'):
+    term_sources = TERM_SOURCES
+    
+    def __init__(self, data_file: str = 'data/music_data.json',
+                 song_columns: Optional[List[str]] = None,
+                 comment_columns: Optional[List[str]] = None,
+                 precompute: bool = True, auto_refresh: bool = True,
+                 genre_keywords: Optional[Dict[str, List[str]]] = None,
+                 sentiment_scorer: Optional[SentimentScorer] = None,
+                 term_index: Optional[TermIndex] = None, approximate: bool = False):
+        """
+        data_file may be a .json file or a .db SQLite store (see storage.music_store),
+        or a directory or glob of them read in parallel as one dataset
+        song_columns/comment_columns restrict loading to the columns that are needed
+        precompute fills the result cache with the dashboard aggregates at load
+        auto_refresh reloads in place when the data changes; turn it off when an
+        AnalyzerReloader swaps in new snapshots instead
+        genre_keywords overrides the genre -> keywords table (see genre_classifier)
+        sentiment_scorer scores every comment once at load (see sentiment_scorer)
+        term_index keeps segmented song names and comments across loads, by
+        default in <data file>.terms.db (see term_index)
+        approximate answers the unfiltered overview, top artists, word cloud and
+        sentiment from mergeable sketches with error bounds (see sketches)
+        """
         self.data_file = data_file
-        self.data = self._load_data()
-        self.df_songs = self._create_songs_dataframe()
-        self.df_comments = self._create_comments_dataframe()
-    
-    def _load_data(self) -> Dict:
-        """Load data from JSON file"""
-        try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
+        self.store = open_store(data_file)
+        self.song_columns = song_columns
+        self.comment_columns = comment_columns
+        self.precompute = precompute
+        self.auto_refresh = auto_refresh
+        self.approximate = approximate
+        self.genre_classifier = GenreClassifier(genre_keywords)
+        self.sentiment_scorer = sentiment_scorer or SentimentScorer()
+        self.term_index = term_index or TermIndex.for_data_file(data_file)
+        # The dashboard aggregates, a fixed set of keys kept for the whole snapshot
+        self.cache = ResultCache()
+        # Results parameterized by a request (filters, ids, artists, top_n) can take
+        # any value, keep the most recent ones
+        self.query_cache = ResultCache(max_entries=1024, name='queries')
+        self._dashboard_keys = {
+            self._cache_key(getattr(type(self), name).__wrapped__, getattr(type(self), name).signature, (), kwargs)
+            for name, kwargs in DASHBOARD_QUERIES
+        }
+        self._reload_lock = threading.RLock()
+        self.data_mtime = self.store.mtime()
+        self._load()
+    
+    def _load(self):
+        """(Re)build the frames and the result cache from the data store"""
+        with LOAD_SECONDS.time(stage='read'):
+            self.version = self.store.content_hash()
+            songs, comments = self._load_data()
+        with LOAD_SECONDS.time(stage='frames'):
+            self.df_songs = self._create_songs_dataframe(songs)
+            self.df_comments = self._create_comments_dataframe(comments)
+        with LOAD_SECONDS.time(stage='indexes'):
+            # Day-level rollups, trends at any granularity are read from these
+            self.rollups = {
+                'releases': release_rollup(self.df_songs),
+                'comments': comment_rollup(self.df_comments),
+            }
+            # Approximate mode answers the dashboard from sketches, the exact
+            # indexes wait for the first filtered or engagement request
+            self._facets = None
+            self._comment_index = None
+            if not self.approximate:
+                self._facets = SongFacetIndex(self.df_songs, self.credits)
+                self._comment_index = CommentIndex(self.df_comments, self.df_songs, self.credits)
+        with LOAD_SECONDS.time(stage='terms'):
+            self._index_terms()
+        if self.approximate:
+            with LOAD_SECONDS.time(stage='sketches'):
+                self.sketches = DatasetSketches.from_frames(self.df_songs, self.df_comments, self.credits,
+                                                            self.term_docs, self.term_counts)
+        self.cache.clear()
+        self.query_cache.clear()
+        if self.precompute:
+            with LOAD_SECONDS.time(stage='precompute'):
+                self.precompute_aggregates()
+    
+    def precompute_aggregates(self):
+        """Fill the result cache with every dashboard aggregate"""
+        for name, kwargs in DASHBOARD_QUERIES:
+            self.get_entry(name, **kwargs)
+        self.dashboard_entry().compressed('gzip')
+    
+    def refresh_if_changed(self) -> bool:
+        """Reload and drop cached results when the data file's mtime and content hash changed"""
+        if not self.auto_refresh:
+            return False
+        mtime = self.store.mtime()
+        if mtime == self.data_mtime:
+            return False
+        
+        with self._reload_lock:
+            if mtime == self.data_mtime:
+                return False
+            self.data_mtime = mtime
+            # A touched but unchanged file keeps its cache
+            if self.store.content_hash() == self.version:
+                return False
+            self._load()
+            return True
+    
+    @property
+    def last_modified(self) -> Optional[datetime]:
+        """Modification time of the loaded data file"""
+        if not self.data_mtime:
+            return None
+        return datetime.fromtimestamp(int(self.data_mtime), tz=timezone.utc)
+    
+    def _cache_key(self, method: Callable, signature: inspect.Signature, args: tuple, kwargs: dict) -> tuple:
+        """Method name and every argument, defaults filled in"""
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        return (method.__name__,) + tuple(list(bound.arguments.items())[1:])
+    
+    def _cached_entry(self, method: Callable, signature: inspect.Signature,
+                      args: tuple, kwargs: dict) -> CacheEntry:
+        key = self._cache_key(method, signature, args, kwargs)
+        self.refresh_if_changed()
+        cache = self.cache if key in self._dashboard_keys else self.query_cache
+        
+        def compute():
+            with ANALYZER_SECONDS.time(method=method.__name__):
+                return method(self, *args, **kwargs)
+        
+        return cache.get_or_compute(key, compute)
+    
+    def get_entry(self, name: str, *args, **kwargs) -> CacheEntry:
+        """Cached result of an analysis method along with its serialized JSON body"""
+        wrapper = getattr(type(self), name)
+        return self._cached_entry(wrapper.__wrapped__, wrapper.signature, args, kwargs)
+    
+    def dashboard_entry(self, sections: Optional[List[str]] = None) -> CacheEntry:
+        """Several dashboard sections (all by default) in one pre-serialized response"""
+        unknown = set(sections or []) - set(DASHBOARD_SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown dashboard sections {sorted(unknown)}, expected some of {list(DASHBOARD_SECTIONS)}")
+        # Canonical order, so ?sections=a,b and ?sections=b,a share one entry
+        names = tuple(name for name in DASHBOARD_SECTIONS if not sections or name in sections)
+        self.refresh_if_changed()
+        return self.cache.get_or_compute(('dashboard', names), lambda: CacheEntry.combine({
+            name: self.get_entry(DASHBOARD_SECTIONS[name][0], **DASHBOARD_SECTIONS[name][1]) for name in names
+        }))
+    
+    def cached(self, key: str, compute: Callable) -> CacheEntry:
+        """Cache a result derived from this dataset (e.g. sentiment) until the data changes"""
+        self.refresh_if_changed()
+        return self.cache.get_or_compute(('derived', key), compute)
+    
+    def _load_data(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Load raw song and comment frames from the data store"""
+        if not data_exists(self.data_file):
             print(f"Data file {self.data_file} not found")
-            return {'songs': [], 'comments': []}
+            return pd.DataFrame(), pd.DataFrame()
+        return self.store.read_frames(self.song_columns, self.comment_columns)
+    
+    @property
+    def credits(self) -> InternedLists:
+        """Artists of every song row, interned"""
+        credits = self.song_lists.get('artists')
+        return credits if credits is not None else InternedLists.empty(len(self.df_songs))
     
-    def _create_songs_dataframe(self) -> pd.DataFrame:
-        """Create DataFrame from songs data"""
-        songs = self.data.get('songs', [])
-        if not songs:
+    def _create_songs_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Create DataFrame from songs data, list columns go to song_lists"""
+        self.song_lists: Dict[str, InternedLists] = {}
+        if df.empty:
             return pd.DataFrame()
         
-        df = pd.DataFrame(songs)
-        
         # Convert publish_time to datetime
         if 'publish_time' in df.columns:
             df['publish_date'] = pd.to_datetime(df['publish_time'], unit='ms', errors='coerce')
             df['publish_year'] = df['publish_date'].dt.year
             df['publish_month'] = df['publish_date'].dt.month
         
-        # Flatten artists list
-        if 'artists' in df.columns:
-            df['artist_name'] = df['artists'].apply(lambda x: ', '.join(x) if x else 'Unknown')
-            df['primary_artist'] = df['artists'].apply(lambda x: x[0] if x and len(x) > 0 else 'Unknown')
+        # Intern the list columns: a value table plus CSR arrays instead of a list of strings per row
+        for column in LIST_COLUMNS:
+            if column in df.columns:
+                self.song_lists[column] = InternedLists.from_series(df.pop(column))
+        
+        # Artist credits as categorical columns
+        if 'artists' in self.song_lists:
+            df['artist_name'] = self.credits.joined(', ', 'Unknown').values
+            df['primary_artist'] = self.credits.first('Unknown').values
+        
+        # Classify genres once at load instead of per request
+        if 'name' in df.columns and 'album' in df.columns:
+            df['genre'] = self.genre_classifier.classify(df['name'], df['album'])
         
         return df
     
-    def _create_comments_dataframe(self) -> pd.DataFrame:
+    def _create_comments_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create DataFrame from comments data"""
-        comments = self.data.get('comments', [])
-        if not comments:
+        if df.empty:
             return pd.DataFrame()
         
-        df = pd.DataFrame(comments)
-        
         # Convert time to datetime
         if 'time' in df.columns:
             df['comment_date'] = pd.to_datetime(df['time'], unit='ms', errors='coerce')
         
+        # Score each comment once per load, requests only aggregate the labels
+        if 'content' in df.columns:
+            scores = self.sentiment_scorer.score(df['content'])
+            df['sentiment_score'] = scores
+            df['sentiment'] = self.sentiment_scorer.label(scores)
+        
         return df
     
-    def get_data_overview(self) -> Dict:
+    @property
+    def facets(self) -> SongFacetIndex:
+        """Facet indexes over the songs, built on first use"""
+        if self._facets is None:
+            with self._reload_lock:
+                if self._facets is None:
+                    self._facets = SongFacetIndex(self.df_songs, self.credits)
+        return self._facets
+    
+    @property
+    def comment_index(self) -> CommentIndex:
+        """Comments grouped by song once, engagement views read from it; built on first use"""
+        if self._comment_index is None:
+            with self._reload_lock:
+                if self._comment_index is None:
+                    self._comment_index = CommentIndex(self.df_comments, self.df_songs, self.credits)
+        return self._comment_index
+    
+    @property
+    def song_comment_counts(self) -> np.ndarray:
+        """Number of comments per song row"""
+        return self.comment_index.song_comment_counts()
+    
+    def select_songs(self, query: Optional[SongQuery] = None) -> Optional[np.ndarray]:
+        """Row positions of the songs matching query from the facet indexes, None for all songs"""
+        if query is None or query.is_empty():
+            return None
+        return self.facets.rows(query)
+    
+    def _use_sketches(self, query: Optional[SongQuery] = None) -> bool:
+        """Whether to answer from the sketches: approximate mode, over the whole dataset"""
+        return self.approximate and (query is None or query.is_empty())
+    
+    def _songs(self, query: Optional[SongQuery] = None) -> pd.DataFrame:
+        """Songs matching query, the full frame when there is no filter"""
+        rows = self.select_songs(query)
+        if rows is None or self.df_songs.empty:
+            return self.df_songs
+        return self.df_songs.iloc[rows]
+    
+    def _index_terms(self):
+        """Segment texts the term index hasn't seen and load the term counts of this snapshot"""
+        self.term_docs = {}
+        self.term_counts = {}
+        for kind, (frame_name, _, text_column) in TERM_SOURCES.items():
+            frame = getattr(self, frame_name)
+            if frame.empty or text_column not in frame.columns:
+                continue
+            texts = frame[text_column].astype(object).fillna('').astype(str)
+            docs = document_keys(texts)
+            self.term_index.update(kind, docs, texts.tolist())
+            self.term_docs[kind] = docs
+            self.term_counts[kind] = self.term_index.terms(kind, docs)
+    
+    def _term_words(self, source: str, song_ids=None, top_n: int = 100,
+                    song_rows: Optional[np.ndarray] = None) -> Dict:
+        """Top terms of a source, optionally restricted to some songs (by id or row position)"""
+        if source not in TERM_SOURCES:
+            raise ValueError(f"Unknown term source {source!r}, expected one of {list(TERM_SOURCES)}")
+        docs = self.term_docs.get(source)
+        if docs is None:
+            return {'words': []}
+        
+        if song_rows is not None and source == 'name':
+            # Name documents are aligned with the song rows
+            docs = docs[song_rows]
+        elif song_rows is not None or song_ids is not None:
+            if song_ids is None:
+                song_ids = self.df_songs['id'].values[song_rows]
+            frame_name, id_column, _ = TERM_SOURCES[source]
+            frame = getattr(self, frame_name)
+            if id_column not in frame.columns:
+                return {'words': []}
+            docs = docs[frame[id_column].isin(song_ids).values]
+        
+        top_words = top_terms(self.term_counts[source], docs, top_n)
+        return {
+            'words': [{'text': word, 'value': count} for word, count in top_words]
+        }
+    
+    @cached_analysis
+    def get_data_overview(self, query: Optional[SongQuery] = None) -> Dict:
         """Get overview statistics"""
+        if self._use_sketches(query):
+            return self.sketches.overview()
+        rows = self.select_songs(query)
+        df_songs = self._songs(query)
+        # With filters, only comments on the matching songs count
+        total_comments = len(self.df_comments) if rows is None else int(self.song_comment_counts[rows].sum())
         return {
-            'total_songs': len(self.df_songs),
-            'total_artists': self.df_songs['primary_artist'].nunique() if not self.df_songs.empty else 0,
-            'total_albums': self.df_songs['album'].nunique() if not self.df_songs.empty else 0,
-            'total_comments': len(self.df_comments),
+            'total_songs': len(df_songs),
+            'total_artists': df_songs['primary_artist'].nunique() if not df_songs.empty else 0,
+            'total_albums': df_songs['album'].nunique() if not df_songs.empty else 0,
+            'total_comments': total_comments,
             'date_range': {
-                'start': str(self.df_songs['publish_date'].min()) if not self.df_songs.empty else 'N/A',
-                'end': str(self.df_songs['publish_date'].max()) if not self.df_songs.empty else 'N/A'
+                'start': str(df_songs['publish_date'].min()) if not df_songs.empty else 'N/A',
+                'end': str(df_songs['publish_date'].max()) if not df_songs.empty else 'N/A'
             }
         }
     
-    def analyze_album_types(self) -> Dict:
+    @cached_analysis
+    def analyze_album_types(self, query: Optional[SongQuery] = None) -> Dict:
         """Analyze different album types distribution"""
-        if self.df_songs.empty or 'album_type' not in self.df_songs.columns:
+        df_songs = self._songs(query)
+        if df_songs.empty or 'album_type' not in df_songs.columns:
             return {'labels': [], 'data': [], 'popularity': {}}
         
         # Count by album type
-        type_counts = self.df_songs['album_type'].value_counts().to_dict()
+        type_counts = df_songs['album_type'].value_counts()
+        type_counts = type_counts[type_counts > 0].to_dict()
         
         # Average popularity by album type
-        type_popularity = self.df_songs.groupby('album_type')['popularity'].mean().to_dict()
+        type_popularity = df_songs.groupby('album_type', observed=True)['popularity'].mean().to_dict()
         
         return {
             'labels': list(type_counts.keys()),
@@ -94,13 +403,29 @@ class MusicDataAnalyzer:
             'popularity': type_popularity
         }
     
-    def analyze_release_trend(self) -> Dict:
-        """Analyze music release trend over time"""
-        if self.df_songs.empty or 'publish_year' not in self.df_songs.columns:
+    @cached_analysis
+    def analyze_release_trend(self, query: Optional[SongQuery] = None) -> Dict:
+        """
+        Analyze music release trend over time
+        Only the unfiltered trend (query is None) is read from the release
+        rollup, a filtered one counts the matching songs' publish years
+        """
+        if query is None:
+            # Yearly counts straight from the release rollup
+            yearly = self.rollups['releases'].table('year')['releases']
+            years = yearly.index.astype(int)
+            yearly = yearly[(years > 1900) & (years <= datetime.now().year)]
+            return {
+                'years': [int(year) for year in yearly.index],
+                'counts': yearly.values.tolist()
+            }
+        
+        df_songs = self._songs(query)
+        if df_songs.empty or 'publish_year' not in df_songs.columns:
             return {'years': [], 'counts': []}
         
         # Filter out invalid years
-        df_valid = self.df_songs[self.df_songs['publish_year'].notna()]
+        df_valid = df_songs[df_songs['publish_year'].notna()]
         df_valid = df_valid[df_valid['publish_year'] > 1900]
         df_valid = df_valid[df_valid['publish_year'] <= datetime.now().year]
         
@@ -112,98 +437,188 @@ class MusicDataAnalyzer:
             'counts': year_counts.values.tolist()
         }
     
-    def analyze_music_genres(self) -> Dict:
+    @cached_analysis
+    def analyze_trend(self, series: str = 'comments', granularity: str = 'month',
+                      start: Optional[str] = None, end: Optional[str] = None) -> Dict:
+        """Release or comment (likes, sentiment) counts per year/month/day bucket"""
+        if series not in self.rollups:
+            raise ValueError(f"Unknown trend series {series!r}, expected one of {list(self.rollups)}")
+        table = self.rollups[series].table(granularity, start, end)
+        result = {'granularity': granularity, 'buckets': table.index.tolist()}
+        for metric in table.columns:
+            result[metric] = table[metric].tolist()
+        return result
+    
+    @cached_analysis
+    def analyze_music_genres(self, query: Optional[SongQuery] = None) -> Dict:
         """Analyze music genre distribution"""
         # Note: NetEase API doesn't always provide genre info
         # We'll use album_type as a proxy or implement genre detection
-        if self.df_songs.empty:
+        df_songs = self._songs(query)
+        if df_songs.empty:
             return {'labels': [], 'data': []}
         
-        # For demo purposes, we'll use album names to infer genres
-        # In production, you'd use proper genre classification
-        genre_keywords = {
-            '流行': ['流行', 'Pop', 'popular'],
-            '摇滚': ['摇滚', 'Rock', 'rock'],
-            '古典': ['古典', 'Classical', 'classic'],
-            '民谣': ['民谣', 'Folk', 'folk'],
-            '电子': ['电子', 'Electronic', 'EDM'],
-            '说唱': ['说唱', 'Rap', 'Hip-Hop', 'hip-hop'],
-            '爵士': ['爵士', 'Jazz', 'jazz'],
-            '其他': []
-        }
-        
-        def classify_genre(name, album):
-            text = f"{name} {album}".lower()
-            for genre, keywords in genre_keywords.items():
-                if genre == '其他':
-                    continue
-                for keyword in keywords:
-                    if keyword.lower() in text:
-                        return genre
-            return '其他'
-        
-        if 'name' in self.df_songs.columns and 'album' in self.df_songs.columns:
-            self.df_songs['genre'] = self.df_songs.apply(
-                lambda x: classify_genre(str(x['name']), str(x['album'])), axis=1
-            )
-            genre_counts = self.df_songs['genre'].value_counts().to_dict()
+        # Genres are inferred from song and album names at load (see genre_classifier)
+        if 'genre' in df_songs.columns:
+            genre_counts = df_songs['genre'].value_counts()
+            genre_counts = genre_counts[genre_counts > 0].to_dict()
         else:
-            genre_counts = {'其他': len(self.df_songs)}
+            genre_counts = {OTHER_GENRE: len(df_songs)}
         
         return {
             'labels': list(genre_counts.keys()),
             'data': list(genre_counts.values())
         }
     
-    def analyze_top_album_types(self, top_n: int = 10) -> Dict:
+    @cached_analysis
+    def analyze_top_album_types(self, top_n: int = 10, query: Optional[SongQuery] = None) -> Dict:
         """Analyze top N album types"""
-        if self.df_songs.empty or 'album_type' not in self.df_songs.columns:
+        df_songs = self._songs(query)
+        if df_songs.empty or 'album_type' not in df_songs.columns:
             return {'labels': [], 'data': []}
         
-        top_types = self.df_songs['album_type'].value_counts().head(top_n)
+        top_types = df_songs['album_type'].value_counts()
+        top_types = top_types[top_types > 0].head(top_n)
         
         return {
             'labels': top_types.index.tolist(),
             'data': top_types.values.tolist()
         }
     
-    def analyze_top_artists(self, top_n: int = 5) -> Dict:
-        """Analyze top N artists by number of works"""
-        if self.df_songs.empty or 'primary_artist' not in self.df_songs.columns:
+    @cached_analysis
+    def analyze_top_artists(self, top_n: int = 5, query: Optional[SongQuery] = None,
+                            credits: str = 'primary') -> Dict:
+        """
+        Analyze top N artists by number of works
+        credits='all' counts a song for every artist credited on it, not just the first
+        """
+        if credits not in ARTIST_CREDITS:
+            raise ValueError(f"credits must be one of {ARTIST_CREDITS}")
+        if self._use_sketches(query):
+            return self.sketches.top(credits, top_n)
+        df_songs = self._songs(query)
+        if df_songs.empty or 'primary_artist' not in df_songs.columns:
             return {'labels': [], 'data': []}
         
-        top_artists = self.df_songs['primary_artist'].value_counts().head(top_n)
+        if credits == 'all':
+            top_artists = self.credits.value_counts(self.select_songs(query)).head(top_n)
+        else:
+            top_artists = df_songs['primary_artist'].value_counts()
+            top_artists = top_artists[top_artists > 0].head(top_n)
         
         return {
             'labels': top_artists.index.tolist(),
             'data': top_artists.values.tolist()
         }
     
-    def generate_wordcloud_data(self) -> Dict:
-        """Generate word cloud data from song names"""
-        if self.df_songs.empty or 'name' not in self.df_songs.columns:
+    @cached_analysis
+    def analyze_collaborations(self, top_n: int = 10, query: Optional[SongQuery] = None) -> Dict:
+        """Artist pairs credited together on the most songs"""
+        if self.df_songs.empty or 'artists' not in self.song_lists:
+            return {'labels': [], 'data': [], 'pairs': [], 'collaborative_songs': 0}
+        rows = self.select_songs(query)
+        lengths = self.credits.lengths() if rows is None else self.credits.lengths()[rows]
+        pairs = self.credits.pair_counts(rows).head(top_n)
+        return {
+            'labels': [f"{first} & {second}" for first, second in pairs.index],
+            'data': pairs.values.tolist(),
+            'pairs': [[first, second] for first, second in pairs.index],
+            'collaborative_songs': int((lengths > 1).sum()),
+        }
+    
+    @cached_analysis
+    def generate_wordcloud_data(self, source: str = 'name', top_n: int = 100,
+                                query: Optional[SongQuery] = None) -> Dict:
+        """Generate word cloud data from song names (or comment text with source='comment')"""
+        if self._use_sketches(query) and source in TERM_SOURCES:
+            return self.sketches.wordcloud(source, top_n)
+        # Texts are segmented with jieba once per distinct text, at load (see term_index)
+        return self._term_words(source, top_n=top_n, song_rows=self.select_songs(query))
+    
+    @cached_analysis
+    def song_terms(self, song_id: int, source: str = 'comment', top_n: int = 50) -> Dict:
+        """Top terms in one song's comments (or name)"""
+        return self._term_words(source, [song_id], top_n)
+    
+    @cached_analysis
+    def artist_terms(self, artist: str, source: str = 'comment', top_n: int = 50) -> Dict:
+        """Top terms in the comments (or names) of an artist's songs"""
+        if self.df_songs.empty or 'artists' not in self.song_lists:
             return {'words': []}
-        
-        # Combine all song names
-        all_names = ' '.join(self.df_songs['name'].astype(str).tolist())
-        
-        # Use jieba for Chinese word segmentation
-        words = jieba.cut(all_names)
-        
-        # Filter out common stop words and single characters
-        stop_words = {'的', '了', '和', '是', '就', '都', '而', '及', '与', '着', '之', '在', '有', '一', '不', '我', '你', '他'}
-        word_list = [word for word in words if len(word) > 1 and word not in stop_words]
-        
-        # Count word frequencies
-        word_freq = Counter(word_list)
-        
-        # Get top 100 words
-        top_words = word_freq.most_common(100)
-        
+        rows = self.select_songs(SongQuery(artist=artist))
+        return self._term_words(source, self.df_songs['id'].values[rows], top_n)
+    
+    @cached_analysis
+    def analyze_sentiment(self) -> Dict:
+        """Sentiment distribution of comments from the per-comment labels"""
+        if self.df_comments.empty or 'sentiment' not in self.df_comments.columns:
+            return {**self.sentiment_scorer.summarize([]), 'trend': []}
+        if self._use_sketches():
+            result = self.sketches.sentiment_summary()
+        else:
+            result = self.sentiment_scorer.summarize(self.df_comments['sentiment'])
+        # Monthly label counts from the comment rollup
+        monthly = self.rollups['comments'].table('month')
+        result['trend'] = [
+            {'month': month, 'positive': int(row.positive), 'neutral': int(row.neutral), 'negative': int(row.negative)}
+            for month, row in zip(monthly.index, monthly.itertuples())
+        ]
+        return result
+    
+    @cached_analysis
+    def analyze_song_engagement(self, top_n: int = 10, sort: str = 'comments',
+                                query: Optional[SongQuery] = None) -> Dict:
+        """Songs with the most comments (or likes, or like-weighted sentiment)"""
+        if sort not in ENGAGEMENT_METRICS:
+            raise ValueError(f"sort must be one of {ENGAGEMENT_METRICS}")
+        songs = self.comment_index.top_songs(sort, top_n, self.select_songs(query))
         return {
-            'words': [{'text': word, 'value': count} for word, count in top_words]
+            'labels': songs['name'].tolist() if 'name' in songs.columns else songs.index.tolist(),
+            'data': songs[sort].tolist(),
+            'songs': self.comment_index.records(songs),
         }
     
+    @cached_analysis
+    def analyze_artist_engagement(self, top_n: int = 10, sort: str = 'comments') -> Dict:
+        """Artists whose songs have the most comments (or likes, or like-weighted sentiment)"""
+        if sort not in ENGAGEMENT_METRICS:
+            raise ValueError(f"sort must be one of {ENGAGEMENT_METRICS}")
+        artists = self.comment_index.top_artists(sort, top_n)
+        return {
+            'labels': artists.index.tolist(),
+            'data': artists[sort].tolist(),
+            'artists': self.comment_index.records(artists),
+        }
+    
+    @cached_analysis
+    def song_comments(self, song_id: int, top_n: int = 10) -> Dict:
+        """One song's engagement and its most liked comments"""
+        song = self.comment_index.song(song_id)
+        if song is None:
+            return {'song': None, 'comments': []}
+        return {
+            'song': self.comment_index.records(song)[0],
+            'comments': self.comment_index.records(self.comment_index.song_comments(song_id, top_n)),
+        }
+    
+    @cached_analysis
+    def artist_comments(self, artist: str, top_n: int = 10) -> Dict:
+        """An artist's engagement and the most liked comments on their songs"""
+        if artist not in self.comment_index.artists.index:
+            return {'artist': None, 'comments': []}
+        rows = self.select_songs(SongQuery(artist=artist))
+        comments = self.comment_index.top_comments(top_n, rows)
+        return {
+            'artist': self.comment_index.records(self.comment_index.artists.loc[[artist]])[0],
+            'comments': self.comment_index.records(comments),
+        }
+    
+    @cached_analysis
+    def top_comments(self, top_n: int = 10, query: Optional[SongQuery] = None) -> Dict:
+        """Most liked comments, over all songs or those matching query"""
+        comments = self.comment_index.top_comments(top_n, self.select_songs(query))
+        return {'comments': self.comment_index.records(comments)}
+    
     def get_comments_for_sentiment(self) -> List[str]:
         """Get comment texts for sentiment analysis"""
         if self.df_comments.empty or 'content' not in self.df_comments.columns:
@@ -0,0 +1,152 @@
+"""
+Facet indexes over the songs frame
+Each facet value maps to the sorted row positions of the songs that have it
+(a posting list), and publish years are kept in sorted order, so a filtered
+query touches the rows of its most selective facet instead of the whole frame.
+"""
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis.interned import InternedLists
+
+# Query field -> songs column with one value per song
+VALUE_FACETS = {
+    'album_type': 'album_type',
+    'genre': 'genre',
+}
+
+
+class SongQuery(NamedTuple):
+    """Filters for a song-level aggregate, None means no filter"""
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    artist: Optional[str] = None
+    album_type: Optional[str] = None
+    genre: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+
+
+def _contains(postings: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Mask of rows present in a sorted posting list, O(len(rows) log len(postings))"""
+    if len(postings) == 0:
+        return np.zeros(len(rows), dtype=bool)
+    positions = np.minimum(np.searchsorted(postings, rows), len(postings) - 1)
+    return postings[positions] == rows
+
+
+class PostingLists:
+    """Value -> sorted row positions, stored as one CSR array"""
+
+    def __init__(self, values: pd.Index, value_codes: np.ndarray, rows: np.ndarray):
+        self.values = values
+        keep = value_codes >= 0
+        value_codes, rows = value_codes[keep], rows[keep]
+        order = np.lexsort((rows, value_codes))
+        self.rows = rows[order]
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(value_codes, minlength=len(values)))))
+
+    @classmethod
+    def from_codes(cls, column: pd.Series) -> 'PostingLists':
+        """Posting lists of a single-valued column"""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, values = column.cat.codes.values.astype(np.int64), column.cat.categories
+        else:
+            codes, values = pd.factorize(column)
+        return cls(pd.Index(values), codes, np.arange(len(column)))
+
+    @classmethod
+    def from_interned(cls, lists: InternedLists) -> 'PostingLists':
+        """Posting lists of an interned list column (a song is listed under each of its values)"""
+        return cls(lists.values, lists.ids.astype(np.int64), lists.entry_rows())
+
+    @classmethod
+    def from_lists(cls, column: pd.Series) -> 'PostingLists':
+        """Posting lists of a list-valued column (a song is listed under each of its values)"""
+        lengths = column.str.len().fillna(0).astype(np.int64).values
+        rows = np.repeat(np.arange(len(column)), lengths)
+        codes, values = pd.factorize(pd.Series([value for values in column if isinstance(values, list)
+                                                for value in values], dtype=object))
+        # A value listed twice on one song keeps one posting
+        pairs = np.unique(np.stack([codes, rows], axis=1), axis=0) if len(codes) else np.empty((0, 2), np.int64)
+        return cls(pd.Index(values), pairs[:, 0], pairs[:, 1])
+
+    def get(self, value) -> np.ndarray:
+        """Rows that have value, empty when the value is unknown"""
+        code = self.values.get_indexer([value])[0]
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.rows[self.offsets[code]:self.offsets[code + 1]]
+
+
+class SongFacetIndex:
+    """Posting lists per artist/album_type/genre and songs sorted by publish year"""
+
+    def __init__(self, df: pd.DataFrame, artists: Optional[InternedLists] = None):
+        """artists are the songs' interned artist credits, else read from an 'artists' list column"""
+        self.size = len(df)
+        self.facets: Dict[str, PostingLists] = {}
+        for field, column in VALUE_FACETS.items():
+            if column in df.columns:
+                self.facets[field] = PostingLists.from_codes(df[column])
+        if artists is not None:
+            self.facets['artist'] = PostingLists.from_interned(artists)
+        elif 'artists' in df.columns:
+            self.facets['artist'] = PostingLists.from_lists(df['artists'])
+
+        if 'publish_year' in df.columns:
+            years = df['publish_year'].values.astype(np.float64)
+            self.year_order = np.argsort(years, kind='stable')
+            self.sorted_years = years[self.year_order]
+            self.years = years
+        else:
+            self.years = None
+
+    def _year_bounds(self, query: SongQuery):
+        low = -np.inf if query.year_from is None else query.year_from
+        high = np.inf if query.year_to is None else query.year_to
+        return low, high
+
+    def rows(self, query: SongQuery) -> np.ndarray:
+        """Sorted row positions of the songs matching every filter in query"""
+        candidates = []
+        for field in ('artist', 'album_type', 'genre'):
+            value = getattr(query, field)
+            if value is None:
+                continue
+            if field not in self.facets:
+                return np.empty(0, dtype=np.int64)
+            candidates.append(('facet', field, self.facets[field].get(value)))
+
+        if query.year_from is not None or query.year_to is not None:
+            if self.years is None:
+                return np.empty(0, dtype=np.int64)
+            low, high = self._year_bounds(query)
+            start = np.searchsorted(self.sorted_years, low, side='left')
+            stop = np.searchsorted(self.sorted_years, high, side='right')
+            candidates.append(('year', None, (start, stop)))
+
+        if not candidates:
+            return np.arange(self.size)
+
+        def size(candidate):
+            kind, _, value = candidate
+            return value[1] - value[0] if kind == 'year' else len(value)
+
+        # Start from the most selective filter and check the others on its rows only
+        candidates.sort(key=size)
+        kind, field, value = candidates[0]
+        rows = np.sort(self.year_order[value[0]:value[1]]) if kind == 'year' else value
+        for kind, field, value in candidates[1:]:
+            if len(rows) == 0:
+                break
+            if kind == 'year':
+                low, high = self._year_bounds(query)
+                years = self.years[rows]
+                rows = rows[(years >= low) & (years <= high)]
+            else:
+                rows = rows[_contains(value, rows)]
+        return rows
@@ -0,0 +1,90 @@
+"""
+Keyword-based genre classification over song and album names
+"""
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+OTHER_GENRE = '其他'
+
+# Genre -> keywords, earlier genres win when several match
+DEFAULT_GENRE_KEYWORDS = {
+    '流行': ['流行', 'Pop', 'popular'],
+    '摇滚': ['摇滚', 'Rock', 'rock'],
+    '古典': ['古典', 'Classical', 'classic'],
+    '民谣': ['民谣', 'Folk', 'folk'],
+    '电子': ['电子', 'Electronic', 'EDM'],
+    '说唱': ['说唱', 'Rap', 'Hip-Hop', 'hip-hop'],
+    '爵士': ['爵士', 'Jazz', 'jazz'],
+}
+
+
+class GenreClassifier:
+    """
+    Classify songs by case-insensitive keyword matches in "name album"
+
+    Texts are joined into one newline-separated corpus, lowercased once, and
+    each genre's keywords are compiled into a single regex scanned over that
+    corpus in C. Match offsets are mapped back to rows with searchsorted, so
+    Python-level work is proportional to the number of matches, not rows.
+    Albums repeat a lot, so they are scanned once per distinct value.
+    """
+
+    def __init__(self, keywords: Optional[Dict[str, List[str]]] = None):
+        keywords = DEFAULT_GENRE_KEYWORDS if keywords is None else keywords
+        self.genres = [genre for genre, words in keywords.items() if genre != OTHER_GENRE and words]
+        self.patterns = [
+            re.compile('|'.join(re.escape(word.lower()) for word in keywords[genre]))
+            for genre in self.genres
+        ]
+        self.categories = self.genres + [OTHER_GENRE]
+        # A keyword containing a space could span the name/album boundary
+        self._split_fields = not any(re.search(r'\s', word)
+                                     for genre in self.genres for word in keywords[genre])
+
+    def _scan(self, texts: List[str]) -> List[np.ndarray]:
+        """Boolean row mask per genre, True where any of its keywords occurs"""
+        corpus = '\n'.join(texts)
+        lowered = corpus.lower()
+        if len(lowered) == len(corpus):
+            lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        else:
+            # Some characters change length when lowercased, lower row by row
+            texts = [text.lower() for text in texts]
+            lowered = '\n'.join(texts)
+            lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+        masks = []
+        for pattern in self.patterns:
+            mask = np.zeros(len(texts), dtype=bool)
+            positions = [match.start() for match in pattern.finditer(lowered)]
+            if positions:
+                mask[np.searchsorted(starts, positions, side='right') - 1] = True
+            masks.append(mask)
+        return masks
+
+    def classify(self, names: pd.Series, albums: pd.Series) -> pd.Series:
+        """Categorical genre for each row"""
+        if len(names) == 0:
+            return pd.Series(pd.Categorical([], categories=self.categories), index=names.index)
+
+        # Missing names and albums match nothing (astype(str) alone keeps NaN under pandas 3)
+        names = names.astype(object).fillna('').astype(str)
+        if self._split_fields:
+            album_codes, album_values = pd.factorize(albums)
+            name_masks = self._scan(names.tolist())
+            # Missing albums get code -1, which picks the trailing False
+            album_masks = [np.append(mask, False) for mask in self._scan([str(value) for value in album_values])]
+            masks = [name_mask | album_mask[album_codes]
+                     for name_mask, album_mask in zip(name_masks, album_masks)]
+        else:
+            masks = self._scan((names + ' ' + albums.astype(object).fillna('').astype(str)).tolist())
+
+        # np.select picks the first matching genre, i.e. the highest priority
+        codes = np.select(masks, np.arange(len(self.genres), dtype=np.int16),
+                          default=len(self.genres)) if masks else np.zeros(len(names), dtype=np.int16)
+        return pd.Series(pd.Categorical.from_codes(codes.astype(np.int16), categories=self.categories),
+                         index=names.index)
@@ -0,0 +1,134 @@
+"""
+Dictionary-encoded list columns
+A list-valued column (a song's artists or playlists) is stored as a table of
+its distinct values plus CSR arrays: ids holds the value codes of every row
+back to back and offsets[row]:offsets[row + 1] delimits one row's list. That
+takes a few bytes per entry instead of a Python list of strings per row, and
+per-value or per-pair aggregations become array operations.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class InternedLists:
+    """Value table plus CSR offsets/ids for a list-valued column, lists keep their order"""
+
+    def __init__(self, values: pd.Index, offsets: np.ndarray, ids: np.ndarray):
+        self.values = values
+        self.offsets = offsets
+        self.ids = ids
+
+    @classmethod
+    def empty(cls, rows: int = 0) -> 'InternedLists':
+        return cls(pd.Index([], dtype=object), np.zeros(rows + 1, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_series(cls, column: pd.Series) -> 'InternedLists':
+        """Intern a column of lists (missing values are empty lists); repeats within a list are dropped"""
+        lists = [values if isinstance(values, list) else [] for values in column]
+        lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+        codes, values = pd.factorize(pd.Series([value for values in lists for value in values], dtype=object))
+        rows = np.repeat(np.arange(len(lists), dtype=np.int64), lengths)
+
+        # Keep the first occurrence of a value within each list
+        if len(codes):
+            _, first = np.unique(rows * len(values) + codes, return_index=True)
+            first.sort()
+            if len(first) < len(codes):
+                codes, rows = codes[first], rows[first]
+                lengths = np.bincount(rows, minlength=len(lists))
+
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(pd.Index(values), offsets, codes.astype(np.int32))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.ids.nbytes + int(self.values.memory_usage(deep=True))
+
+    def lengths(self) -> np.ndarray:
+        """Number of values in each row's list"""
+        return np.diff(self.offsets)
+
+    def row(self, row: int) -> list:
+        """One row's list of values"""
+        return self.values[self.ids[self.offsets[row]:self.offsets[row + 1]]].tolist()
+
+    def entry_rows(self) -> np.ndarray:
+        """Row of every entry in ids"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.lengths())
+
+    def _select(self, rows: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """(lengths, ids) of the given rows, all rows for None"""
+        if rows is None:
+            return self.lengths(), self.ids
+        starts, lengths = self.offsets[rows], self.offsets[rows + 1] - self.offsets[rows]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return lengths, self.ids[positions]
+
+    def first(self, default: str) -> pd.Series:
+        """Categorical of each row's first value (default for empty lists), categories in order of appearance"""
+        lengths = self.lengths()
+        codes = np.full(len(self), -1, dtype=np.int64)
+        has_values = lengths > 0
+        codes[has_values] = self.ids[self.offsets[:-1][has_values]]
+        default_code = self.values.get_indexer([default])[0] if len(self.values) else -1
+        if default_code >= 0:
+            codes[~has_values] = default_code
+
+        order = pd.unique(codes)
+        categories = [default if code < 0 else self.values[code] for code in order]
+        lookup = np.empty(len(self.values) + 1, dtype=np.int64)
+        # code -1 lands in the last slot
+        lookup[order] = np.arange(len(order))
+        return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=categories))
+
+    def joined(self, separator: str, default: str) -> pd.Series:
+        """Categorical of each row's values joined by separator (default for empty lists)"""
+        lengths = self.lengths()
+        joined = np.full(len(self), default, dtype=object)
+        single = lengths == 1
+        joined[single] = self.values[self.ids[self.offsets[:-1][single]]]
+        for row in np.flatnonzero(lengths > 1):
+            joined[row] = separator.join(map(str, self.row(row)))
+        return pd.Series(pd.Categorical(joined, categories=pd.unique(joined)))
+
+    def value_counts(self, rows: Optional[np.ndarray] = None) -> pd.Series:
+        """Number of rows listing each value, most frequent first (ties in order of appearance)"""
+        _, ids = self._select(rows)
+        counts = np.bincount(ids, minlength=len(self.values))
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        return pd.Series(counts[order], index=self.values[order])
+
+    def pair_counts(self, rows: Optional[np.ndarray] = None) -> pd.Series:
+        """
+        Number of rows listing each unordered pair of values, most frequent first
+        Indexed by (value, value), ties in order of the values' first appearance.
+        """
+        lengths, ids = self._select(rows)
+        starts = np.cumsum(lengths) - lengths
+        firsts, seconds = [], []
+        for length in np.unique(lengths[lengths > 1]):
+            # All rows with the same list length at once: a (rows, length) matrix of codes
+            group = starts[lengths == length][:, None] + np.arange(length)
+            codes = ids[group]
+            left, right = np.triu_indices(length, 1)
+            firsts.append(codes[:, left].ravel())
+            seconds.append(codes[:, right].ravel())
+        if not firsts:
+            return pd.Series([], index=pd.MultiIndex.from_tuples([], names=['first', 'second']), dtype=np.int64)
+
+        firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+        low, high = np.minimum(firsts, seconds).astype(np.int64), np.maximum(firsts, seconds).astype(np.int64)
+        keys, counts = np.unique(low * len(self.values) + high, return_counts=True)
+        order = np.lexsort((keys, -counts))
+        keys, counts = keys[order], counts[order]
+        index = pd.MultiIndex.from_arrays([self.values[keys // len(self.values)], self.values[keys % len(self.values)]],
+                                          names=['first', 'second'])
+        return pd.Series(counts, index=index)
@@ -0,0 +1,65 @@
+"""
+On-disk cache of per-comment sentiment labels keyed by content hash
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable
+
+
+def content_key(text: str, model: str = '') -> str:
+    """Cache key for a comment classified by a given model"""
+    return hashlib.sha1(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+
+class LabelCache:
+    """SQLite table of content hash -> label, safe to share between threads"""
+
+    def __init__(self, path: str = 'data/sentiment_labels.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS labels (key TEXT PRIMARY KEY, label TEXT NOT NULL)')
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Labels for the keys that are cached"""
+        keys = list(keys)
+        found = {}
+        conn = self._connect()
+        try:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ', '.join('?' for _ in batch)
+                found.update(conn.execute(
+                    f"SELECT key, label FROM labels WHERE key IN ({placeholders})", batch
+                ).fetchall())
+        finally:
+            conn.close()
+        return found
+
+    def put_many(self, labels: Dict[str, str]):
+        if not labels:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO labels VALUES (?, ?)', labels.items())
+            finally:
+                conn.close()
+
+    def __len__(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute('SELECT COUNT(*) FROM labels').fetchone()[0]
+        finally:
+            conn.close()
@@ -0,0 +1,114 @@
+"""
+Background hot reload of the analyzer
+A watcher thread polls the data store and builds a new MusicDataAnalyzer off
+the request path. Requests keep using the snapshot they picked up until the
+new one is swapped in with a single reference assignment.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from analysis.data_analyzer import MusicDataAnalyzer
+
+
+class AnalyzerReloader:
+    """Hold the current analyzer snapshot and replace it when the data changes"""
+
+    def __init__(self, data_file: str, interval: float = 5.0,
+                 factory: Callable[..., MusicDataAnalyzer] = MusicDataAnalyzer,
+                 on_swap: Optional[Callable[[MusicDataAnalyzer], None]] = None,
+                 analyzer_options: Optional[Dict] = None):
+        """
+        on_swap is called with the new analyzer after each reload, e.g. to
+        replace pre-forked workers so they inherit the new snapshot
+        analyzer_options are passed to the factory with every snapshot
+        """
+        self.data_file = data_file
+        self.interval = interval
+        self.factory = factory
+        self.on_swap = on_swap
+        self.analyzer_options = analyzer_options or {}
+        self.generation = 0
+        self.last_reload_seconds = 0.0
+        self.last_reload_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.reloading = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.analyzer = None
+        self._swap(*self._build())
+
+    def _build(self):
+        started = time.perf_counter()
+        # The reloader owns refreshing, so snapshots never reload in place
+        analyzer = self.factory(self.data_file, auto_refresh=False, **self.analyzer_options)
+        return analyzer, round(time.perf_counter() - started, 4)
+
+    def _swap(self, analyzer: MusicDataAnalyzer, seconds: float):
+        self.analyzer = analyzer
+        self.last_reload_seconds = seconds
+        self.last_reload_at = time.time()
+        self.generation += 1
+
+    def check(self) -> bool:
+        """Rebuild and swap the analyzer if the data changed, returns True on swap"""
+        with self._lock:
+            current = self.analyzer
+            if current.store.mtime() == current.data_mtime:
+                return False
+            if current.store.content_hash() == current.version:
+                current.data_mtime = current.store.mtime()
+                return False
+
+            self.reloading = True
+            try:
+                analyzer, seconds = self._build()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Reloading {self.data_file} failed, keeping the current data: {e}")
+                return False
+            finally:
+                self.reloading = False
+
+            self.last_error = None
+            self._swap(analyzer, seconds)
+            print(f"Reloaded {self.data_file} in {self.last_reload_seconds}s (version {analyzer.version[:12]})")
+            if self.on_swap is not None:
+                self.on_swap(analyzer)
+            return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Error watching {self.data_file}: {e}")
+
+    def start(self) -> 'AnalyzerReloader':
+        """Start the watcher thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='analyzer-reloader', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def status(self) -> Dict:
+        """Snapshot version and reload timings"""
+        analyzer = self.analyzer
+        return {
+            'version': analyzer.version,
+            'generation': self.generation,
+            'data_file': self.data_file,
+            'last_modified': str(analyzer.last_modified) if analyzer.last_modified else None,
+            'last_reload_at': self.last_reload_at,
+            'last_reload_seconds': self.last_reload_seconds,
+            'reloading': self.reloading,
+            'last_error': self.last_error,
+        }
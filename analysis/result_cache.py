@@ -0,0 +1,107 @@
+"""
+Result cache for analysis methods
+Each entry keeps the result together with its serialized JSON body and an
+ETag, so repeated API requests are served without recomputing or re-encoding.
+Compressed bodies are made on first request and kept with the entry.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from monitoring.metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=5)
+
+CACHE_REQUESTS = REGISTRY.counter('music_cache_requests', 'Result cache lookups by cache and outcome',
+                                  ['cache', 'result'])
+
+
+class CacheEntry:
+    """A cached result with its pre-serialized JSON body"""
+
+    __slots__ = ('result', 'body', 'etag', '_compressed')
+
+    def __init__(self, result: Any, body: Optional[bytes] = None):
+        self.result = result
+        self.body = body if body is not None else json.dumps(result, ensure_ascii=False, default=str).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self._compressed: Dict[str, bytes] = {}
+
+    @classmethod
+    def combine(cls, entries: Dict[str, 'CacheEntry']) -> 'CacheEntry':
+        """One JSON object of several entries, spliced from their bodies without re-encoding"""
+        parts = [json.dumps(name).encode('utf-8') + b': ' + entry.body for name, entry in entries.items()]
+        return cls({name: entry.result for name, entry in entries.items()}, b'{' + b', '.join(parts) + b'}')
+
+    def compressed(self, encoding: str) -> bytes:
+        """Body compressed with a COMPRESSORS encoding, compressed once per entry"""
+        body = self._compressed.get(encoding)
+        if body is None:
+            body = self._compressed.setdefault(encoding, COMPRESSORS[encoding](self.body))
+        return body
+
+
+class ResultCache:
+    """
+    Thread-safe map of cache key -> CacheEntry with hit/miss counts
+    With max_entries set, the least recently used entries are evicted.
+    name labels the cache in the hit/miss metrics.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, name: str = 'results'):
+        self.name = name
+        self._entries: Dict[Hashable, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> CacheEntry:
+        """Return the entry for key, computing it (a result or a ready CacheEntry) on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.name, result='hit')
+            if self.max_entries is not None:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+            return entry
+
+        # Compute outside the lock; two threads racing on a miss just both compute
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+        result = compute()
+        entry = result if isinstance(result, CacheEntry) else CacheEntry(result)
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.setdefault(key, entry)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,99 @@
+"""
+Time-bucketed rollup tables
+Counts are kept per day and rolled up to month/year from the day table, so a
+trend at any granularity costs O(buckets) instead of O(rows). Rollups cover
+the whole dataset and are rebuilt with the frames on every (re)load, since an
+appended song can replace an earlier record with the same ID.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Granularity -> numpy datetime unit and bucket label format
+GRANULARITIES = {
+    'year': ('Y', '%Y'),
+    'month': ('M', '%Y-%m'),
+    'day': ('D', '%Y-%m-%d'),
+}
+
+
+class TimeRollup:
+    """Per-day integer sums of a fixed set of metrics"""
+
+    def __init__(self, metrics: List[str]):
+        self.metrics = list(metrics)
+        self.days = np.empty(0, dtype='datetime64[D]')
+        self.values = np.zeros((0, len(self.metrics)), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _merge(self, days: np.ndarray, values: np.ndarray):
+        days = np.concatenate([self.days, days])
+        values = np.concatenate([self.values, values])
+        self.days, inverse = np.unique(days, return_inverse=True)
+        self.values = np.zeros((len(self.days), len(self.metrics)), dtype=np.int64)
+        np.add.at(self.values, inverse.ravel(), values)
+
+    def add(self, dates: pd.Series, values: Dict[str, np.ndarray]):
+        """Add rows with their dates (NaT rows are skipped) and per-row metric values"""
+        valid = dates.notna().values
+        days = dates.values[valid].astype('datetime64[D]')
+        if len(days) == 0:
+            return
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        sums = np.zeros((len(unique_days), len(self.metrics)), dtype=np.int64)
+        for column, metric in enumerate(self.metrics):
+            metric_values = np.asarray(values[metric])[valid].astype(np.int64)
+            sums[:, column] = np.bincount(inverse.ravel(), weights=metric_values, minlength=len(unique_days))
+        self._merge(unique_days, sums)
+
+    def table(self, granularity: str = 'month', start: Optional[str] = None,
+              end: Optional[str] = None) -> pd.DataFrame:
+        """Sums per bucket in time order, indexed by bucket label, within [start, end]"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity {granularity!r}, expected one of {list(GRANULARITIES)}")
+        unit, label_format = GRANULARITIES[granularity]
+        days, values = self.days, self.values
+        if start is not None or end is not None:
+            keep = np.ones(len(days), dtype=bool)
+            if start is not None:
+                keep &= days >= np.datetime64(start, 'D')
+            if end is not None:
+                # An end of '2018' or '2018-06' covers the whole year or month
+                end_bucket = np.datetime64(end)
+                keep &= days.astype(end_bucket.dtype) <= end_bucket
+            days, values = days[keep], values[keep]
+
+        buckets, inverse = np.unique(days.astype(f'datetime64[{unit}]'), return_inverse=True)
+        sums = np.zeros((len(buckets), len(self.metrics)), dtype=np.int64)
+        np.add.at(sums, inverse.ravel(), values)
+        labels = pd.DatetimeIndex(buckets.astype('datetime64[ns]')).strftime(label_format)
+        return pd.DataFrame(sums, index=labels, columns=self.metrics)
+
+
+def release_rollup(df_songs: pd.DataFrame) -> TimeRollup:
+    """Songs released per day"""
+    rollup = TimeRollup(['releases'])
+    if not df_songs.empty and 'publish_date' in df_songs.columns:
+        rollup.add(df_songs['publish_date'], {'releases': np.ones(len(df_songs), dtype=np.int64)})
+    return rollup
+
+
+def comment_rollup(df_comments: pd.DataFrame) -> TimeRollup:
+    """Comments, likes and sentiment labels per day"""
+    rollup = TimeRollup(['comments', 'likes', 'positive', 'neutral', 'negative'])
+    if df_comments.empty or 'comment_date' not in df_comments.columns:
+        return rollup
+    values = {
+        'comments': np.ones(len(df_comments), dtype=np.int64),
+        'likes': (df_comments['liked_count'].fillna(0).values if 'liked_count' in df_comments.columns
+                  else np.zeros(len(df_comments), dtype=np.int64)),
+    }
+    sentiment = df_comments['sentiment'] if 'sentiment' in df_comments.columns else None
+    for label in ('positive', 'neutral', 'negative'):
+        values[label] = (sentiment == label).values if sentiment is not None \
+            else np.zeros(len(df_comments), dtype=bool)
+    rollup.add(df_comments['comment_date'], values)
+    return rollup
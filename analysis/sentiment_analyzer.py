@@ -2,20 +2,71 @@
 Sentiment analysis module using Qwen3-30B-A3B API
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import List, Dict
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Union
+
+try:
+    from analysis.label_cache import LabelCache, content_key
+    from analysis.sentiment_scorer import SentimentScorer
+except ImportError:  # running as a script: python analysis/sentiment_analyzer.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from analysis.label_cache import LabelCache, content_key
+    from analysis.sentiment_scorer import SentimentScorer
+
+# Labels the model may answer with -> our labels
+LABEL_ALIASES = {
+    'positive': 'positive', '正面': 'positive', '积极': 'positive',
+    'neutral': 'neutral', '中性': 'neutral',
+    'negative': 'negative', '负面': 'negative', '消极': 'negative',
+}
 
 
 class SentimentAnalyzer:
     """Analyze sentiment of music comments using Qwen3-30B-A3B"""
     
-    def __init__(self, api_key: str = None):
-        self.url = "https://api.modelarts-maas.com/v1/chat/completions"
+    def __init__(self, api_key: str = None, scorer: SentimentScorer = None,
+                 url: str = "https://api.modelarts-maas.com/v1/chat/completions",
+                 model: str = "qwen3-30b-a3b", chunk_size: int = 20, max_workers: int = 4,
+                 max_retries: int = 3, backoff: float = 1.0,
+                 label_cache: Optional[LabelCache] = None, verify: Union[bool, str] = True):
+        """
+        The API path sends comments in chunks of chunk_size with up to max_workers
+        requests in flight, retrying failures with exponential backoff.
+        Per-comment labels are stored in label_cache so no comment is sent twice.
+        verify is passed to requests: False skips TLS certificate checks, a path
+        names a CA bundle (e.g. for a private endpoint)
+        """
+        self.url = url
+        self.model = model
         self.api_key = api_key or "MAAS_API_KEY"  # Should be replaced with actual key
         self.headers = {
             'Content-Type': 'application/json',
             'Authorization': f'Bearer {self.api_key}'
         }
+        self.scorer = scorer or SentimentScorer()
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._label_cache = label_cache
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=max_workers))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=max_workers))
+    
+    @property
+    def label_cache(self) -> LabelCache:
+        """Opened on first use so the rule-based path never touches the disk"""
+        if self._label_cache is None:
+            self._label_cache = LabelCache()
+        return self._label_cache
     
     def analyze_comment_batch(self, comments: List[str], batch_size: int = 10) -> Dict:
         """Analyze sentiment of a batch of comments"""
@@ -27,48 +78,63 @@ class SentimentAnalyzer:
         return self._analyze_simple(comments)
     
     def _analyze_simple(self, comments: List[str]) -> Dict:
-        """Simple rule-based sentiment analysis (fallback)"""
-        positive_keywords = ['好', '棒', '喜欢', '爱', '赞', '美', '优秀', '精彩', '完美', '感动', '温柔', '治愈']
-        negative_keywords = ['差', '烂', '讨厌', '恨', '垃圾', '难听', '失望', '糟糕', '无聊', '伤心']
-        
-        sentiments = {'positive': 0, 'neutral': 0, 'negative': 0}
-        
-        for comment in comments:
-            pos_count = sum(1 for word in positive_keywords if word in comment)
-            neg_count = sum(1 for word in negative_keywords if word in comment)
-            
-            if pos_count > neg_count:
-                sentiments['positive'] += 1
-            elif neg_count > pos_count:
-                sentiments['negative'] += 1
-            else:
-                sentiments['neutral'] += 1
-        
-        total = len(comments)
-        return {
-            'positive': sentiments['positive'],
-            'neutral': sentiments['neutral'],
-            'negative': sentiments['negative'],
-            'positive_pct': round(sentiments['positive'] / total * 100, 2) if total > 0 else 0,
-            'neutral_pct': round(sentiments['neutral'] / total * 100, 2) if total > 0 else 0,
-            'negative_pct': round(sentiments['negative'] / total * 100, 2) if total > 0 else 0,
-        }
+        """Simple rule-based sentiment analysis (fallback), see sentiment_scorer"""
+        scores = self.scorer.score(comments)
+        return self.scorer.summarize(self.scorer.label(scores))
     
     def analyze_with_api(self, comments: List[str]) -> Dict:
         """Analyze using Qwen3-30B-A3B API (requires valid API key)"""
-        # Prepare batch of comments
-        comment_text = '\n'.join(comments[:50])  # Limit to 50 comments
+        labels = self.classify_comments(comments)
+        return self.scorer.summarize(labels)
+    
+    def classify_comments(self, comments: List[str]) -> List[str]:
+        """
+        Per-comment labels from the API
+        Cached comments are not sent again and each distinct text is sent once.
+        A chunk that still fails after retries falls back to the rule-based scorer.
+        """
+        # Missing comments are classified as empty text
+        comments = ['' if comment is None else str(comment) for comment in comments]
+        keys = [content_key(comment, self.model) for comment in comments]
+        labels = self.label_cache.get_many(set(keys))
+        
+        pending = {}
+        for key, comment in zip(keys, comments):
+            if key not in labels:
+                pending.setdefault(key, comment)
+        
+        pending_keys = list(pending)
+        chunks = [pending_keys[start:start + self.chunk_size]
+                  for start in range(0, len(pending_keys), self.chunk_size)]
+        if chunks:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = pool.map(lambda chunk: self._classify_chunk([pending[key] for key in chunk]), chunks)
+                for chunk, chunk_labels in zip(chunks, results):
+                    if chunk_labels is None:
+                        # Fallback labels are not cached so the API is tried again next time
+                        fallback = self.scorer.label(self.scorer.score([pending[key] for key in chunk]))
+                        labels.update(zip(chunk, fallback))
+                    else:
+                        chunk_result = dict(zip(chunk, chunk_labels))
+                        self.label_cache.put_many(chunk_result)
+                        labels.update(chunk_result)
         
-        prompt = f"""请分析以下音乐评论的情感倾向，统计正面、中性、负面评论的数量。
+        return [labels[key] for key in keys]
+    
+    def _classify_chunk(self, comments: List[str]) -> Optional[List[str]]:
+        """Labels for one chunk, or None when the API keeps failing"""
+        numbered = '\n'.join(f"{index}. {comment.replace(chr(10), ' ')}"
+                              for index, comment in enumerate(comments, 1))
+        prompt = f"""请逐条判断以下音乐评论的情感倾向，每条评论只能是 positive、neutral 或 negative。
 评论内容：
-{comment_text}
+{numbered}
 
-请返回JSON格式：
-{{"positive": 数量, "neutral": 数量, "negative": 数量}}
+请按评论编号顺序返回JSON格式：
+{{"labels": ["positive", "neutral", ...]}}
 """
         
         data = {
-            "model": "qwen3-30b-a3b",
+            "model": self.model,
             "messages": [
                 {"role": "system", "content": "你是一个专业的情感分析助手。"},
                 {"role": "user", "content": prompt}
@@ -78,36 +144,50 @@ class SentimentAnalyzer:
             }
         }
         
-        try:
-            response = requests.post(
-                self.url,
-                headers=self.headers,
-                data=json.dumps(data),
-                verify=False,
-                timeout=30
-            )
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                response = self.session.post(
+                    self.url,
+                    headers=self.headers,
+                    data=json.dumps(data),
+                    timeout=30
+                )
+            except requests.RequestException as e:
+                print(f"Error calling API: {e}")
+                continue
             
             if response.status_code == 200:
-                result = response.json()
-                # Parse the response to extract sentiment counts
-                # This is simplified - actual parsing depends on API response format
-                return self._parse_api_response(result)
+                try:
+                    body = response.json()
+                except ValueError:  # an error page or a truncated body
+                    body = None
+                labels = self._parse_api_response(body, len(comments)) if body is not None else None
+                if labels is not None:
+                    return labels
+                print("API response could not be parsed into per-comment labels")
+            elif response.status_code == 429 or response.status_code >= 500:
+                print(f"API request failed: {response.status_code}, retrying")
             else:
                 print(f"API request failed: {response.status_code}")
-                return self._analyze_simple(comments)
-        except Exception as e:
-            print(f"Error calling API: {e}")
-            return self._analyze_simple(comments)
+                return None
+        return None
     
-    def _parse_api_response(self, response: Dict) -> Dict:
-        """Parse API response to extract sentiment data"""
-        # This is a placeholder - actual implementation depends on API response format
+    def _parse_api_response(self, response: Dict, expected: int) -> Optional[List[str]]:
+        """Parse API response into one label per comment, None if it doesn't fit"""
         try:
-            content = response.get('choices', [{}])[0].get('message', {}).get('content', '{}')
-            sentiment_data = json.loads(content)
-            return sentiment_data
-        except:
-            return {'positive': 0, 'neutral': 0, 'negative': 0}
+            content = response.get('choices', [{}])[0].get('message', {}).get('content', '')
+            # Models sometimes wrap the JSON in a code fence
+            match = re.search(r'\{.*\}', content, re.DOTALL)
+            raw_labels = json.loads(match.group(0)).get('labels', []) if match else []
+        except (ValueError, AttributeError, IndexError, TypeError):
+            return None
+        
+        labels = [LABEL_ALIASES.get(str(label).strip().lower()) for label in raw_labels]
+        if len(labels) != expected or None in labels:
+            return None
+        return labels
     
     def generate_sentiment_summary(self, comments: List[str]) -> str:
         """Generate a summary of sentiment analysis"""
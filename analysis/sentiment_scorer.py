@@ -0,0 +1,163 @@
+"""
+Lexicon-based sentiment scoring over whole comment columns
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+POSITIVE_WORDS = {word: 1.0 for word in
+                  ['好', '棒', '喜欢', '爱', '赞', '美', '优秀', '精彩', '完美', '感动', '温柔', '治愈']}
+NEGATIVE_WORDS = {word: 1.0 for word in
+                  ['差', '烂', '讨厌', '恨', '垃圾', '难听', '失望', '糟糕', '无聊', '伤心']}
+NEGATORS = ['不', '没', '没有', '别', '不是', '不太', '并不', '从不', '毫不']
+
+SENTIMENT_LABELS = ['positive', 'neutral', 'negative']
+
+
+class SentimentLexicon:
+    """
+    Weighted positive/negative keywords plus negators
+    A keyword within negation_window characters after a negator counts with
+    the opposite polarity ("不太喜欢" is negative). A negator that follows
+    another within the window, with no keyword between them, cancels it
+    ("没有人不喜欢" is positive), and the 不 of "好不好" is not a negation.
+    """
+
+    def __init__(self, positive: Optional[Dict[str, float]] = None,
+                 negative: Optional[Dict[str, float]] = None,
+                 negators: Optional[List[str]] = None, negation_window: int = 2):
+        positive = POSITIVE_WORDS if positive is None else positive
+        negative = NEGATIVE_WORDS if negative is None else negative
+        self.negators = NEGATORS if negators is None else negators
+        self.negation_window = negation_window
+
+        weights = {word: float(weight) for word, weight in positive.items()}
+        weights.update((word, -float(weight)) for word, weight in negative.items())
+        self.words = sorted(weights, key=len, reverse=True)
+        self.weights = np.array([weights[word] for word in self.words], dtype=np.float64)
+        self.word_ids = {word: index for index, word in enumerate(self.words)}
+        self.negator_lengths = {word: len(word) for word in self.negators if word not in weights}
+
+        # One scan finds keywords and negators; the first-character class lets
+        # the regex skip most positions, the lookahead finds overlapping
+        # keywords ("完美" and "美")
+        tokens = sorted(list(weights) + list(self.negator_lengths), key=len, reverse=True)
+        first_chars = ''.join(sorted({token[0] for token in tokens}))
+        self.pattern = re.compile('(?=[' + re.escape(first_chars) + '])(?=('
+                                  + '|'.join(re.escape(token) for token in tokens) + '))')
+
+
+def score_texts(lexicon: SentimentLexicon, texts: List[str]) -> np.ndarray:
+    """
+    Score every text in one regex pass over the joined corpus
+    Each distinct keyword counts once per text, like `word in comment` did.
+    """
+    if not texts or not lexicon.words:
+        return np.zeros(len(texts), dtype=np.float32)
+
+    corpus = '\n'.join(texts)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+
+    positions = []
+    word_ids = []
+    negator_ends = []
+    # 1 for a negation, 0 for a negator cancelled by the one before it
+    negator_parity = []
+    last_word, last_word_start = '', -1
+    for match in lexicon.pattern.finditer(corpus):
+        start = match.start()
+        token = match.group(1)
+        word_id = lexicon.word_ids.get(token)
+        if word_id is not None:
+            positions.append(start)
+            word_ids.append(word_id)
+            last_word, last_word_start = token, start
+            continue
+        if negator_ends and start < negator_ends[-1]:
+            continue  # the tail of a longer negator, "不" in "并不"
+        end = start + lexicon.negator_lengths[token]
+        if last_word and start == last_word_start + len(last_word) and corpus.startswith(last_word, end):
+            continue  # "好不好" asks or insists, it doesn't negate
+        parity = 1
+        if (negator_ends and start - negator_ends[-1] <= lexicon.negation_window
+                and last_word_start < negator_ends[-1] and '\n' not in corpus[negator_ends[-1]:start]):
+            parity = 1 - negator_parity[-1]
+        negator_ends.append(end)
+        negator_parity.append(parity)
+    if not positions:
+        return np.zeros(len(texts), dtype=np.float32)
+
+    positions = np.array(positions, dtype=np.int64)
+    word_ids = np.array(word_ids, dtype=np.int64)
+    rows = np.searchsorted(starts, positions, side='right') - 1
+
+    negated = np.zeros(len(positions), dtype=np.int64)
+    if negator_ends:
+        # Negator ends are sorted because matches come in corpus order
+        negator_ends = np.array(negator_ends, dtype=np.int64)
+        negator_parity = np.array(negator_parity, dtype=np.int64)
+        nearest = np.searchsorted(negator_ends, positions, side='right') - 1
+        nearest_end = negator_ends[np.maximum(nearest, 0)]
+        same_row = rows == np.searchsorted(starts, nearest_end - 1, side='right') - 1
+        in_scope = (nearest >= 0) & same_row & (positions - nearest_end <= lexicon.negation_window)
+        negated = np.where(in_scope, negator_parity[np.maximum(nearest, 0)], 0)
+
+    # Count each (text, keyword, negated) combination once
+    keys = np.unique((rows * len(lexicon.words) + word_ids) * 2 + negated)
+    negated = keys % 2
+    word_ids = (keys // 2) % len(lexicon.words)
+    rows = (keys // 2) // len(lexicon.words)
+    polarity = lexicon.weights[word_ids] * np.where(negated == 1, -1.0, 1.0)
+    return np.bincount(rows, weights=polarity, minlength=len(texts)).astype(np.float32)
+
+
+def _score_chunk(args):
+    lexicon, texts = args
+    return score_texts(lexicon, texts)
+
+
+class SentimentScorer:
+    """
+    Vectorized sentiment scoring for a Series of comments
+    With processes > 1, corpora larger than chunk_size are split across a process pool.
+    """
+
+    def __init__(self, lexicon: Optional[SentimentLexicon] = None, processes: int = 1,
+                 chunk_size: int = 200000):
+        self.lexicon = lexicon or SentimentLexicon()
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def score(self, comments) -> np.ndarray:
+        """Score per comment (a Series or list of strings), > 0 positive, < 0 negative"""
+        if isinstance(comments, pd.Series):
+            texts = comments.fillna('').astype(str).tolist()
+        else:
+            texts = [text if isinstance(text, str) else '' for text in comments]
+        if self.processes <= 1 or len(texts) <= self.chunk_size:
+            return score_texts(self.lexicon, texts)
+
+        chunks = [(self.lexicon, texts[start:start + self.chunk_size])
+                  for start in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            return np.concatenate(list(pool.map(_score_chunk, chunks)))
+
+    @staticmethod
+    def label(scores: np.ndarray) -> pd.Categorical:
+        """positive / neutral / negative label per score"""
+        codes = np.where(scores > 0, 0, np.where(scores < 0, 2, 1))
+        return pd.Categorical.from_codes(codes, categories=SENTIMENT_LABELS)
+
+    @staticmethod
+    def summarize(labels) -> Dict:
+        """Counts and percentages in the shape SentimentAnalyzer returns"""
+        counts = pd.Series(labels).value_counts()
+        total = int(counts.sum())
+        result = {label: int(counts.get(label, 0)) for label in SENTIMENT_LABELS}
+        for label in SENTIMENT_LABELS:
+            result[f'{label}_pct'] = round(result[label] / total * 100, 2) if total > 0 else 0
+        return result
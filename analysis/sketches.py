@@ -0,0 +1,374 @@
+"""
+Mergeable sketches for approximate aggregates
+HyperLogLog counts distinct values, Space-Saving and Count-Min keep the most
+frequent ones and a bottom-k reservoir keeps a uniform sample. Each one is
+built from a chunk of rows in bounded memory and merged with another sketch of
+the same size, so they can be built per crawl shard (or per process) and
+combined. Each result carries the error bound of the sketch it came from.
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from analysis.interned import InternedLists
+from analysis.sentiment_scorer import SENTIMENT_LABELS
+
+# Rows per chunk when sketching a loaded dataset, each chunk is sketched and merged
+SKETCH_CHUNK_ROWS = 100000
+
+
+def _hash(values) -> np.ndarray:
+    """Stable 64-bit hashes of values (the same in every process)"""
+    return pd.util.hash_array(np.asarray(values, dtype=object), categorize=False)
+
+
+def _distinct(values) -> np.ndarray:
+    """Distinct non-null values as an object array"""
+    unique = pd.Series(values).dropna().unique()
+    return np.asarray(unique, dtype=object)
+
+
+class HyperLogLog:
+    """Distinct count estimate in 2**precision one-byte registers, standard error 1.04 / sqrt(2**precision)"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values) -> 'HyperLogLog':
+        hashes = _hash(_distinct(values))
+        if len(hashes) == 0:
+            return self
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        # Rank of the first set bit in the remaining 64 - precision bits
+        ranks = np.full(len(hashes), 64 - self.precision + 1, dtype=np.uint8)
+        nonzero = rest > 0
+        ranks[nonzero] = 64 - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, np.minimum(ranks, 64 - self.precision + 1))
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        if other.precision != self.precision:
+            raise ValueError("Can only merge HyperLogLog sketches of the same precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def result(self) -> Dict:
+        count = self.count()
+        return {'value': count, 'relative_error': round(self.relative_error, 4),
+                'bounds': [int(count * (1 - 2 * self.relative_error)), int(math.ceil(count * (1 + 2 * self.relative_error)))]}
+
+
+class SpaceSaving:
+    """
+    The capacity most frequent values with Space-Saving counters
+    Each kept value has count - error <= true count <= count, and any value
+    not kept occurs at most floor times.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts = pd.Series([], dtype=np.int64)
+        self.errors = pd.Series([], dtype=np.int64)
+        self.floor = 0
+        self.total = 0
+
+    @classmethod
+    def from_counts(cls, counts: pd.Series, capacity: int = 1000) -> 'SpaceSaving':
+        """Summary of exact counts (most frequent first), values past capacity are dropped into floor"""
+        sketch = cls(capacity)
+        counts = counts[counts > 0].astype(np.int64)
+        sketch.total = int(counts.sum())
+        sketch.counts = counts.iloc[:capacity]
+        sketch.errors = pd.Series(0, index=sketch.counts.index, dtype=np.int64)
+        sketch.floor = int(counts.iloc[capacity:].max()) if len(counts) > capacity else 0
+        return sketch
+
+    def update(self, values) -> 'SpaceSaving':
+        """Count a chunk of values"""
+        return self.merge(SpaceSaving.from_counts(pd.Series(values).value_counts(sort=True), self.capacity))
+
+    def merge(self, other: 'SpaceSaving') -> 'SpaceSaving':
+        index = self.counts.index.union(other.counts.index, sort=False)
+        # A value missing from a summary may have occurred up to that summary's floor times
+        counts = self.counts.reindex(index, fill_value=self.floor) + other.counts.reindex(index, fill_value=other.floor)
+        errors = self.errors.reindex(index, fill_value=self.floor) + other.errors.reindex(index, fill_value=other.floor)
+        order = np.argsort(-counts.values, kind='stable')
+        kept, dropped = order[:self.capacity], order[self.capacity:]
+        self.floor = max(self.floor + other.floor, int(counts.values[dropped].max()) if len(dropped) else 0)
+        self.counts, self.errors = counts.iloc[kept], errors.iloc[kept]
+        self.total += other.total
+        return self
+
+    def result(self, top_n: int) -> Dict:
+        top = self.counts.iloc[:top_n]
+        errors = self.errors.reindex(top.index)
+        return {
+            'labels': top.index.tolist(),
+            'data': top.values.tolist(),
+            'bounds': [[int(count - error), int(count)] for count, error in zip(top.values, errors.values)],
+            'max_error': int(self.errors.max()) if len(self.errors) else 0,
+        }
+
+
+class CountMinTopK:
+    """
+    Count-Min sketch of value frequencies plus the capacity values with the highest estimates
+    Estimates never undercount and overcount by at most e / width of the total
+    with probability 1 - exp(-depth).
+    """
+
+    def __init__(self, width: int = 1 << 14, depth: int = 4, capacity: int = 1000):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.candidates = pd.Series([], dtype=np.int64)
+        self.total = 0
+
+    def _cells(self, values) -> np.ndarray:
+        """(depth, len(values)) table columns of values, by double hashing"""
+        hashes = _hash(values)
+        first, second = hashes & np.uint64(0xFFFFFFFF), (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((first[None, :] + rows * second[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def estimate(self, values) -> np.ndarray:
+        cells = self._cells(values)
+        return self.table[np.arange(self.depth)[:, None], cells].min(axis=0)
+
+    def update(self, counts: pd.Series) -> 'CountMinTopK':
+        """Add a chunk of value -> count"""
+        counts = counts[counts > 0].groupby(level=0, sort=False).sum()
+        if counts.empty:
+            return self
+        cells = self._cells(counts.index)
+        for row in range(self.depth):
+            np.add.at(self.table[row], cells[row], counts.values)
+        self.total += int(counts.sum())
+        self._refresh(counts.index)
+        return self
+
+    def merge(self, other: 'CountMinTopK') -> 'CountMinTopK':
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Can only merge Count-Min sketches of the same width and depth")
+        self.table += other.table
+        self.total += other.total
+        self._refresh(other.candidates.index)
+        return self
+
+    def _refresh(self, values: pd.Index):
+        """Re-estimate the candidates and the new values, keep the capacity highest"""
+        index = self.candidates.index.union(values, sort=False)
+        estimates = pd.Series(self.estimate(index), index=index)
+        self.candidates = estimates.iloc[np.argsort(-estimates.values, kind='stable')[:self.capacity]]
+
+    @property
+    def error_bound(self) -> int:
+        return int(math.ceil(math.e / self.width * self.total))
+
+    def result(self, top_n: int) -> Dict:
+        top = self.candidates.iloc[:top_n]
+        return {
+            'words': [{'text': word, 'value': int(count)} for word, count in top.items()],
+            'error_bound': self.error_bound,
+            'confidence': round(1 - math.exp(-self.depth), 4),
+        }
+
+
+class Reservoir:
+    """Uniform sample of up to capacity values: each value gets a random key and the smallest keys are kept"""
+
+    def __init__(self, capacity: int = 10000, seed: Optional[int] = None):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0, dtype=np.float64)
+        self.values = np.empty(0, dtype=np.int8)
+        self.total = 0
+
+    def update(self, values: np.ndarray) -> 'Reservoir':
+        return self._keep(self.rng.random(len(values)), np.asarray(values), len(values))
+
+    def merge(self, other: 'Reservoir') -> 'Reservoir':
+        return self._keep(other.keys, other.values, other.total)
+
+    def _keep(self, keys: np.ndarray, values: np.ndarray, count: int) -> 'Reservoir':
+        keys, values = np.concatenate([self.keys, keys]), np.concatenate([self.values, values])
+        if len(keys) > self.capacity:
+            kept = np.argpartition(keys, self.capacity - 1)[:self.capacity]
+            keys, values = keys[kept], values[kept]
+        self.keys, self.values = keys, values
+        self.total += count
+        return self
+
+    def proportion_bound(self, proportion: float) -> float:
+        """Half-width of the 95% interval of a proportion estimated from the sample"""
+        n = len(self.values)
+        if n == 0:
+            return 0.0
+        # Finite population correction: a sample of everything is exact
+        correction = math.sqrt((self.total - n) / (self.total - 1)) if self.total > 1 else 0.0
+        return 1.96 * math.sqrt(proportion * (1 - proportion) / n) * correction
+
+
+class DatasetSketches:
+    """Sketches behind the approximate overview, top artists, word cloud and sentiment"""
+
+    def __init__(self, seed=None):
+        """seed (an int or np.random.SeedSequence) drives the sentiment sample, fresh entropy by default"""
+        self.songs = 0
+        self.comments = 0
+        self.first_publish = None
+        self.last_publish = None
+        self.artists = HyperLogLog()
+        self.albums = HyperLogLog()
+        self.top_artists = {'primary': SpaceSaving(), 'all': SpaceSaving()}
+        self.words: Dict[str, CountMinTopK] = {}
+        # Sketches that get merged must sample independently, so never share a seed
+        self.sentiment = Reservoir(seed=seed)
+
+    @classmethod
+    def from_frames(cls, df_songs: pd.DataFrame, df_comments: pd.DataFrame, credits: InternedLists,
+                    term_docs: Optional[Dict[str, np.ndarray]] = None,
+                    term_counts: Optional[Dict[str, pd.DataFrame]] = None,
+                    chunk_rows: int = SKETCH_CHUNK_ROWS, seed: Optional[int] = None) -> 'DatasetSketches':
+        """Sketch a loaded dataset chunk by chunk, merging as a sharded build would"""
+        term_docs, term_counts = term_docs or {}, term_counts or {}
+        # One independent random stream per chunk, reproducible when seed is given
+        comment_chunks = range(0, len(df_comments), chunk_rows)
+        seeds = iter(np.random.SeedSequence(seed).spawn(len(comment_chunks) + 1))
+        sketches = cls(next(seeds))
+        for start in range(0, len(df_songs), chunk_rows):
+            rows = np.arange(start, min(start + chunk_rows, len(df_songs)))
+            chunk = cls()
+            chunk.add_songs(df_songs.iloc[rows], credits, rows)
+            if 'name' in term_docs:
+                chunk.add_terms('name', term_docs['name'][rows], term_counts['name'])
+            sketches.merge(chunk)
+        for start in comment_chunks:
+            rows = np.arange(start, min(start + chunk_rows, len(df_comments)))
+            chunk = cls(next(seeds))
+            chunk.add_comments(df_comments.iloc[rows])
+            if 'comment' in term_docs:
+                chunk.add_terms('comment', term_docs['comment'][rows], term_counts['comment'])
+            sketches.merge(chunk)
+        return sketches
+
+    def add_songs(self, df_songs: pd.DataFrame, credits: InternedLists, rows: np.ndarray):
+        self.songs += len(df_songs)
+        if 'primary_artist' in df_songs.columns:
+            self.artists.update(df_songs['primary_artist'])
+            self.top_artists['primary'].update(df_songs['primary_artist'])
+        if len(credits.values):
+            self.top_artists['all'].merge(SpaceSaving.from_counts(credits.value_counts(rows)))
+        if 'album' in df_songs.columns:
+            self.albums.update(df_songs['album'])
+        if 'publish_date' in df_songs.columns:
+            dates = df_songs['publish_date'].dropna()
+            if len(dates):
+                self._extend_dates(dates.min(), dates.max())
+
+    def add_comments(self, df_comments: pd.DataFrame):
+        self.comments += len(df_comments)
+        if 'sentiment' in df_comments.columns:
+            self.sentiment.update(pd.Categorical(df_comments['sentiment'], categories=SENTIMENT_LABELS).codes)
+
+    def add_terms(self, kind: str, docs: np.ndarray, terms: pd.DataFrame):
+        """Term counts of the rows whose document keys are docs (see term_index)"""
+        if len(docs) == 0 or terms.empty:
+            return
+        repeats = pd.Series(docs).value_counts()
+        chunk = terms[terms['doc'].isin(repeats.index)]
+        weights = chunk['count'].values.astype(np.int64) * repeats.reindex(chunk['doc'].values).values
+        counts = pd.Series(weights, index=chunk['term'].astype(object).values)
+        self.words.setdefault(kind, CountMinTopK()).update(counts)
+
+    def _extend_dates(self, first, last):
+        self.first_publish = first if self.first_publish is None else min(self.first_publish, first)
+        self.last_publish = last if self.last_publish is None else max(self.last_publish, last)
+
+    def merge(self, other: 'DatasetSketches') -> 'DatasetSketches':
+        self.songs += other.songs
+        self.comments += other.comments
+        if other.first_publish is not None:
+            self._extend_dates(other.first_publish, other.last_publish)
+        self.artists.merge(other.artists)
+        self.albums.merge(other.albums)
+        for credits, sketch in other.top_artists.items():
+            self.top_artists[credits].merge(sketch)
+        for kind, sketch in other.words.items():
+            if kind in self.words:
+                self.words[kind].merge(sketch)
+            else:
+                self.words[kind] = sketch
+        self.sentiment.merge(other.sentiment)
+        return self
+
+    @staticmethod
+    def combine(sketches: Iterable['DatasetSketches']) -> 'DatasetSketches':
+        """Merge the sketches of several shards"""
+        combined = DatasetSketches()
+        for sketch in sketches:
+            combined.merge(sketch)
+        return combined
+
+    def overview(self) -> Dict:
+        artists, albums = self.artists.result(), self.albums.result()
+        return {
+            'total_songs': self.songs,
+            'total_artists': artists['value'],
+            'total_albums': albums['value'],
+            'total_comments': self.comments,
+            'date_range': {
+                'start': str(self.first_publish) if self.first_publish is not None else 'N/A',
+                'end': str(self.last_publish) if self.last_publish is not None else 'N/A'
+            },
+            'approximate': {'total_artists': artists, 'total_albums': albums},
+        }
+
+    def top(self, credits: str, top_n: int) -> Dict:
+        result = self.top_artists[credits].result(top_n)
+        return {
+            'labels': result['labels'],
+            'data': result['data'],
+            'approximate': {'bounds': result['bounds'], 'max_error': result['max_error']},
+        }
+
+    def wordcloud(self, kind: str, top_n: int) -> Dict:
+        if kind not in self.words:
+            return {'words': []}
+        result = self.words[kind].result(top_n)
+        return {'words': result['words'],
+                'approximate': {'error_bound': result['error_bound'], 'confidence': result['confidence']}}
+
+    def sentiment_summary(self) -> Dict:
+        sample = self.sentiment
+        size = len(sample.values)
+        counts = np.bincount(sample.values.astype(np.int64), minlength=len(SENTIMENT_LABELS))
+        proportions = {label: float(count / size) if size else 0.0 for label, count in zip(SENTIMENT_LABELS, counts)}
+        # Counts are scaled up from the sample to every comment seen
+        result: Dict = {label: int(round(proportion * sample.total)) for label, proportion in proportions.items()}
+        bounds: Dict[str, List[float]] = {}
+        for label, proportion in proportions.items():
+            result[f'{label}_pct'] = round(proportion * 100, 2)
+            bound = sample.proportion_bound(proportion)
+            bounds[f'{label}_pct'] = [round(max(proportion - bound, 0.0) * 100, 2),
+                                      round(min(proportion + bound, 1.0) * 100, 2)]
+        result['approximate'] = {'sample_size': size, 'confidence': 0.95, 'bounds': bounds}
+        return result
@@ -0,0 +1,116 @@
+"""
+Background startup of the analyzer
+pandas, numpy and jieba are imported and the first data snapshot is loaded on
+a background thread, so the web server can bind its port right away and
+report readiness once the data is in. A failed load is retried, starting
+after the reload interval and backing off up to MAX_RETRY_INTERVAL. Nothing
+heavy is imported by this module.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+# Longest wait between attempts to load the first snapshot
+MAX_RETRY_INTERVAL = 300.0
+
+
+class BackgroundStartup:
+    """Build the AnalyzerReloader off the main thread and record how long each phase took"""
+
+    def __init__(self, data_file: str, interval: float = 5.0, analyzer_options: Optional[Dict] = None):
+        self.data_file = data_file
+        self.interval = interval
+        self.analyzer_options = analyzer_options
+        self.reloader = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.next_attempt: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.reloader is not None
+
+    @property
+    def loading(self) -> bool:
+        return not self._done.is_set()
+
+    def start(self) -> 'BackgroundStartup':
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='startup', daemon=True)
+        self._thread.start()
+        return self
+
+    def _phase(self, name: str, started: float) -> float:
+        now = time.perf_counter()
+        self.phases[name] = round(now - started, 4)
+        return now
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            from analysis.term_index import warm_up
+
+            # jieba's dictionary loads alongside the data; it's only needed to segment
+            # documents the term index hasn't seen, so readiness doesn't wait for it
+            warm_up()
+            from analysis.reloader import AnalyzerReloader
+            started = self._phase('imports', started)
+        except Exception as e:
+            # A broken install doesn't fix itself, give up
+            self._fail(e)
+            self.phases['total'] = round(time.perf_counter() - self._started, 4)
+            self._done.set()
+            return
+
+        # Stays loading until a snapshot is in, so /readyz reports 503 with the last error meanwhile
+        delay = max(self.interval, 1.0)
+        while True:
+            self.attempts += 1
+            try:
+                reloader = AnalyzerReloader(self.data_file, interval=self.interval,
+                                            analyzer_options=self.analyzer_options)
+                break
+            except Exception as e:
+                self._fail(e, retry_in=delay)
+            self.next_attempt = time.time() + delay
+            time.sleep(delay)
+            self.next_attempt = None
+            started = time.perf_counter()
+            delay = min(delay * 2, MAX_RETRY_INTERVAL)
+
+        self._phase('load', started)
+        reloader.start()
+        self.error = None
+        self.reloader = reloader
+        self.phases['total'] = round(time.perf_counter() - self._started, 4)
+        self._done.set()
+
+    def _fail(self, error: Exception, retry_in: Optional[float] = None):
+        self.error = f"{type(error).__name__}: {error}"
+        retry = f", retrying in {retry_in:.0f}s" if retry_in is not None else ''
+        print(f"Error loading {self.data_file}: {self.error}{retry}")
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the data is loaded, returns the reloader (RuntimeError if loading failed)"""
+        if not self._done.wait(timeout):
+            raise RuntimeError(f"{self.data_file} is still loading after {timeout}s")
+        if self.reloader is None:
+            raise RuntimeError(f"Loading {self.data_file} failed: {self.error}")
+        return self.reloader
+
+    def status(self) -> Dict:
+        """Readiness with the time spent in each startup phase so far"""
+        return {
+            'ready': self.ready,
+            'loading': self.loading,
+            'error': self.error,
+            'attempts': self.attempts,
+            'next_attempt_in': (round(max(self.next_attempt - time.time(), 0.0), 1)
+                                if self.next_attempt is not None else None),
+            'seconds': round(time.perf_counter() - self._started, 4) if self.loading else self.phases.get('total'),
+            'phases': dict(self.phases),
+        }
@@ -0,0 +1,195 @@
+"""
+Persistent term-frequency index for song names and comment text
+Each document (a song name or a comment) is segmented with jieba once and
+its term counts are stored in SQLite, keyed by a hash of the document. Loading
+a dataset only segments documents the index has not seen yet.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+import jieba
+import numpy as np
+import pandas as pd
+
+STOP_WORDS = {'的', '了', '和', '是', '就', '都', '而', '及', '与', '着', '之', '在', '有', '一', '不', '我', '你', '他'}
+
+# Stored terms depend on the tokenizer and the filter, a change rebuilds the index
+TOKENIZER_VERSION = hashlib.sha1(
+    f"jieba-{jieba.__version__}|len>1|{''.join(sorted(STOP_WORDS))}".encode('utf-8')
+).hexdigest()[:16]
+
+# Bumped when the tables change shape, an older index is rebuilt
+SCHEMA_VERSION = '2'
+
+
+def warm_up() -> threading.Thread:
+    """Load jieba's dictionary in a background thread so the first segmentation doesn't pay for it"""
+    thread = threading.Thread(target=jieba.initialize, name='jieba-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def tokenize(text: str) -> List[str]:
+    """Words of a text, without single characters and stop words"""
+    return [word for word in jieba.cut(text) if len(word) > 1 and word not in STOP_WORDS]
+
+
+def _tokenize_chunk(texts: List[str]) -> List[List[str]]:
+    return [tokenize(text) for text in texts]
+
+
+def document_keys(texts: pd.Series) -> np.ndarray:
+    """64-bit content hash per text, identical texts share one document"""
+    return pd.util.hash_pandas_object(texts, index=False).values.view(np.int64)
+
+
+class TermIndex:
+    """
+    SQLite-backed per-document term counts
+    With processes > 1, batches of at least parallel_threshold new documents
+    are segmented in a process pool.
+    """
+
+    def __init__(self, path: str = 'data/terms.db', processes: int = 1,
+                 parallel_threshold: int = 20000, chunk_size: int = 5000):
+        self.path = path
+        self.processes = processes
+        self.parallel_threshold = parallel_threshold
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    @classmethod
+    def for_data_file(cls, data_file: str, **kwargs) -> 'TermIndex':
+        """Index stored next to a data file: data/music_data.json -> data/music_data.terms.db"""
+        if any(char in data_file for char in '*?['):
+            # Shards matched by a glob share one index in their directory
+            return cls(os.path.join(os.path.dirname(data_file), 'shards.terms.db'), **kwargs)
+        return cls(os.path.splitext(data_file.rstrip('/' + os.sep))[0] + '.terms.db', **kwargs)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.isolation_level = None
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            # One writer at a time, so processes starting together don't rebuild over each other
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+                versions = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('tokenizer', 'schema')"))
+                if versions.get('schema') != SCHEMA_VERSION:
+                    conn.execute('DROP TABLE IF EXISTS docs')
+                    conn.execute('DROP TABLE IF EXISTS terms')
+                conn.execute('CREATE TABLE IF NOT EXISTS docs (kind TEXT, doc INTEGER, '
+                             'PRIMARY KEY (kind, doc)) WITHOUT ROWID')
+                # A document's terms are stored once however many loads index it concurrently
+                conn.execute('CREATE TABLE IF NOT EXISTS terms (kind TEXT, doc INTEGER, term TEXT, '
+                             'count INTEGER, pos INTEGER, PRIMARY KEY (kind, doc, term)) WITHOUT ROWID')
+                if versions.get('tokenizer') != TOKENIZER_VERSION:
+                    conn.execute('DELETE FROM docs')
+                    conn.execute('DELETE FROM terms')
+                conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                 [('tokenizer', TOKENIZER_VERSION), ('schema', SCHEMA_VERSION)])
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def indexed(self, kind: str) -> np.ndarray:
+        """Sorted keys of the documents of a kind already in the index"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT doc FROM docs WHERE kind = ? ORDER BY doc', (kind,)).fetchall()
+        finally:
+            conn.close()
+        return np.array([row[0] for row in rows], dtype=np.int64)
+
+    def _segment(self, texts: List[str]) -> List[List[str]]:
+        if self.processes <= 1 or len(texts) < self.parallel_threshold:
+            return _tokenize_chunk(texts)
+        chunks = [texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+        with ProcessPoolExecutor(max_workers=self.processes) as pool:
+            return [tokens for chunk in pool.map(_tokenize_chunk, chunks) for tokens in chunk]
+
+    def update(self, kind: str, docs: np.ndarray, texts: Iterable[str]) -> int:
+        """Segment and store the documents not indexed yet, returns how many were added"""
+        texts = list(texts)
+        known = self.indexed(kind)
+        unique_docs, first = np.unique(docs, return_index=True)
+        new = ~np.isin(unique_docs, known, assume_unique=True)
+        if not new.any():
+            return 0
+
+        positions = np.sort(first[new])
+        new_docs = [int(docs[position]) for position in positions]
+        tokens = self._segment([texts[position] for position in positions])
+
+        rows = []
+        for doc, words in zip(new_docs, tokens):
+            # Counter keeps first-appearance order, pos records it for stable ties
+            for pos, (term, count) in enumerate(Counter(words).items()):
+                rows.append((kind, doc, term, count, pos))
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('INSERT OR IGNORE INTO docs VALUES (?, ?)', ((kind, doc) for doc in new_docs))
+                    conn.executemany('INSERT OR IGNORE INTO terms VALUES (?, ?, ?, ?, ?)', rows)
+            finally:
+                conn.close()
+        return len(new_docs)
+
+    def terms(self, kind: str, docs: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Term counts of a kind (restricted to docs if given) as doc/term/count/pos columns"""
+        conn = self._connect()
+        try:
+            if docs is None:
+                frame = pd.read_sql_query('SELECT doc, term, count, pos FROM terms WHERE kind = ?',
+                                          conn, params=(kind,))
+            else:
+                # Only this snapshot's documents, looked up through the primary key
+                conn.execute('CREATE TEMP TABLE wanted (doc INTEGER PRIMARY KEY)')
+                conn.executemany('INSERT OR IGNORE INTO wanted VALUES (?)', ((int(doc),) for doc in np.unique(docs)))
+                frame = pd.read_sql_query('SELECT terms.doc, term, count, pos FROM wanted '
+                                          'JOIN terms ON terms.kind = ? AND terms.doc = wanted.doc',
+                                          conn, params=(kind,))
+        finally:
+            conn.close()
+        return frame.astype({'doc': np.int64, 'term': 'category', 'count': np.int32, 'pos': np.int32})
+
+
+def top_terms(terms: pd.DataFrame, docs: np.ndarray, top_n: int = 100) -> List[tuple]:
+    """
+    Most common terms over the rows whose document keys are docs (in row order)
+    A document repeated in several rows counts once per row. Ties keep the
+    order of first appearance, matching Counter.most_common over the
+    concatenated texts.
+    """
+    if len(docs) == 0 or terms.empty:
+        return []
+    unique_docs, first_row, repeats = np.unique(docs, return_index=True, return_counts=True)
+    terms = terms[np.isin(terms['doc'].values, unique_docs)]
+    if terms.empty:
+        return []
+
+    slot = np.searchsorted(unique_docs, terms['doc'].values)
+    weights = terms['count'].values.astype(np.int64) * repeats[slot]
+    order = first_row[slot].astype(np.int64) * (int(terms['pos'].max()) + 1) + terms['pos'].values
+    totals = pd.DataFrame({'term': terms['term'].values, 'weight': weights, 'order': order}) \
+        .groupby('term', observed=True).agg(weight=('weight', 'sum'), order=('order', 'min'))
+    totals = totals.sort_values(['weight', 'order'], ascending=[False, True]).head(top_n)
+    return [(str(term), int(weight)) for term, weight in zip(totals.index, totals['weight'])]
@@ -1,25 +1,170 @@
 """
 Flask Application for Music Data Analysis and Visualization
 """
-from flask import Flask, render_template, jsonify, send_from_directory
-import json
+from flask import Flask, render_template, jsonify, send_from_directory, request, g
 import os
 import sys
+import threading
+import time
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from analysis.data_analyzer import MusicDataAnalyzer
-from analysis.sentiment_analyzer import SentimentAnalyzer
+from analysis.result_cache import COMPRESSORS
+from analysis.startup import BackgroundStartup
+from monitoring.metrics import CONTENT_TYPE, REGISTRY
+from monitoring.profiler import SamplingProfiler
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 
 
-# Initialize analyzers
-data_file = os.path.join(os.path.dirname(__file__), 'data', 'music_data.json')
-analyzer = MusicDataAnalyzer(data_file)
-sentiment_analyzer = SentimentAnalyzer()
+# MUSIC_DATA_FILE may point at a .db store created with storage/music_store.py
+data_file = os.environ.get('MUSIC_DATA_FILE',
+                           os.path.join(os.path.dirname(__file__), 'data', 'music_data.json'))
+# pandas/jieba are imported and the data is loaded in the background, so the
+# server binds right away; /readyz turns 200 once it's in. After that, the
+# reloader swaps in a new analyzer when the data file changes and each request
+# works on the snapshot it picked up at the start. MUSIC_APPROXIMATE=1 answers
+# the unfiltered overview, top artists, word cloud and sentiment from sketches
+startup = BackgroundStartup(data_file, interval=float(os.environ.get('MUSIC_DATA_RELOAD_INTERVAL', 5)),
+                            analyzer_options={'approximate': os.environ.get('MUSIC_APPROXIMATE', '') == '1'}).start()
+
+# Endpoints that answer while the data is still loading
+NO_DATA_ENDPOINTS = {'index', 'serve_static', 'static', 'healthz', 'readyz', 'api_metrics'}
+
+REQUEST_LATENCY = REGISTRY.histogram('music_http_request_duration_seconds', 'API request latency',
+                                     ['endpoint', 'method', 'status'])
+DATASET_ROWS = REGISTRY.gauge('music_dataset_rows', 'Rows in the loaded data snapshot', ['table'])
+DATASET_ROWS.set_function(lambda: {('songs',): len(current_analyzer().df_songs),
+                                   ('comments',): len(current_analyzer().df_comments)} if startup.ready else {})
+CACHE_ENTRIES = REGISTRY.gauge('music_cache_entries', 'Entries in the current snapshot\'s result caches', ['cache'])
+CACHE_ENTRIES.set_function(lambda: {(cache.name,): len(cache) for cache in
+                                    (current_analyzer().cache, current_analyzer().query_cache)}
+                           if startup.ready else {})
+RELOADS = REGISTRY.gauge('music_data_reloads', 'Data snapshots loaded since start')
+RELOADS.set_function(lambda: {(): startup.reloader.generation if startup.ready else 0})
+RELOAD_SECONDS = REGISTRY.gauge('music_data_last_reload_seconds', 'Time taken by the last data reload')
+RELOAD_SECONDS.set_function(lambda: {(): startup.reloader.last_reload_seconds} if startup.ready else {})
+STARTUP_SECONDS = REGISTRY.gauge('music_startup_seconds', 'Time spent in each startup phase', ['phase'])
+STARTUP_SECONDS.set_function(lambda: {(phase,): seconds for phase, seconds in startup.phases.items()})
+
+# MUSIC_PROFILING=1 lets a request ask for its own profile with ?profile=1
+PROFILING = os.environ.get('MUSIC_PROFILING', '') == '1'
+PROFILE_INTERVAL = float(os.environ.get('MUSIC_PROFILE_INTERVAL', 0.001))
+
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+# Largest ?top_n= a request may ask for
+MAX_TOP_N = 100
+
+
+def response_encoding(size: int):
+    """Best encoding the client accepts for a body of this size, None for identity"""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = [encoding for encoding in COMPRESSORS if request.accept_encodings[encoding] > 0]
+    if not accepted:
+        return None
+    return 'br' if 'br' in accepted else accepted[0]
+
+
+def current_analyzer():
+    """The current analyzer snapshot, requests that need it only get through once the data is loaded"""
+    return startup.reloader.analyzer
+
+
+def cached_response(entry, analyzer):
+    """Serve a pre-serialized cache entry with ETag/Last-Modified, compression and conditional GET"""
+    encoding = response_encoding(len(entry.body))
+    if encoding is None:
+        response = app.response_class(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+    else:
+        # Compressed once per entry and encoding, then reused
+        response = app.response_class(entry.compressed(encoding), mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+        response.set_etag(f"{entry.etag}-{encoding}")
+    response.vary.add('Accept-Encoding')
+    response.last_modified = analyzer.last_modified
+    response.headers['X-Data-Version'] = analyzer.version[:12]
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def top_n_arg(default: int) -> int:
+    """?top_n= clamped to 1..MAX_TOP_N"""
+    return min(max(request.args.get('top_n', default, type=int), 1), MAX_TOP_N)
+
+
+def song_query():
+    """Facet filters from the query string (year_from, year_to, artist, album_type, genre), None without any"""
+    # Imported here so importing the app doesn't pull in numpy/pandas; the startup thread has loaded it by now
+    from analysis.facet_index import SongQuery
+
+    query = SongQuery(
+        year_from=request.args.get('year_from', type=int),
+        year_to=request.args.get('year_to', type=int),
+        artist=request.args.get('artist') or None,
+        album_type=request.args.get('album_type') or None,
+        genre=request.args.get('genre') or None,
+    )
+    return None if query.is_empty() else query
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILING and request.args.get('profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident(), interval=PROFILE_INTERVAL).start()
+
+
+@app.before_request
+def require_data():
+    if not startup.ready and request.endpoint not in NO_DATA_ENDPOINTS:
+        response = jsonify({'error': 'Data is still loading' if startup.error is None else startup.error})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_LATENCY.observe(time.perf_counter() - g.request_started,
+                            endpoint=endpoint, method=request.method, status=str(response.status_code))
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    # Replace the body with the sampled stacks, e.g. curl ... | flamegraph.pl > profile.svg
+    profiler.stop()
+    profile = app.response_class(profiler.collapsed(), mimetype='text/plain')
+    profile.headers['X-Profile-Samples'] = str(profiler.samples)
+    profile.headers['X-Profile-Seconds'] = f"{profiler.seconds:.6f}"
+    return profile
+
+
+@app.teardown_request
+def stop_profiler(error=None):
+    # after_request is skipped when a view raises; don't leak the sampler or the switch interval
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once the data is loaded, 503 while it loads or if loading failed"""
+    status = startup.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 
 @app.route('/')
@@ -28,61 +173,189 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/api/dashboard')
+def api_dashboard():
+    """Get every dashboard chart's data in one response, ?sections=overview,sentiment for some of them"""
+    analyzer = current_analyzer()
+    sections = [name.strip() for name in request.args.get('sections', '').split(',') if name.strip()]
+    try:
+        entry = analyzer.dashboard_entry(sections)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_response(entry, analyzer)
+
+
 @app.route('/api/overview')
 def api_overview():
     """Get data overview"""
-    overview = analyzer.get_data_overview()
-    return jsonify(overview)
+    analyzer = current_analyzer()
+    return cached_response(analyzer.get_entry('get_data_overview', query=song_query()), analyzer)
 
 
 @app.route('/api/album-types')
 def api_album_types():
     """Get album types analysis"""
-    data = analyzer.analyze_album_types()
-    return jsonify(data)
+    analyzer = current_analyzer()
+    return cached_response(analyzer.get_entry('analyze_album_types', query=song_query()), analyzer)
 
 
 @app.route('/api/release-trend')
 def api_release_trend():
     """Get release trend analysis"""
-    data = analyzer.analyze_release_trend()
-    return jsonify(data)
+    analyzer = current_analyzer()
+    return cached_response(analyzer.get_entry('analyze_release_trend', query=song_query()), analyzer)
+
+
+@app.route('/api/trend')
+def api_trend():
+    """Get release or comment counts per year/month/day from the rollup tables"""
+    analyzer = current_analyzer()
+    try:
+        entry = analyzer.get_entry('analyze_trend',
+                                   series=request.args.get('series', 'comments'),
+                                   granularity=request.args.get('granularity', 'month'),
+                                   start=request.args.get('start') or None,
+                                   end=request.args.get('end') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_response(entry, analyzer)
 
 
 @app.route('/api/music-genres')
 def api_music_genres():
     """Get music genres analysis"""
-    data = analyzer.analyze_music_genres()
-    return jsonify(data)
+    analyzer = current_analyzer()
+    return cached_response(analyzer.get_entry('analyze_music_genres', query=song_query()), analyzer)
 
 
 @app.route('/api/top-album-types')
 def api_top_album_types():
     """Get top 10 album types"""
-    data = analyzer.analyze_top_album_types(top_n=10)
-    return jsonify(data)
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    return cached_response(analyzer.get_entry('analyze_top_album_types', top_n=top_n, query=song_query()), analyzer)
 
 
 @app.route('/api/top-artists')
 def api_top_artists():
-    """Get top 5 artists"""
-    data = analyzer.analyze_top_artists(top_n=5)
-    return jsonify(data)
+    """Get top 5 artists, ?credits=all counts every artist credited on a song"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(5)
+    credits = request.args.get('credits', 'primary')
+    try:
+        entry = analyzer.get_entry('analyze_top_artists', top_n=top_n, query=song_query(), credits=credits)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_response(entry, analyzer)
+
+
+@app.route('/api/collaborations')
+def api_collaborations():
+    """Get the artist pairs credited together on the most songs"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    return cached_response(analyzer.get_entry('analyze_collaborations', top_n=top_n, query=song_query()), analyzer)
 
 
 @app.route('/api/wordcloud')
 def api_wordcloud():
-    """Get word cloud data"""
-    data = analyzer.generate_wordcloud_data()
-    return jsonify(data)
+    """Get word cloud data, ?source=comment for comment text"""
+    analyzer = current_analyzer()
+    source = request.args.get('source', 'name')
+    if source not in analyzer.term_sources:
+        return jsonify({'error': f"source must be one of {list(analyzer.term_sources)}"}), 400
+    return cached_response(analyzer.get_entry('generate_wordcloud_data', source=source, query=song_query()), analyzer)
+
+
+@app.route('/api/terms/song/<int:song_id>')
+def api_song_terms(song_id):
+    """Get top terms in a song's comments, ?source=name for its name"""
+    analyzer = current_analyzer()
+    source = request.args.get('source', 'comment')
+    if source not in analyzer.term_sources:
+        return jsonify({'error': f"source must be one of {list(analyzer.term_sources)}"}), 400
+    top_n = top_n_arg(50)
+    return cached_response(analyzer.get_entry('song_terms', song_id, source=source, top_n=top_n), analyzer)
+
+
+@app.route('/api/terms/artist/<path:artist>')
+def api_artist_terms(artist):
+    """Get top terms in the comments on an artist's songs, ?source=name for song names"""
+    analyzer = current_analyzer()
+    source = request.args.get('source', 'comment')
+    if source not in analyzer.term_sources:
+        return jsonify({'error': f"source must be one of {list(analyzer.term_sources)}"}), 400
+    top_n = top_n_arg(50)
+    return cached_response(analyzer.get_entry('artist_terms', artist, source=source, top_n=top_n), analyzer)
 
 
 @app.route('/api/sentiment')
 def api_sentiment():
     """Get sentiment analysis of comments"""
-    comments = analyzer.get_comments_for_sentiment()
-    sentiment_data = sentiment_analyzer.analyze_comment_batch(comments)
-    return jsonify(sentiment_data)
+    analyzer = current_analyzer()
+    return cached_response(analyzer.get_entry('analyze_sentiment'), analyzer)
+
+
+@app.route('/api/engagement/songs')
+def api_song_engagement():
+    """Get the songs with the most comments, ?sort=likes/weighted_score/... to rank otherwise"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    sort = request.args.get('sort', 'comments')
+    try:
+        entry = analyzer.get_entry('analyze_song_engagement', top_n=top_n, sort=sort, query=song_query())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_response(entry, analyzer)
+
+
+@app.route('/api/engagement/artists')
+def api_artist_engagement():
+    """Get the artists whose songs have the most comments, ?sort= as for songs"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    sort = request.args.get('sort', 'comments')
+    try:
+        entry = analyzer.get_entry('analyze_artist_engagement', top_n=top_n, sort=sort)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return cached_response(entry, analyzer)
+
+
+@app.route('/api/comments/top')
+def api_top_comments():
+    """Get the most liked comments"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    return cached_response(analyzer.get_entry('top_comments', top_n=top_n, query=song_query()), analyzer)
+
+
+@app.route('/api/comments/song/<int:song_id>')
+def api_song_comments(song_id):
+    """Get a song's comment engagement and its most liked comments"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    return cached_response(analyzer.get_entry('song_comments', song_id, top_n=top_n), analyzer)
+
+
+@app.route('/api/comments/artist/<path:artist>')
+def api_artist_comments(artist):
+    """Get an artist's comment engagement and the most liked comments on their songs"""
+    analyzer = current_analyzer()
+    top_n = top_n_arg(10)
+    return cached_response(analyzer.get_entry('artist_comments', artist, top_n=top_n), analyzer)
+
+
+@app.route('/api/status')
+def api_status():
+    """Get the loaded data snapshot version and reload timings"""
+    return jsonify(startup.reloader.status())
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Get request, analyzer, cache, crawler and dataset metrics in the Prometheus text format"""
+    return app.response_class(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 
 @app.route('/static/<path:filename>')
@@ -92,14 +365,12 @@ def serve_static(filename):
 
 
 if __name__ == '__main__':
+    from storage.music_store import data_exists
+
     # Check if data file exists
-    if not os.path.exists(data_file):
+    if not data_exists(data_file):
         print(f"Warning: Data file {data_file} not found!")
         print("Please run crawler/netease_crawler.py first to collect data.")
-        # Create empty data file
-        os.makedirs(os.path.dirname(data_file), exist_ok=True)
-        with open(data_file, 'w', encoding='utf-8') as f:
-            json.dump({'songs': [], 'comments': []}, f)
     
     print("Starting Flask application...")
     print("Visit http://localhost:5000 to view the dashboard")
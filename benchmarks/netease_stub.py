@@ -0,0 +1,138 @@
+"""
+Local stand-in for the NetEase endpoints the crawler uses
+Serves synthetic playlists, songs and paged comments (see synthetic) with an
+optional per-request delay, so crawler benchmarks don't touch the real site.
+With failures=n every URL is answered with a 503 n times before it succeeds.
+With inline_tracks=n playlist details carry only their first n tracks in full
+and list every track ID in trackIds, like large playlists on the real site.
+"""
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from benchmarks.synthetic import _power_law, _uniform, artist_names, song_names
+
+
+class NetEaseStub:
+    """Threaded HTTP server answering hot playlist, playlist, song detail and comment requests"""
+
+    def __init__(self, song_count: int = 10_000, tracks_per_playlist: int = 50,
+                 comments_per_song: int = 60, latency: float = 0.0, seed: int = 0, failures: int = 0,
+                 inline_tracks: Optional[int] = None):
+        self.song_count = song_count
+        self.tracks_per_playlist = tracks_per_playlist
+        self.comments_per_song = comments_per_song
+        self.latency = latency
+        self.seed = seed
+        self.failures = failures
+        self.inline_tracks = inline_tracks
+        self.requests = 0
+        # URL -> 503s sent for it so far
+        self.failed = {}
+        # Conditional requests answered with 304 Not Modified
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> 'NetEaseStub':
+        self._thread = threading.Thread(target=self.server.serve_forever, name='netease-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _tracks(self, song_ids: np.ndarray):
+        names = song_names(song_ids, self.seed)
+        artists = artist_names(song_ids % max(50, self.song_count // 40), self.seed)
+        return [
+            {
+                'id': int(song_id),
+                'name': name,
+                'artists': [{'name': artist}],
+                'album': {'name': f"{name}专辑", 'type': '录音室专辑',
+                          'publishTime': 1_400_000_000_000 + int(song_id) * 3_600_000},
+                'duration': 200_000 + int(song_id) % 100_000,
+                'popularity': int(song_id) % 100,
+            }
+            for song_id, name, artist in zip(song_ids, names, artists)
+        ]
+
+    def _respond(self, path: str, query: dict) -> Tuple[int, dict]:
+        if path == '/api/playlist/hot':
+            limit = int(query.get('limit', ['50'])[0])
+            return 200, {'playlists': [{'id': pid, 'name': f"歌单{pid}", 'updateTime': pid}
+                                       for pid in range(1, limit + 1)]}
+        if path == '/api/playlist/detail':
+            pid = int(query['id'][0])
+            # Playlists overlap on popular songs, like real hot playlists
+            slots = np.arange(self.tracks_per_playlist, dtype=np.int64) + pid * 100_003
+            song_ids = _power_law(_uniform(slots, self.seed, 60), self.song_count) + 1
+            if self.inline_tracks is None:
+                return 200, {'result': {'tracks': self._tracks(song_ids)}}
+            return 200, {'result': {'tracks': self._tracks(song_ids[:self.inline_tracks]),
+                                    'trackIds': [{'id': int(song_id)} for song_id in song_ids]}}
+        if path == '/api/song/detail':
+            ids = np.array(json.loads(query['ids'][0]), dtype=np.int64)
+            return 200, {'songs': self._tracks(ids)}
+        if path.startswith('/api/v1/resource/comments/R_SO_4_'):
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', ['20'])[0])
+            end = min(offset + limit, self.comments_per_song)
+            comments = [{'content': f"第{i + 1}条评论，太好听了", 'time': 1_640_000_000_000 + i * 60_000,
+                         'likedCount': i % 50} for i in range(offset, end)]
+            return 200, {'comments': comments, 'total': self.comments_per_song, 'more': end < self.comments_per_song}
+        return 404, {}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    fail = stub.failed.get(self.path, 0) < stub.failures
+                    if fail:
+                        stub.failed[self.path] = stub.failed.get(self.path, 0) + 1
+                if fail:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlparse(self.path)
+                status, body = stub._respond(url.path, parse_qs(url.query))
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,421 @@
+"""
+Benchmark suite for the crawler, analyzer and API
+Times each scenario on a synthetic dataset (see synthetic) and writes the
+results as JSON, so runs on different commits can be compared.
+
+    python -m benchmarks.run --scale 100k --output bench.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+try:
+    from benchmarks.synthetic import SCALES, write_dataset
+except ImportError:  # running as a script: python benchmarks/run.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.synthetic import SCALES, write_dataset
+
+from analysis.data_analyzer import MusicDataAnalyzer
+from analysis.facet_index import SongQuery
+from analysis.term_index import TermIndex
+
+SCENARIOS = ['generate', 'startup', 'load', 'analyzer', 'sentiment', 'api', 'crawler']
+
+# Analyzer method -> kwargs, each timed without the result cache
+ANALYZER_CALLS = {
+    'get_data_overview': {},
+    'analyze_album_types': {},
+    'analyze_release_trend': {},
+    'analyze_music_genres': {},
+    'analyze_top_album_types': {'top_n': 10},
+    'analyze_top_artists': {'top_n': 5},
+    'analyze_top_artists[all]': {'top_n': 5, 'credits': 'all'},
+    'analyze_collaborations': {},
+    'analyze_sentiment': {},
+    'analyze_song_engagement': {'sort': 'weighted_score'},
+    'analyze_artist_engagement': {'sort': 'likes'},
+    'top_comments[query]': {'query': SongQuery(genre='流行')},
+    'analyze_trend': {'series': 'comments', 'granularity': 'day'},
+    'generate_wordcloud_data': {'source': 'name'},
+    'generate_wordcloud_data[comment]': {'source': 'comment'},
+    'analyze_music_genres[query]': {'query': SongQuery(year_from=2010, year_to=2020, genre='流行')},
+    'analyze_top_artists[query]': {'query': SongQuery(album_type='单曲')},
+}
+
+API_REQUESTS = [
+    ('/api/overview', {}),
+    ('/api/album-types', {}),
+    ('/api/release-trend', {}),
+    ('/api/music-genres', {}),
+    ('/api/top-artists', {}),
+    ('/api/wordcloud', {}),
+    ('/api/sentiment', {}),
+    ('/api/trend?granularity=day', {}),
+    ('/api/music-genres?year_from=2010&year_to=2020', {}),
+    ('/api/dashboard', {}),
+    ('/api/dashboard', {'Accept-Encoding': 'gzip'}),
+]
+
+# Cold start budget in seconds for up to 100k songs: the port must be bound
+# (app imported) within bind, and /readyz must be 200 within ready
+STARTUP_BUDGET = {'bind': 0.5, 'ready': 5.0}
+
+# Regressions are reported when a median gets slower than this ratio
+REGRESSION_RATIO = 1.2
+
+
+def timed(fn: Callable, repeat: int = 3) -> Dict:
+    """Run fn repeat times, returns min/median/max seconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return {
+        'min': round(min(samples), 6),
+        'median': round(statistics.median(samples), 6),
+        'max': round(max(samples), 6),
+        'repeat': repeat,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far"""
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def bench_load(data_file: str, workdir: str, repeat: int) -> Dict:
+    """Analyzer load with an empty term index (cold) and with the one the cold load left (warm)"""
+    results = {}
+    index_path = os.path.join(workdir, 'terms.db')
+
+    def cold():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        MusicDataAnalyzer(data_file, auto_refresh=False, term_index=TermIndex(index_path))
+
+    results['load.cold'] = timed(cold, repeat)
+    results['load.warm'] = timed(
+        lambda: MusicDataAnalyzer(data_file, auto_refresh=False, term_index=TermIndex(index_path)), repeat)
+    results['load.no_precompute'] = timed(
+        lambda: MusicDataAnalyzer(data_file, auto_refresh=False, precompute=False,
+                                  term_index=TermIndex(index_path)), repeat)
+    results['load.peak_rss_mb'] = {'value': peak_rss_mb()}
+    return results
+
+
+def bench_analyzer(analyzer: MusicDataAnalyzer, repeat: int) -> Dict:
+    """Each analysis method computed from scratch, plus a full precompute"""
+    results = {}
+    for key, kwargs in ANALYZER_CALLS.items():
+        name = key.split('[')[0]
+        # Bypass the result cache to time the computation itself
+        method = getattr(MusicDataAnalyzer, name).__wrapped__
+        results[f'analyzer.{key}'] = timed(lambda: method(analyzer, **kwargs), repeat)
+
+    def precompute():
+        analyzer.cache.clear()
+        analyzer.precompute_aggregates()
+
+    results['analyzer.precompute_aggregates'] = timed(precompute, repeat)
+    return results
+
+
+def bench_sentiment(analyzer: MusicDataAnalyzer, repeat: int) -> Dict:
+    """Keyword sentiment over every comment"""
+    from analysis.sentiment_analyzer import SentimentAnalyzer
+
+    comments = analyzer.get_comments_for_sentiment()
+    sentiment = SentimentAnalyzer()
+    return {'sentiment._analyze_simple': timed(lambda: sentiment._analyze_simple(comments), repeat)}
+
+
+def bench_api(data_file: str, requests_per_endpoint: int) -> Dict:
+    """Flask endpoints through the test client, per-request latency"""
+    os.environ['MUSIC_DATA_FILE'] = data_file
+    # The benchmark doesn't change the data, keep the watcher quiet
+    os.environ['MUSIC_DATA_RELOAD_INTERVAL'] = '3600'
+    import app as app_module
+
+    reloader = app_module.startup.wait()
+    results = {}
+    client = app_module.app.test_client()
+    try:
+        for path, headers in API_REQUESTS:
+            latencies = []
+            for _ in range(requests_per_endpoint):
+                started = time.perf_counter()
+                response = client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}")
+            latencies.sort()
+            key = f"api.{path}" + (f"[{headers['Accept-Encoding']}]" if headers else '')
+            results[key] = {
+                'mean': round(statistics.mean(latencies), 6),
+                'p50': round(latencies[len(latencies) // 2], 6),
+                'p99': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 6),
+                'bytes': len(response.data),
+                'repeat': requests_per_endpoint,
+            }
+    finally:
+        reloader.stop()
+    return results
+
+
+STARTUP_SCRIPT = """
+import json, time
+import app
+imported = time.time()
+app.startup.wait()
+print(json.dumps({'import': imported, 'ready': time.time()}))
+"""
+
+
+def bench_startup(data_file: str, repeat: int) -> Dict:
+    """Cold start in a fresh interpreter: until the app can bind (import) and until /readyz is 200"""
+    env = dict(os.environ, MUSIC_DATA_FILE=data_file, MUSIC_DATA_RELOAD_INTERVAL='3600')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = []
+    for _ in range(repeat):
+        # Wall clock from launch, so interpreter startup counts too, as it does for a new container
+        launched = time.time()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=env, cwd=root, check=True,
+                                capture_output=True, text=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        runs.append({'bind': timings['import'] - launched, 'ready': timings['ready'] - launched})
+
+    results = {}
+    for phase, budget in STARTUP_BUDGET.items():
+        samples = sorted(run[phase] for run in runs)
+        median = statistics.median(samples)
+        results[f'startup.{phase}'] = {
+            'min': round(samples[0], 6),
+            'median': round(median, 6),
+            'max': round(samples[-1], 6),
+            'repeat': repeat,
+            'budget': budget,
+            'within_budget': median <= budget,
+        }
+    return results
+
+
+def bench_crawler(songs: int, playlists: int, latency: float) -> Dict:
+    """A concurrent crawl against a local stub of the NetEase API"""
+    from benchmarks.netease_stub import NetEaseStub
+    from crawler.dedup import CommentSamplingPolicy
+    from crawler.http_cache import HTTPCache
+    from crawler.netease_crawler import NetEaseMusicCrawler
+
+    from crawler.pipeline import crawl_to_store
+
+    stub = NetEaseStub(song_count=songs, latency=latency).start()
+    output = tempfile.mkdtemp(prefix='music-bench-crawl-')
+    try:
+        crawler = NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=10_000, burst=100)
+        started = time.perf_counter()
+        data = crawler.crawl_music_data(num_playlists=playlists, songs_per_playlist=stub.tracks_per_playlist,
+                                        concurrent=True)
+        seconds = time.perf_counter() - started
+        requests = stub.requests
+
+        # The same crawl streamed into a JSON Lines file
+        started = time.perf_counter()
+        stats = crawl_to_store(crawler, os.path.join(output, 'crawl.jsonl'), num_playlists=playlists,
+                               songs_per_playlist=stub.tracks_per_playlist, concurrent=True)
+        stream_seconds = time.perf_counter() - started
+        stream_requests = stub.requests - requests
+
+        # A repeat crawl through a warmed response cache: fresh entries skip the
+        # server, comment pages come back as 304s. Every song's comments are
+        # fetched so both runs ask for the same pages whatever order songs arrive in
+        cache = HTTPCache(os.path.join(output, 'http_cache.db'))
+        cached = NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=10_000, burst=100, cache=cache)
+        cached.crawl_music_data(num_playlists=playlists, songs_per_playlist=stub.tracks_per_playlist,
+                                concurrent=True, comment_policy=CommentSamplingPolicy(every_n=1))
+        before, not_modified = stub.requests, stub.not_modified
+        started = time.perf_counter()
+        cached.crawl_music_data(num_playlists=playlists, songs_per_playlist=stub.tracks_per_playlist,
+                                concurrent=True, comment_policy=CommentSamplingPolicy(every_n=1))
+        cached_seconds = time.perf_counter() - started
+        cached_requests = stub.requests - before
+        cache_summary = cache.summary()
+        cache.close()
+    finally:
+        stub.stop()
+        shutil.rmtree(output, ignore_errors=True)
+    return {
+        'crawler.crawl_concurrent': {
+            'seconds': round(seconds, 6),
+            'requests': requests,
+            'requests_per_second': round(requests / seconds, 1),
+            'songs': len(data.get('songs', [])),
+            'comments': len(data.get('comments', [])),
+            'latency': latency,
+        },
+        'crawler.crawl_stream': {
+            'seconds': round(stream_seconds, 6),
+            'requests': stream_requests,
+            'requests_per_second': round(stream_requests / stream_seconds, 1),
+            'songs': stats['songs'],
+            'comments': stats['comments'],
+            'checkpoints': stats['checkpoints'],
+            'latency': latency,
+        },
+        'crawler.crawl_cached': {
+            'seconds': round(cached_seconds, 6),
+            'requests': cached_requests,
+            'not_modified': stub.not_modified - not_modified,
+            'hit_rate': cache_summary['hit_rate'],
+            'cache_bytes': cache_summary['bytes'],
+            'latency': latency,
+        },
+    }
+
+
+def run(args) -> Dict:
+    songs = args.songs or SCALES[args.scale]
+    scenarios = args.scenarios or SCENARIOS
+    workdir = tempfile.mkdtemp(prefix='music-bench-')
+    results = {}
+    try:
+        data_file = args.data
+        dataset = {'path': data_file}
+        if data_file is None:
+            data_file = os.path.join(workdir, f'music_data.{args.format}')
+            dataset = write_dataset(data_file, songs, args.comments, args.seed)
+            if 'generate' in scenarios:
+                results['generate'] = {'seconds': dataset['seconds'], 'bytes': dataset['bytes']}
+        print(f"Dataset: {dataset}")
+
+        if 'startup' in scenarios:
+            results.update(bench_startup(data_file, args.repeat))
+        if 'load' in scenarios:
+            results.update(bench_load(data_file, workdir, args.repeat))
+        if 'analyzer' in scenarios or 'sentiment' in scenarios:
+            analyzer = MusicDataAnalyzer(data_file, auto_refresh=False,
+                                         term_index=TermIndex(os.path.join(workdir, 'terms.db')))
+            if 'analyzer' in scenarios:
+                results.update(bench_analyzer(analyzer, args.repeat))
+            if 'sentiment' in scenarios:
+                results.update(bench_sentiment(analyzer, args.repeat))
+            del analyzer
+        if 'api' in scenarios:
+            results.update(bench_api(data_file, args.requests))
+        if 'crawler' in scenarios:
+            results.update(bench_crawler(songs, args.playlists, args.latency))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'scale': args.scale,
+            'songs': songs,
+            'seed': args.seed,
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+
+
+def _headline(result: Dict):
+    """The number compared across runs: median/p50 time, or the plain value"""
+    for field in ('median', 'p50', 'seconds', 'value'):
+        if field in result:
+            return result[field]
+    return None
+
+
+def compare(before_path: str, after_path: str) -> List[str]:
+    """Print the change of every shared result, returns the ones that regressed"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+
+    regressions = []
+    for name, result in after['results'].items():
+        if name not in before['results']:
+            continue
+        old, new = _headline(before['results'][name]), _headline(result)
+        if not old or new is None:
+            continue
+        ratio = new / old
+        flag = ''
+        if ratio > REGRESSION_RATIO:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:50s} {old:>12.6g} {new:>12.6g} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler, analyzer and API')
+    parser.add_argument('--scale', choices=list(SCALES), default='10k', help='Number of songs')
+    parser.add_argument('--songs', type=int, help='Number of songs (overrides --scale)')
+    parser.add_argument('--comments', type=int, help='Number of comments (default: as many as songs)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', help='Benchmark an existing data file instead of generating one')
+    parser.add_argument('--format', choices=['json', 'jsonl', 'db'], default='json',
+                        help='Format of the generated data file')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, help='Scenarios to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per timed scenario')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per API endpoint')
+    parser.add_argument('--playlists', type=int, default=20, help='Playlists to crawl from the stub')
+    parser.add_argument('--latency', type=float, default=0.005, help='Stub response delay in seconds')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='Compare two result files and exit non-zero on regressions')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare)
+        if regressions:
+            print(f"{len(regressions)} regressions over {REGRESSION_RATIO}x")
+            sys.exit(1)
+        return
+
+    report = run(args)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+    over_budget = [name for name, result in report['results'].items() if result.get('within_budget') is False]
+    if over_budget:
+        print(f"Over the cold start budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
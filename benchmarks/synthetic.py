@@ -0,0 +1,256 @@
+"""
+Synthetic music data in the crawler's schema
+Every attribute is a hash of the record's ID and the seed, so chunks can be
+generated independently (and comments can look up their song's name) without
+holding the dataset in memory. Artist and song popularity follow power laws.
+
+    python -m benchmarks.synthetic --scale 1m data/bench_1m.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List
+
+import numpy as np
+
+try:
+    from storage.music_store import is_writable, open_store
+except ImportError:  # running as a script: python benchmarks/synthetic.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from storage.music_store import is_writable, open_store
+
+# Scale name -> number of songs (comments default to the same number)
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+TITLE_WORDS = ['晴天', '告白', '气球', '夜曲', '稻香', '青花瓷', '后来', '平凡', '之路', '起风了', '演员', '光年',
+               '之外', '成都', '南山', '孤勇者', '海阔', '天空', '年少', '岁月', '神偷', '小幸运', '漂洋过海',
+               '匆匆', '那年', '十年', '遇见', '夜空', '最亮', '星星', '春风', '十里', '消愁', '追光者', '少年',
+               '星辰', '大海', '时光', '恋人', '心愿', '旅行', '故事', '爱情', '城市', '梦想', '微风', '月光',
+               '下雨天', '回忆', '远方', '告别', '明天', '你好', '再见', '永远', '孤独', '温柔', '倔强', '晚安']
+GENRE_WORDS = ['流行', '摇滚', '民谣', '电子', '说唱', '爵士', '古典', 'Rock', 'Pop', 'Folk', 'Jazz', 'Rap', 'EDM']
+TITLE_SUFFIXES = ['', '', '', '', '', ' (Live)', ' (伴奏版)', ' (Remix)', ' - 电影原声']
+SURNAMES = ['周', '陈', '林', '王', '李', '张', '刘', '杨', '赵', '黄', '吴', '徐', '孙', '马', '朱', '胡', '郭',
+            '何', '高', '罗', '薛', '邓', '毛', '蔡', '许']
+GIVEN_NAMES = ['杰伦', '奕迅', '俊杰', '菲', '宇', '子琪', '然', '晨', '雨', '欣怡', '浩', '一帆', '小明', '慧',
+               '琳', '东', '之谦', '紫棋', '不易', '雷', '健', '嘉', '磊', '婷', '伟']
+BAND_SUFFIXES = ['', '', '', '', '乐队', '组合']
+ALBUM_WORDS = ['专辑', '精选', '新歌', '合集', '纪念', '演唱会', '原声带', '第一张', '十年']
+ALBUM_TYPES = ['录音室专辑', '单曲', 'EP', '现场专辑', '影视原声', '合辑']
+ALBUM_TYPE_WEIGHTS = [0.45, 0.25, 0.1, 0.08, 0.07, 0.05]
+
+POSITIVE_PHRASES = ['太好听了', '单曲循环', '很喜欢这首歌', '感动', '治愈', '完美', '温柔的声音', '经典永流传',
+                    '赞', '前奏一响就爱了']
+NEGATIVE_PHRASES = ['难听', '失望', '无聊', '太差了', '讨厌这种编曲', '听得伤心']
+NEUTRAL_PHRASES = ['路过', '打卡', '第一次听', '今天下雨了', '想起了以前', '有人在听吗', '来自热评',
+                   '周末愉快', '上班路上', '评论区好热闹']
+NEGATED_PHRASES = ['不太喜欢', '没有感动', '并不完美', '不是很好']
+
+START_YEAR = 1980
+END_YEAR = 2024
+DAY_MS = 86_400_000
+EPOCH_2015_MS = int(datetime(2015, 1, 1).timestamp() * 1000)
+EPOCH_2025_MS = int(datetime(2025, 1, 1).timestamp() * 1000)
+
+
+def _uniform(ids: np.ndarray, seed: int, stream: int) -> np.ndarray:
+    """Uniform [0, 1) per ID from a splitmix64 hash of (ID, seed, stream)"""
+    x = ids.astype(np.uint64) ^ np.uint64((seed * 0x9E3779B1 + stream * 0x85EBCA77) & 0xFFFFFFFFFFFFFFFF)
+    with np.errstate(over='ignore'):
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _pick(values: List[str], u: np.ndarray) -> np.ndarray:
+    return np.asarray(values, dtype=object)[(u * len(values)).astype(np.int64)]
+
+
+def _power_law(u: np.ndarray, count: int) -> np.ndarray:
+    """Rank in [0, count) with P(rank < r) = log(r + 1) / log(count + 1) (Zipf-like)"""
+    return np.minimum(np.exp(u * np.log(count + 1)).astype(np.int64) - 1, count - 1)
+
+
+def artist_names(ranks: np.ndarray, seed: int) -> np.ndarray:
+    """Name of the artist at each popularity rank"""
+    surname = _pick(SURNAMES, _uniform(ranks, seed, 1))
+    given = _pick(GIVEN_NAMES, _uniform(ranks, seed, 2))
+    band = _pick(BAND_SUFFIXES, _uniform(ranks, seed, 3))
+    names = surname + given + band
+    # Disambiguate the long tail that runs out of name combinations
+    suffix = np.where(ranks >= len(SURNAMES) * len(GIVEN_NAMES), ranks.astype(str), '')
+    return names + suffix
+
+
+def song_names(song_ids: np.ndarray, seed: int) -> np.ndarray:
+    """Song title of each song ID"""
+    first = _pick(TITLE_WORDS, _uniform(song_ids, seed, 10))
+    second = _pick(TITLE_WORDS, _uniform(song_ids, seed, 11))
+    single = _uniform(song_ids, seed, 12) < 0.4
+    genre = _uniform(song_ids, seed, 13) < 0.15
+    names = np.where(single, first, first + second)
+    names = np.where(genre, names + _pick(GENRE_WORDS, _uniform(song_ids, seed, 14)), names)
+    return names + _pick(TITLE_SUFFIXES, _uniform(song_ids, seed, 15))
+
+
+def generate_songs(count: int, seed: int = 0, chunk_size: int = 100_000) -> Iterator[List[Dict]]:
+    """Songs with IDs 1..count, in chunks of records"""
+    artist_count = max(50, count // 40)
+    album_count = max(20, count // 10)
+    type_bounds = np.cumsum(ALBUM_TYPE_WEIGHTS)
+    for start in range(1, count + 1, chunk_size):
+        ids = np.arange(start, min(start + chunk_size, count + 1), dtype=np.int64)
+        artist_rank = _power_law(_uniform(ids, seed, 20), artist_count)
+        featured = _uniform(ids, seed, 21) < 0.1
+        featured_rank = _power_law(_uniform(ids, seed, 22), artist_count)
+        main_artists = artist_names(artist_rank, seed)
+        featured_artists = artist_names(featured_rank, seed)
+
+        # Albums belong to an artist: a handful of album slots per artist
+        album_id = (artist_rank * 7 + (_uniform(ids, seed, 23) * 7).astype(np.int64)) % album_count
+        album_names = _pick(TITLE_WORDS, _uniform(album_id, seed, 24)) + _pick(ALBUM_WORDS, _uniform(album_id, seed, 25))
+        album_types = np.asarray(ALBUM_TYPES, dtype=object)[
+            np.minimum(np.searchsorted(type_bounds, _uniform(album_id, seed, 26)), len(ALBUM_TYPES) - 1)]
+
+        # Release years skew recent
+        years_back = np.minimum(-np.log1p(-_uniform(ids, seed, 27)) * 8, END_YEAR - START_YEAR).astype(np.int64)
+        year_start = np.array([datetime(END_YEAR - back, 1, 1).timestamp() * 1000
+                               for back in range(END_YEAR - START_YEAR + 1)], dtype=np.int64)
+        publish_time = year_start[years_back] + (_uniform(ids, seed, 28) * 365).astype(np.int64) * DAY_MS
+
+        duration = np.clip(240_000 + (_uniform(ids, seed, 29) - 0.5) * 180_000, 60_000, 600_000).astype(np.int64)
+        popularity = np.clip(100 - np.log1p(artist_rank) * 8 + (_uniform(ids, seed, 30) - 0.5) * 30, 0, 100).astype(np.int64)
+        playlist = (_uniform(ids, seed, 31) * max(1, count // 50)).astype(np.int64) + 1
+        names = song_names(ids, seed)
+
+        yield [
+            {
+                'id': int(ids[i]),
+                'name': names[i],
+                'artists': [main_artists[i], featured_artists[i]] if featured[i] and featured_rank[i] != artist_rank[i]
+                else [main_artists[i]],
+                'album': album_names[i],
+                'album_type': album_types[i],
+                'publish_time': int(publish_time[i]),
+                'duration': int(duration[i]),
+                'popularity': int(popularity[i]),
+                'playlists': [int(playlist[i])],
+            }
+            for i in range(len(ids))
+        ]
+
+
+def _comment_texts(ids: np.ndarray, seed: int) -> List[str]:
+    kind = _uniform(ids, seed, 40)
+    parts = (_uniform(ids, seed, 41) * 3).astype(np.int64) + 1
+    pools = [
+        (0.35, POSITIVE_PHRASES),
+        (0.45, NEUTRAL_PHRASES),
+        (0.55, NEGATIVE_PHRASES),
+        (1.0, NEGATED_PHRASES + NEUTRAL_PHRASES),
+    ]
+    pool_index = np.searchsorted([bound for bound, _ in pools], kind, side='right')
+    pool_index = np.minimum(pool_index, len(pools) - 1)
+    phrases = [[_pick(pool, _uniform(ids, seed, 42 + slot)) for _, pool in pools] for slot in range(3)]
+    return [
+        '，'.join(phrases[slot][pool_index[i]][i] for slot in range(parts[i]))
+        for i in range(len(ids))
+    ]
+
+
+def generate_comments(count: int, song_count: int, seed: int = 0,
+                      chunk_size: int = 100_000) -> Iterator[List[Dict]]:
+    """Comments spread over songs 1..song_count with popular songs getting most of them"""
+    for start in range(0, count, chunk_size):
+        ids = np.arange(start, min(start + chunk_size, count), dtype=np.int64)
+        song_ids = _power_law(_uniform(ids, seed, 50), song_count) + 1
+        names = song_names(song_ids, seed)
+        times = EPOCH_2015_MS + (_uniform(ids, seed, 51) * (EPOCH_2025_MS - EPOCH_2015_MS)).astype(np.int64)
+        # Heavy-tailed likes: most comments get a few, some get thousands
+        likes = np.minimum((1 / np.maximum(1 - _uniform(ids, seed, 52), 1e-6)) ** 1.3 - 1, 1_000_000).astype(np.int64)
+        texts = _comment_texts(ids, seed)
+        yield [
+            {
+                'song_id': int(song_ids[i]),
+                'song_name': names[i],
+                'content': texts[i],
+                'time': int(times[i]),
+                'liked_count': int(likes[i]),
+            }
+            for i in range(len(ids))
+        ]
+
+
+def write_dataset(path: str, songs: int, comments: int = None, seed: int = 0,
+                  chunk_size: int = 100_000) -> Dict:
+    """
+    Write a synthetic dataset to path (.json, .jsonl or .db) chunk by chunk
+    Returns the record counts and how long it took.
+    """
+    if not is_writable(path):
+        raise ValueError(f"Can't write a dataset to {path}, a directory or glob of shards is read-only")
+    comments = songs if comments is None else comments
+    started = time.perf_counter()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if os.path.splitext(path)[1].lower() == '.json':
+        # JSONStore.write takes the whole dataset, stream the file instead
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for table, chunks in (('songs', generate_songs(songs, seed, chunk_size)),
+                                  ('comments', generate_comments(comments, songs, seed, chunk_size))):
+                f.write('{' if table == 'songs' else ', ')
+                f.write(f'"{table}": [')
+                first = True
+                for chunk in chunks:
+                    for record in chunk:
+                        f.write('\n' if first else ',\n')
+                        f.write(json.dumps(record, ensure_ascii=False))
+                        first = False
+                f.write('\n]')
+            f.write(f', "crawl_time": {json.dumps(datetime.now().isoformat())}}}\n')
+        os.replace(tmp_path, path)
+    else:
+        store = open_store(path)
+        store.write({'songs': [], 'comments': []})
+        for chunk in generate_songs(songs, seed, chunk_size):
+            store.append({'songs': chunk, 'comments': []})
+        for chunk in generate_comments(comments, songs, seed, chunk_size):
+            store.append({'songs': [], 'comments': chunk})
+
+    return {
+        'path': path,
+        'songs': songs,
+        'comments': comments,
+        'seed': seed,
+        'seconds': round(time.perf_counter() - started, 3),
+        'bytes': os.path.getsize(path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic music dataset')
+    parser.add_argument('output', help='Output file (.json, .jsonl or .db)')
+    parser.add_argument('--scale', choices=list(SCALES), default='10k', help='Number of songs')
+    parser.add_argument('--songs', type=int, help='Number of songs (overrides --scale)')
+    parser.add_argument('--comments', type=int, help='Number of comments (default: as many as songs)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    songs = args.songs or SCALES[args.scale]
+    print(json.dumps(write_dataset(args.output, songs, args.comments, args.seed), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Persistent crawl state for resumable and incremental crawling
+"""
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+class CrawlState:
+    """
+    Seen-ID index and checkpoint of an in-progress crawl
+
+    playlists:       playlist id -> update time seen when it was last crawled
+    songs:           ids of songs already collected
+    comment_offsets: song id -> number of comments fetched so far
+    run:             records of the unfinished run, kept so a crash can resume
+                     (only the playlists done when the records are streamed to a store)
+    """
+
+    def __init__(self, path: str = 'data/crawl_state.json'):
+        self.path = path
+        self.playlists: Dict[str, int] = {}
+        self.songs = set()
+        self.comment_offsets: Dict[str, int] = {}
+        self.run: Optional[Dict] = None
+        self.load()
+
+    def load(self):
+        """Load state from disk, starting empty if there is none"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except json.JSONDecodeError as e:
+            print(f"Crawl state {self.path} is corrupt, starting fresh: {e}")
+            return
+
+        self.playlists = state.get('playlists', {})
+        self.songs = set(state.get('songs', []))
+        self.comment_offsets = state.get('comment_offsets', {})
+        self.run = state.get('run')
+
+    def save(self):
+        """Write state atomically so a crash mid-write can't corrupt it"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        state = {
+            'playlists': self.playlists,
+            'songs': sorted(self.songs),
+            'comment_offsets': self.comment_offsets,
+            'run': self.run,
+            'saved_at': time.time()
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def start_run(self, keep_records: bool = True) -> bool:
+        """
+        Begin a run, returns True when resuming an interrupted one
+        keep_records=False doesn't keep the run's records in the state, for
+        crawls that write them to a store as they go
+        """
+        if self.run is not None:
+            print(f"Resuming crawl: {len(self.run['playlists'])} playlists already done")
+            self.run['keep_records'] = keep_records
+            return True
+        self.run = {'started': time.time(), 'playlists': [], 'songs': [], 'comments': [],
+                    'keep_records': keep_records}
+        return False
+
+    def finish_run(self) -> Dict:
+        """Close the current run and return everything it collected"""
+        run = self.run or {'songs': [], 'comments': []}
+        self.run = None
+        self.save()
+        return {'songs': run['songs'], 'comments': run['comments']}
+
+    def should_skip_playlist(self, playlist_id, update_time: int = 0, incremental: bool = False) -> bool:
+        """Skip playlists done earlier in this run, or unchanged ones in incremental mode"""
+        key = str(playlist_id)
+        if self.run is not None and key in self.run['playlists']:
+            return True
+        return incremental and bool(update_time) and self.playlists.get(key) == update_time
+
+    def mark_playlist(self, playlist_id, update_time: int = 0):
+        """Record a fully processed playlist"""
+        key = str(playlist_id)
+        self.playlists[key] = update_time
+        if self.run is not None:
+            self.run['playlists'].append(key)
+
+    def has_song(self, song_id) -> bool:
+        return str(song_id) in self.songs
+
+    def add_song(self, song: Dict):
+        """Record a collected song"""
+        self.songs.add(str(song['id']))
+        if self.run is not None and self.run.get('keep_records', True):
+            self.run['songs'].append(song)
+
+    def comment_offset(self, song_id) -> int:
+        return self.comment_offsets.get(str(song_id), 0)
+
+    def add_comments(self, song_id, comments: List[Dict]):
+        """Record fetched comments and advance the song's comment offset"""
+        key = str(song_id)
+        self.comment_offsets[key] = self.comment_offsets.get(key, 0) + len(comments)
+        if self.run is not None and self.run.get('keep_records', True):
+            self.run['comments'].extend(comments)
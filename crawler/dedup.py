@@ -0,0 +1,94 @@
+"""
+Song deduplication and comment sampling for the crawler
+"""
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SongIndex:
+    """
+    Song records keyed by song ID
+    A song that shows up in several playlists is kept once, with every
+    playlist it was seen in merged into its 'playlists' field.
+    With keep_records=False only the IDs and their playlists are kept, for
+    crawls that stream records out instead of collecting them; add() then
+    returns a copy of the record so later merges don't change it.
+    """
+
+    def __init__(self, songs: Optional[Iterable[Dict]] = None, keep_records: bool = True):
+        self.keep_records = keep_records
+        self._songs: Dict = {}
+        self._playlists: Dict = {}
+        for song in songs or []:
+            if song['id'] not in self._playlists:
+                self._playlists[song['id']] = song.setdefault('playlists', [])
+                if keep_records:
+                    self._songs[song['id']] = song
+
+    def __len__(self) -> int:
+        return len(self._playlists)
+
+    def __contains__(self, song_id) -> bool:
+        return song_id in self._playlists
+
+    def playlists(self, song_id) -> List:
+        """Playlists a song was seen in, empty for an unknown song"""
+        return self._playlists.get(song_id, [])
+
+    def add(self, song: Dict, playlist_id=None) -> Tuple[Dict, bool]:
+        """Add a song, returns the stored record and whether it was new"""
+        playlists = self._playlists.get(song['id'])
+        is_new = playlists is None
+        if is_new:
+            playlists = song.setdefault('playlists', [])
+            self._playlists[song['id']] = playlists
+            if self.keep_records:
+                self._songs[song['id']] = song
+
+        if playlist_id is not None and playlist_id not in playlists:
+            playlists.append(playlist_id)
+        if self.keep_records:
+            return self._songs[song['id']], is_new
+        return dict(song, playlists=list(playlists)), is_new
+
+    def songs(self) -> List[Dict]:
+        return list(self._songs.values())
+
+
+class CommentSamplingPolicy:
+    """
+    Decide which unique songs get their comments fetched
+
+    every_n:       sample one in every n unique songs
+    per_playlist:  only the first k tracks of a playlist are eligible
+    max_songs:     stop sampling after this many songs
+    probability:   sample eligible songs at random instead of every_n
+    """
+
+    def __init__(self, every_n: int = 5, per_playlist: Optional[int] = None,
+                 max_songs: Optional[int] = None, probability: Optional[float] = None,
+                 seed: Optional[int] = None):
+        self.every_n = max(1, every_n)
+        self.per_playlist = per_playlist
+        self.max_songs = max_songs
+        self.probability = probability
+        self._random = random.Random(seed)
+        self._seen = 0
+        self.sampled = 0
+
+    def should_sample(self, song: Dict, position: int = 0) -> bool:
+        """Call once per unique song, position is its index within the playlist"""
+        self._seen += 1
+        if self.max_songs is not None and self.sampled >= self.max_songs:
+            return False
+        if self.per_playlist is not None and position >= self.per_playlist:
+            return False
+
+        if self.probability is not None:
+            selected = self._random.random() < self.probability
+        else:
+            selected = self._seen % self.every_n == 0
+
+        if selected:
+            self.sampled += 1
+        return selected
@@ -0,0 +1,191 @@
+"""
+On-disk HTTP response cache for the crawler
+Responses are stored in SQLite keyed by their full URL. An entry is served
+without a request until its endpoint's TTL runs out; after that it is
+revalidated with If-None-Match / If-Modified-Since when the server sent an
+ETag or Last-Modified, and a 304 renews it. The least recently used entries
+are evicted once the bodies exceed max_bytes. With offline=True every cached
+entry is served regardless of age and a miss fails, for replaying a crawl.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from monitoring.metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter('music_crawler_cache_requests', 'Crawler HTTP cache lookups by result',
+                                 ['endpoint', 'result'])
+
+# Endpoint -> seconds a response is served without asking the server again
+DEFAULT_TTLS = {
+    '/api/playlist/hot': 10 * 60,
+    '/api/playlist/detail': 60 * 60,
+    '/api/song/detail': 24 * 60 * 60,
+    # New comments keep arriving, so pages are always revalidated
+    '/api/v1/resource/comments': 0,
+}
+
+# Response headers kept with an entry
+STORED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    status: int
+    headers: Dict
+    body: bytes
+    expires_at: float
+
+    @property
+    def validators(self) -> Dict:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+
+class HTTPCache:
+    """SQLite-backed response cache with per-endpoint TTLs, revalidation and LRU eviction by size"""
+
+    def __init__(self, path: str = 'data/http_cache.db', max_bytes: int = 256 << 20,
+                 ttls: Optional[Dict[str, float]] = None, default_ttl: float = 0, offline: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.offline = offline
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by the crawler's worker threads, every use holds the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, endpoint TEXT, '
+                               'status INTEGER, headers TEXT, body BLOB, size INTEGER, '
+                               'expires_at REAL, last_used REAL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)')
+        self.bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        """The full request URL, query parameters in the order requests sends them"""
+        return requests.Request('GET', url, params=params).prepare().url
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._conn.execute('SELECT url, status, headers, body, expires_at FROM entries WHERE url = ?',
+                                     (url,)).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(row[0], row[1], json.loads(row[2]), row[3], row[4])
+
+    def _touch(self, url: str, expires_at: Optional[float] = None, headers: Optional[Dict] = None):
+        with self._lock, self._conn:
+            if expires_at is None:
+                self._conn.execute('UPDATE entries SET last_used = ? WHERE url = ?', (time.time(), url))
+            else:
+                self._conn.execute('UPDATE entries SET last_used = ?, expires_at = ?, headers = ? WHERE url = ?',
+                                   (time.time(), expires_at, json.dumps(headers), url))
+
+    def store(self, endpoint: str, url: str, response: requests.Response):
+        """Keep a 200 response unless the server forbids it; expired entries still serve offline replay"""
+        if 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        ttl = self.ttl(endpoint)
+        body = response.content
+        now = time.time()
+        with self._lock, self._conn:
+            previous = self._conn.execute('SELECT size FROM entries WHERE url = ?', (url,)).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               (url, endpoint, response.status_code, json.dumps(headers), body, len(body),
+                                now + ttl, now))
+            self.bytes += len(body) - (previous[0] if previous else 0)
+            self.stats['stored'] += 1
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the bodies fit in max_bytes (lock held)"""
+        while self.bytes > self.max_bytes:
+            rows = self._conn.execute('SELECT url, size FROM entries ORDER BY last_used LIMIT 64').fetchall()
+            if not rows:
+                self.bytes = 0
+                return
+            for url, size in rows:
+                self._conn.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self.bytes -= size
+                self.stats['evictions'] += 1
+                if self.bytes <= self.max_bytes:
+                    return
+
+    def _response(self, entry: CacheEntry) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry.status
+        response._content = entry.body
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.url = entry.url
+        response.encoding = 'utf-8'
+        response.from_cache = True
+        return response
+
+    def _count(self, endpoint: str, result: str):
+        # Crawler worker threads share the stats
+        with self._lock:
+            self.stats[result] += 1
+        CACHE_LOOKUPS.inc(endpoint=endpoint, result=result)
+
+    def request(self, endpoint: str, url: str, params: Optional[Dict], headers: Dict,
+                send: Callable[[Dict], requests.Response]) -> requests.Response:
+        """Serve a GET from the cache, or call send(headers) (with validators if it's stale) and cache the result"""
+        key = self.key(url, params)
+        entry = self.lookup(key)
+        if entry is not None and (self.offline or entry.expires_at > time.time()):
+            self._count(endpoint, 'hits')
+            self._touch(key)
+            return self._response(entry)
+        if self.offline:
+            self._count(endpoint, 'misses')
+            raise requests.ConnectionError(f"{key} is not in the offline cache {self.path}")
+
+        response = send(dict(headers, **entry.validators) if entry is not None else headers)
+        if response.status_code == 304 and entry is not None:
+            self._count(endpoint, 'revalidated')
+            # The server may send fresh validators with the 304
+            renewed = dict(entry.headers, **{name: response.headers[name] for name in ('ETag', 'Last-Modified')
+                                             if name in response.headers})
+            self._touch(key, time.time() + self.ttl(endpoint), renewed)
+            return self._response(entry._replace(headers=renewed))
+        self._count(endpoint, 'misses')
+        if response.status_code == 200:
+            self.store(endpoint, key, response)
+        return response
+
+    def summary(self) -> Dict:
+        """Counts since start plus the current size of the cache"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses'] + stats['revalidated']
+        served = stats['hits'] + stats['revalidated']
+        return dict(stats, entries=entries, bytes=self.bytes,
+                    hit_rate=round(served / lookups, 4) if lookups else 0.0)
@@ -3,20 +3,55 @@ NetEase Cloud Music Crawler
 Based on https://github.com/LindiaC/music163-miningr
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
+import sys
 import time
 import random
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlparse
 import hashlib
 import base64
 
+try:
+    from .crawl_state import CrawlState
+    from .dedup import CommentSamplingPolicy, SongIndex
+    from .http_cache import HTTPCache
+    from .rate_limiter import HostRateLimiter
+except ImportError:  # running as a script: python crawler/netease_crawler.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from crawl_state import CrawlState
+    from dedup import CommentSamplingPolicy, SongIndex
+    from http_cache import HTTPCache
+    from rate_limiter import HostRateLimiter
+from monitoring.metrics import REGISTRY
+from storage.music_store import is_writable, open_store
+
+CRAWLER_REQUESTS = REGISTRY.counter('music_crawler_requests', 'Crawler HTTP requests by response status',
+                                    ['endpoint', 'status'])
+CRAWLER_LATENCY = REGISTRY.histogram('music_crawler_request_duration_seconds',
+                                     'Crawler HTTP request latency, rate limit wait excluded', ['endpoint'])
+CRAWLER_RETRIES = REGISTRY.counter('music_crawler_retries', 'Crawler requests retried after an error',
+                                   ['endpoint'])
+CRAWLER_RATE_WAIT = REGISTRY.histogram('music_crawler_rate_limit_wait_seconds',
+                                       'Time crawler requests waited for a rate limit token', ['endpoint'])
+
+
+def endpoint_name(url: str) -> str:
+    """URL path with per-song IDs dropped, so metrics have one series per endpoint"""
+    return urlparse(url).path.split('/R_SO_4_')[0]
+
 
 class NetEaseMusicCrawler:
     """NetEase Cloud Music data crawler with anti-crawling handling"""
     
-    def __init__(self):
-        self.base_url = "https://music.163.com"
-        self.api_url = "https://music.163.com/weapi"
+    def __init__(self, base_url: str = "https://music.163.com", max_workers: int = 8,
+                 rate_limit: float = 5.0, burst: int = 5, max_retries: int = 2, backoff: float = 1.0,
+                 cache: Optional[HTTPCache] = None):
+        self.base_url = base_url.rstrip('/')
+        self.api_url = f"{self.base_url}/weapi"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Referer': 'https://music.163.com/',
@@ -24,7 +59,48 @@ class NetEaseMusicCrawler:
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
             'Content-Type': 'application/x-www-form-urlencoded'
         }
+        self.max_workers = max_workers
+        # Connection errors, 429 and 5xx are retried with jittered exponential backoff
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = HostRateLimiter(rate=rate_limit, burst=burst)
+        # Responses served from the cache skip the rate limiter and the network
+        self.cache = cache
         self.session = requests.Session()
+        # Size the connection pool so concurrent workers don't queue on sockets
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(max_workers, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def _request(self, url: str, params: dict) -> requests.Response:
+        """GET through the response cache when there is one, otherwise straight to the server"""
+        if self.cache is None:
+            return self._send(url, params, self.headers)
+        return self.cache.request(endpoint_name(url), url, params, self.headers,
+                                  lambda headers: self._send(url, params, headers))
+    
+    def _send(self, url: str, params: dict, headers: dict) -> requests.Response:
+        """Send a rate-limited GET request through the pooled session, retrying transient failures"""
+        endpoint = endpoint_name(url)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                CRAWLER_RETRIES.inc(endpoint=endpoint)
+                time.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            CRAWLER_RATE_WAIT.observe(self.rate_limiter.acquire(url), endpoint=endpoint)
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=10)
+            except requests.RequestException:
+                CRAWLER_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+                CRAWLER_REQUESTS.inc(endpoint=endpoint, status='error')
+                if attempt == self.max_retries:
+                    raise
+                continue
+            CRAWLER_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+            CRAWLER_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+            if response.status_code != 429 and response.status_code < 500:
+                break
+        return response
         
     def _get_params_encSecKey(self, data: dict) -> dict:
         """Generate encrypted params for API request"""
@@ -51,7 +127,7 @@ class NetEaseMusicCrawler:
         params = {'id': playlist_id}
         
         try:
-            response = self.session.get(url, params=params, headers=self.headers, timeout=10)
+            response = self._request(url, params)
             if response.status_code == 200:
                 data = response.json()
                 return data
@@ -68,7 +144,7 @@ class NetEaseMusicCrawler:
         params = {'limit': limit}
         
         try:
-            response = self.session.get(url, params=params, headers=self.headers, timeout=10)
+            response = self._request(url, params)
             if response.status_code == 200:
                 data = response.json()
                 return data.get('playlists', [])
@@ -81,19 +157,28 @@ class NetEaseMusicCrawler:
     
     def get_song_detail(self, song_id: str) -> Dict:
         """Get song detail"""
+        songs = self.get_song_details([song_id])
+        return songs[0] if songs else {}
+    
+    def get_song_details(self, song_ids: List, batch_size: int = 200) -> List[Dict]:
+        """Get details for many songs, batch_size IDs per request"""
         url = f"{self.base_url}/api/song/detail"
-        params = {'id': song_id, 'ids': f'[{song_id}]'}
+        songs = []
         
-        try:
-            response = self.session.get(url, params=params, headers=self.headers, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('songs', [{}])[0] if data.get('songs') else {}
-            else:
-                return {}
-        except Exception as e:
-            print(f"Error getting song {song_id}: {e}")
-            return {}
+        for start in range(0, len(song_ids), batch_size):
+            batch = [str(song_id) for song_id in song_ids[start:start + batch_size]]
+            params = {'ids': f"[{','.join(batch)}]"}
+            
+            try:
+                response = self._request(url, params)
+                if response.status_code == 200:
+                    songs.extend(response.json().get('songs', []))
+                else:
+                    print(f"Failed to get details for {len(batch)} songs: {response.status_code}")
+            except Exception as e:
+                print(f"Error getting details for {len(batch)} songs: {e}")
+        
+        return songs
     
     def get_song_comments(self, song_id: str, limit: int = 100, offset: int = 0) -> Dict:
         """Get song comments"""
@@ -104,7 +189,7 @@ class NetEaseMusicCrawler:
         }
         
         try:
-            response = self.session.get(url, params=params, headers=self.headers, timeout=10)
+            response = self._request(url, params)
             if response.status_code == 200:
                 data = response.json()
                 return data
@@ -115,94 +200,337 @@ class NetEaseMusicCrawler:
             print(f"Error getting comments for song {song_id}: {e}")
             return {}
     
-    def crawl_music_data(self, num_playlists: int = 10, songs_per_playlist: int = 20) -> Dict:
+    def iter_song_comments(self, song_id: str, page_size: int = 100, offset: int = 0,
+                           max_comments: int = None, max_pages: int = None,
+                           time_limit: float = None) -> Iterator[List[Dict]]:
+        """
+        Yield pages of comments for a song until the API runs out or a cap is hit
+        max_comments/max_pages bound the volume, time_limit (seconds) bounds wall time
+        """
+        started = time.monotonic()
+        fetched = 0
+        pages = 0
+        
+        while True:
+            if max_pages is not None and pages >= max_pages:
+                return
+            if time_limit is not None and time.monotonic() - started >= time_limit:
+                return
+            
+            limit = page_size
+            if max_comments is not None:
+                limit = min(limit, max_comments - fetched)
+                if limit <= 0:
+                    return
+            
+            data = self.get_song_comments(song_id, limit=limit, offset=offset + fetched)
+            comments = data.get('comments', [])
+            if not comments:
+                return
+            
+            pages += 1
+            fetched += len(comments)
+            yield comments
+            
+            if not data.get('more', len(comments) == limit):
+                return
+    
+    def fetch_comments(self, song_id: str, max_comments: int = 20, offset: int = 0) -> List[Dict]:
+        """Fetch up to max_comments comments for a song, following pagination"""
+        comments = []
+        for page in self.iter_song_comments(song_id, offset=offset, max_comments=max_comments):
+            comments.extend(page)
+        return comments
+    
+    def fetch_playlist_tracks(self, playlist_id: str, limit: int = 20) -> List[Dict]:
+        """
+        The first limit tracks of a playlist
+        Large playlists only carry the first tracks in full and list the rest in
+        trackIds, those are fetched with batched song detail requests.
+        """
+        result = self.get_playlist_detail(playlist_id).get('result', {})
+        tracks = result.get('tracks', [])[:limit]
+        track_ids = [item.get('id') for item in result.get('trackIds', [])[:limit]]
+        known = {track.get('id') for track in tracks}
+        missing = [track_id for track_id in track_ids if track_id not in known]
+        if not missing:
+            return tracks
+        
+        by_id = {track.get('id'): track for track in tracks}
+        by_id.update((song.get('id'), song) for song in self.get_song_details(missing))
+        return [by_id[track_id] for track_id in track_ids if track_id in by_id]
+    
+    def _parse_track(self, track: Dict) -> Dict:
+        """Convert a playlist track into the song record schema"""
+        return {
+            'id': track.get('id'),
+            'name': track.get('name'),
+            'artists': [artist.get('name') for artist in track.get('artists', [])],
+            'album': track.get('album', {}).get('name'),
+            'album_type': track.get('album', {}).get('type', 'Unknown'),
+            'publish_time': track.get('album', {}).get('publishTime', 0),
+            'duration': track.get('duration', 0),
+            'popularity': track.get('popularity', 0)
+        }
+    
+    def _parse_comment(self, song_info: Dict, comment: Dict) -> Dict:
+        """Convert an API comment into the comment record schema"""
+        return {
+            'song_id': song_info['id'],
+            'song_name': song_info['name'],
+            'content': comment.get('content', ''),
+            'time': comment.get('time', 0),
+            'liked_count': comment.get('likedCount', 0)
+        }
+    
+    def crawl_music_data(self, num_playlists: int = 10, songs_per_playlist: int = 20,
+                         concurrent: bool = False, state: CrawlState = None,
+                         incremental: bool = False, checkpoint_every: int = 10,
+                         comment_policy: CommentSamplingPolicy = None,
+                         comments_per_song: int = 20) -> Dict:
         """
         Crawl music data from NetEase Cloud Music
         Returns a dictionary with songs, albums, artists, and comments
+        Songs are deduplicated by ID and comments are fetched once per unique
+        song chosen by comment_policy (default: one in every five songs),
+        following comment pages up to comments_per_song
+        With concurrent=True requests run in parallel (see iter_crawl_concurrent)
+        With a CrawlState the run is checkpointed every checkpoint_every playlists
+        and resumes where an interrupted run stopped; incremental=True also skips
+        unchanged playlists and songs that were collected by earlier runs
+        Everything is kept in memory until the end, see pipeline.CrawlPipeline
+        to stream a large crawl into a store instead
         """
-        all_songs = []
+        if state is not None:
+            state.start_run()
+        song_index = SongIndex(state.run['songs'] if state is not None else None)
         all_comments = []
         
+        crawl = self.iter_crawl_concurrent if concurrent else self.iter_crawl
+        processed = 0
+        for kind, record in crawl(num_playlists, songs_per_playlist, state, incremental,
+                                  comment_policy, song_index, comments_per_song):
+            if kind == 'comment':
+                all_comments.append(record)
+                if state is not None:
+                    state.add_comments(record['song_id'], [record])
+            elif state is None:
+                continue
+            elif kind == 'song':
+                state.add_song(record)
+            elif kind == 'playlist':
+                state.mark_playlist(record['id'], record.get('updateTime', 0))
+                processed += 1
+                if processed % checkpoint_every == 0:
+                    state.save()
+        
+        if state is not None:
+            # Include records collected before an interruption
+            return dict(state.finish_run(), crawl_time=time.time())
+        
+        return {
+            'songs': song_index.songs(),
+            'comments': all_comments,
+            'crawl_time': time.time()
+        }
+    
+    def _candidate_playlists(self, num_playlists: int, state: CrawlState,
+                             incremental: bool) -> Iterator[Dict]:
+        """Hot playlists to crawl, without the ones the state says to skip"""
         print("Fetching hot playlists...")
         playlists = self.get_hot_playlists(limit=num_playlists)
-        
-        for idx, playlist in enumerate(playlists[:num_playlists], 1):
-            print(f"Processing playlist {idx}/{num_playlists}: {playlist.get('name', 'Unknown')}")
-            
+        for playlist in playlists[:num_playlists]:
             playlist_id = playlist.get('id')
             if not playlist_id:
                 continue
+            if state is not None and state.should_skip_playlist(
+                    playlist_id, playlist.get('updateTime', 0), incremental):
+                continue
+            yield playlist
+    
+    def _dedupe_track(self, track: Dict, playlist_id, state: CrawlState, incremental: bool,
+                      song_index: SongIndex) -> Tuple[str, Dict]:
+        """
+        Normalize a playlist track and check it against the songs seen so far
+        Returns ('song', record) for a new song, ('playlist_song', record) for a
+        seen song in a new playlist and (None, record) for anything to skip
+        """
+        song_info = self._parse_track(track)
+        if state is not None and incremental and state.has_song(song_info['id']):
+            return None, song_info
+        new_playlist = playlist_id not in song_index.playlists(song_info['id'])
+        song_info, is_new = song_index.add(song_info, playlist_id)
+        if is_new:
+            return 'song', song_info
+        return ('playlist_song' if new_playlist else None), song_info
+    
+    def iter_crawl(self, num_playlists: int = 10, songs_per_playlist: int = 20,
+                   state: CrawlState = None, incremental: bool = False,
+                   comment_policy: CommentSamplingPolicy = None, song_index: SongIndex = None,
+                   comments_per_song: int = 20) -> Iterator[Tuple[str, Dict]]:
+        """
+        Crawl one request at a time, paced by the per-host token bucket
+        Yields events as they happen:
+        ('song', record) once per unique song,
+        ('playlist_song', record) when a song already yielded turns up in another
+        playlist (the record lists every playlist it was seen in so far),
+        ('comment', record) for each fetched comment, and
+        ('playlist', playlist) once a playlist's songs and comments are all out.
+        The state is only read here, the consumer records the events in it.
+        """
+        song_index = song_index if song_index is not None else SongIndex()
+        policy = comment_policy or CommentSamplingPolicy()
+        for idx, playlist in enumerate(self._candidate_playlists(num_playlists, state, incremental), 1):
+            playlist_id = playlist['id']
+            print(f"Processing playlist {idx}/{num_playlists}: {playlist.get('name', 'Unknown')}")
             
-            # Get playlist detail
-            detail = self.get_playlist_detail(str(playlist_id))
-            tracks = detail.get('result', {}).get('tracks', [])[:songs_per_playlist]
+            tracks = self.fetch_playlist_tracks(str(playlist_id), songs_per_playlist)
             
-            for track in tracks:
-                song_info = {
-                    'id': track.get('id'),
-                    'name': track.get('name'),
-                    'artists': [artist.get('name') for artist in track.get('artists', [])],
-                    'album': track.get('album', {}).get('name'),
-                    'album_type': track.get('album', {}).get('type', 'Unknown'),
-                    'publish_time': track.get('album', {}).get('publishTime', 0),
-                    'duration': track.get('duration', 0),
-                    'popularity': track.get('popularity', 0)
-                }
-                all_songs.append(song_info)
+            for position, track in enumerate(tracks):
+                event, song_info = self._dedupe_track(track, playlist_id, state, incremental, song_index)
+                if event is not None:
+                    yield event, song_info
+                if event != 'song':
+                    continue
                 
-                # Get some comments for sentiment analysis (first 5 songs from each playlist)
-                if len([s for s in all_songs if s['id'] == song_info['id']]) == 1 and len(all_songs) % 5 == 0:
-                    time.sleep(random.uniform(0.5, 1.5))  # Rate limiting
-                    comments_data = self.get_song_comments(str(song_info['id']), limit=20)
-                    comments = comments_data.get('comments', [])
-                    
-                    for comment in comments:
-                        all_comments.append({
-                            'song_id': song_info['id'],
-                            'song_name': song_info['name'],
-                            'content': comment.get('content', ''),
-                            'time': comment.get('time', 0),
-                            'liked_count': comment.get('likedCount', 0)
-                        })
+                # Get comments for sentiment analysis from the sampled songs
+                if policy.should_sample(song_info, position):
+                    offset = state.comment_offset(song_info['id']) if state is not None else 0
+                    for comment in self.fetch_comments(str(song_info['id']), comments_per_song, offset):
+                        yield 'comment', self._parse_comment(song_info, comment)
             
-            # Rate limiting between playlists
-            time.sleep(random.uniform(1, 2))
+            yield 'playlist', playlist
+    
+    def iter_crawl_concurrent(self, num_playlists: int = 10, songs_per_playlist: int = 20,
+                              state: CrawlState = None, incremental: bool = False,
+                              comment_policy: CommentSamplingPolicy = None,
+                              song_index: SongIndex = None,
+                              comments_per_song: int = 20) -> Iterator[Tuple[str, Dict]]:
+        """
+        Crawl with up to max_workers requests in flight
+        Pacing comes from the same per-host token bucket as iter_crawl.
+        Yields the same events as iter_crawl, as results arrive; a playlist's
+        ('playlist', playlist) event comes once its comments are in.
+        New playlists are only requested while fewer than 2 * max_workers
+        fetches are pending, so a consumer that stops pulling (e.g. a full
+        writer queue) stops the crawl from running ahead of it.
+        """
+        song_index = song_index if song_index is not None else SongIndex()
+        policy = comment_policy or CommentSamplingPolicy()
+        playlists = self._candidate_playlists(num_playlists, state, incremental)
+        max_pending = 2 * self.max_workers
+        # playlist id -> comment fetches still in flight
+        outstanding = {}
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
         
-        return {
-            'songs': all_songs,
-            'comments': all_comments,
-            'crawl_time': time.time()
-        }
+        def submit_playlists():
+            while len(pending) < max_pending:
+                playlist = next(playlists, None)
+                if playlist is None:
+                    return
+                future = pool.submit(self.fetch_playlist_tracks, str(playlist['id']), songs_per_playlist)
+                pending[future] = ('playlist', playlist, None)
+        
+        try:
+            submit_playlists()
+            done_playlists = 0
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, playlist, song_info = pending.pop(future)
+                    playlist_id = playlist['id']
+                    if kind == 'playlist':
+                        done_playlists += 1
+                        print(f"Processed playlist {done_playlists}/{num_playlists}: {playlist.get('name', 'Unknown')}")
+                        tracks = future.result()
+                        outstanding[playlist_id] = 0
+                        for position, track in enumerate(tracks):
+                            event, song_info = self._dedupe_track(track, playlist_id, state, incremental, song_index)
+                            if event is not None:
+                                yield event, song_info
+                            if event != 'song':
+                                continue
+                            
+                            if policy.should_sample(song_info, position):
+                                offset = state.comment_offset(song_info['id']) if state is not None else 0
+                                comment_future = pool.submit(self.fetch_comments, str(song_info['id']),
+                                                             comments_per_song, offset)
+                                pending[comment_future] = ('comments', playlist, song_info)
+                                outstanding[playlist_id] += 1
+                    else:
+                        for comment in future.result():
+                            yield 'comment', self._parse_comment(song_info, comment)
+                        outstanding[playlist_id] -= 1
+                    
+                    if outstanding.get(playlist_id) == 0:
+                        del outstanding[playlist_id]
+                        yield 'playlist', playlist
+                submit_playlists()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
 
 
-def save_crawled_data(data: Dict, filename: str = 'data/music_data.json'):
-    """Save crawled data to JSON file"""
-    import os
-    os.makedirs(os.path.dirname(filename), exist_ok=True)
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def save_crawled_data(data: Dict, filename: str = 'data/music_data.json', merge: bool = False):
+    """
+    Save crawled data, merging into the existing data if merge=True
+    The backend follows the file extension (.json or .db, see storage.music_store)
+    """
+    store = open_store(filename)
+    if merge:
+        store.append(data)
+    else:
+        store.write(data)
     
     print(f"Data saved to {filename}")
 
 
 def load_crawled_data(filename: str = 'data/music_data.json') -> Dict:
-    """Load crawled data from JSON file"""
-    try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    """Load crawled data from JSON file or SQLite store"""
+    if not os.path.exists(filename):
         print(f"File {filename} not found")
         return {}
+    return open_store(filename).read()
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Crawl NetEase Cloud Music data')
+    parser.add_argument('--concurrent', action='store_true', help='keep several requests in flight')
+    parser.add_argument('--workers', type=int, default=8, help='max requests in flight')
+    parser.add_argument('--rate', type=float, default=5.0, help='requests per second per host')
+    parser.add_argument('--state', default=None, help='crawl state file for resumable runs')
+    parser.add_argument('--incremental', action='store_true', help='only fetch new or changed playlists and songs')
+    parser.add_argument('--output', default='data/music_data.json', help='output file (.json or .db)')
+    parser.add_argument('--cache', default=None, help='on-disk HTTP response cache, e.g. data/http_cache.db')
+    parser.add_argument('--offline', action='store_true', help='only replay responses from --cache')
+    parser.add_argument('--stream', action='store_true',
+                        help='write records to the output (.jsonl or .db) as they arrive instead of at the end')
+    args = parser.parse_args()
+    # Fail before crawling rather than when saving
+    if not is_writable(args.output):
+        parser.error(f"--output must be a single file, {args.output} is a directory or glob of shards")
+    
     # Test crawler
-    crawler = NetEaseMusicCrawler()
+    cache = HTTPCache(args.cache, offline=args.offline) if args.cache else None
+    crawler = NetEaseMusicCrawler(max_workers=args.workers, rate_limit=args.rate, cache=cache)
+    state = CrawlState(args.state or 'data/crawl_state.json') if args.state or args.incremental else None
     print("Starting to crawl music data...")
-    data = crawler.crawl_music_data(num_playlists=5, songs_per_playlist=10)
+    if args.stream:
+        try:
+            from .pipeline import crawl_to_store
+        except ImportError:
+            from pipeline import crawl_to_store
+        stats = crawl_to_store(crawler, args.output, state=state, num_playlists=5, songs_per_playlist=10,
+                               concurrent=args.concurrent, incremental=args.incremental)
+        print(f"\nStreamed {stats['written']['songs']} song records and {stats['written']['comments']} comments "
+              f"to {args.output}")
+        sys.exit(0)
+    data = crawler.crawl_music_data(num_playlists=5, songs_per_playlist=10, concurrent=args.concurrent,
+                                    state=state, incremental=args.incremental)
     
     print(f"\nCrawled {len(data['songs'])} songs")
     print(f"Crawled {len(data['comments'])} comments")
     
-    save_crawled_data(data)
+    save_crawled_data(data, args.output, merge=args.incremental)
@@ -0,0 +1,163 @@
+"""
+Streaming crawl-to-store pipeline
+The crawl generators fetch, normalize and dedupe; their events go through a
+bounded queue to a writer thread that appends them to a store in batches.
+Every checkpoint_every playlists the writer fsyncs the store and then saves
+the crawl state, so a checkpoint never claims records that aren't on disk.
+When the writer falls behind, the queue fills up and the crawl blocks, so
+memory stays bounded however many playlists are crawled.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    from .crawl_state import CrawlState
+    from .dedup import CommentSamplingPolicy, SongIndex
+except ImportError:  # running as a script: python crawler/pipeline.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from crawl_state import CrawlState
+    from dedup import CommentSamplingPolicy, SongIndex
+from storage.music_store import is_appendable, open_store
+
+# Marks the end of the event stream
+_DONE = object()
+
+
+class StoreSink:
+    """Append-only batches of songs and comments into a .jsonl or SQLite store"""
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.store = open_store(path)
+        if not is_appendable(self.store):
+            raise ValueError(f"Streaming needs an appendable store (.jsonl or .db), got {path}")
+        self.batch_size = batch_size
+        self.batch = {'songs': [], 'comments': []}
+        self.pending = 0
+        self.written = {'songs': 0, 'comments': 0}
+
+    def add(self, table: str, record: Dict):
+        self.batch[table].append(record)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self, sync: bool = False, **extra):
+        """Append the buffered records, sync=True also fsyncs everything appended so far"""
+        if not self.pending and not sync and not extra:
+            return
+        self.store.append(dict(self.batch, **extra), sync=sync)
+        for table, records in self.batch.items():
+            self.written[table] += len(records)
+        self.batch = {'songs': [], 'comments': []}
+        self.pending = 0
+
+
+class CrawlPipeline:
+    """
+    Run a crawl into a StoreSink through a bounded queue
+    Songs are written when first seen and again when they turn up in another
+    playlist (the store keeps the last record per song ID). Only song IDs and
+    their playlists stay in memory, records leave with the next batch.
+    """
+
+    def __init__(self, crawler, sink: StoreSink, state: Optional[CrawlState] = None,
+                 queue_size: int = 1000, checkpoint_every: int = 10):
+        self.crawler = crawler
+        self.sink = sink
+        self.state = state
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.checkpoint_every = checkpoint_every
+        self.error: Optional[BaseException] = None
+        self.stats = {'songs': 0, 'song_updates': 0, 'comments': 0, 'playlists': 0, 'checkpoints': 0,
+                      'producer_wait_seconds': 0.0}
+
+    def _checkpoint(self, **extra):
+        # The store first: a saved state must never be ahead of the data
+        self.sink.flush(sync=True, **extra)
+        if self.state is not None:
+            self.state.save()
+        self.stats['checkpoints'] += 1
+
+    def _record(self, kind: str, record: Dict):
+        if kind == 'song':
+            self.sink.add('songs', record)
+            self.stats['songs'] += 1
+            if self.state is not None:
+                self.state.add_song(record)
+        elif kind == 'playlist_song':
+            self.sink.add('songs', record)
+            self.stats['song_updates'] += 1
+        elif kind == 'comment':
+            self.sink.add('comments', record)
+            self.stats['comments'] += 1
+            if self.state is not None:
+                self.state.add_comments(record['song_id'], [record])
+        elif kind == 'playlist':
+            self.stats['playlists'] += 1
+            if self.state is not None:
+                self.state.mark_playlist(record['id'], record.get('updateTime', 0))
+            if self.stats['playlists'] % self.checkpoint_every == 0:
+                self._checkpoint()
+
+    def _write(self):
+        """Writer thread: apply events in order until the end marker"""
+        while True:
+            event = self.queue.get()
+            if event is _DONE:
+                return
+            if self.error is not None:
+                # Keep draining so the crawl never blocks on a dead writer
+                continue
+            try:
+                self._record(*event)
+            except BaseException as e:
+                self.error = e
+
+    def _put(self, event):
+        if self.queue.full():
+            started = time.perf_counter()
+            self.queue.put(event)
+            self.stats['producer_wait_seconds'] += time.perf_counter() - started
+        else:
+            self.queue.put(event)
+
+    def run(self, num_playlists: int = 10, songs_per_playlist: int = 20, concurrent: bool = True,
+            incremental: bool = False, comment_policy: CommentSamplingPolicy = None,
+            comments_per_song: int = 20) -> Dict:
+        """Crawl into the sink, returns counts of what was written"""
+        if self.state is not None:
+            self.state.start_run(keep_records=False)
+        song_index = SongIndex(keep_records=False)
+        crawl = self.crawler.iter_crawl_concurrent if concurrent else self.crawler.iter_crawl
+        writer = threading.Thread(target=self._write, name='crawl-writer', daemon=True)
+        writer.start()
+        finished = False
+        try:
+            for event in crawl(num_playlists, songs_per_playlist, self.state, incremental,
+                               comment_policy, song_index, comments_per_song):
+                self._put(event)
+                if self.error is not None:
+                    break
+            finished = self.error is None
+        finally:
+            self.queue.put(_DONE)
+            writer.join()
+            if self.error is None:
+                self._checkpoint(crawl_time=time.time())
+                if finished and self.state is not None:
+                    self.state.finish_run()
+        if self.error is not None:
+            raise self.error
+        return dict(self.stats, written=dict(self.sink.written))
+
+
+def crawl_to_store(crawler, path: str, state: Optional[CrawlState] = None, batch_size: int = 500,
+                   queue_size: int = 1000, checkpoint_every: int = 10, **crawl_kwargs) -> Dict:
+    """Stream a crawl into the store at path (.jsonl or .db), see CrawlPipeline"""
+    pipeline = CrawlPipeline(crawler, StoreSink(path, batch_size), state, queue_size, checkpoint_every)
+    return pipeline.run(**crawl_kwargs)
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings for serving the dashboard in production
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import gc
+import os
+import signal
+
+bind = os.environ.get('MUSIC_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('MUSIC_WORKERS', os.cpu_count() or 1))
+threads = int(os.environ.get('MUSIC_THREADS', 4))
+
+# Load the data once in the master; forked workers share it copy-on-write
+preload_app = True
+
+
+def when_ready(server):
+    from app import startup
+
+    # Workers are forked after this returns; wait for the data so they share it
+    reloader = startup.wait()
+    # The master's reloader loads new data; HUP then replaces the workers with
+    # fresh forks that inherit it (the app itself is not re-imported with preload_app)
+    reloader.on_swap = lambda analyzer: os.kill(server.pid, signal.SIGHUP)
+
+
+def pre_fork(server, worker):
+    # Keep the loaded objects out of the collector's way so it doesn't touch their pages
+    gc.freeze()
@@ -0,0 +1,89 @@
+"""
+Sampling profiler for a single thread
+A background thread records the target thread's call stack at a fixed
+interval; the stacks come out in the collapsed format read by flamegraph.pl,
+speedscope and inferno ("outer;inner;leaf count" per line).
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+# The switch interval is process-wide: the first profiler to start saves it,
+# the last one to stop restores it, meanwhile it's the smallest active interval
+_switch_lock = threading.Lock()
+_active_intervals: List[float] = []
+_saved_switch_interval = 0.0
+
+
+def _lower_switch_interval(interval: float):
+    global _saved_switch_interval
+    with _switch_lock:
+        if not _active_intervals:
+            _saved_switch_interval = sys.getswitchinterval()
+        _active_intervals.append(interval)
+        sys.setswitchinterval(min([_saved_switch_interval] + _active_intervals))
+
+
+def _restore_switch_interval(interval: float):
+    with _switch_lock:
+        _active_intervals.remove(interval)
+        sys.setswitchinterval(min([_saved_switch_interval] + _active_intervals))
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample one thread's stack every interval seconds between start() and stop()"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.001):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._running = False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self._stop.is_set():
+                return
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self) -> 'SamplingProfiler':
+        # The sampler only runs when it gets the GIL, let it switch in as often as it samples
+        _lower_switch_interval(self.interval)
+        self._running = True
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> 'SamplingProfiler':
+        if not self._running:
+            return self
+        self._running = False
+        self._stop.set()
+        self.seconds = time.perf_counter() - self._started
+        if self._thread is not None:
+            self._thread.join()
+        _restore_switch_interval(self.interval)
+        return self
+
+    def collapsed(self) -> str:
+        """Sampled stacks in the collapsed format, most frequent first"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
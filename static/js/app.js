@@ -112,30 +112,32 @@ function resizeChartsInModule(moduleId) {
 
 async function initializeDashboard() {
     try {
-        // Load data overview
-        await loadOverview();
+        // Every chart's data in one request, revalidated with its ETag on reload
+        const response = await fetch('/api/dashboard');
+        if (response.status === 503) {
+            // The server is still loading the data, try again shortly
+            const retryAfter = Number(response.headers.get('Retry-After')) || 1;
+            setTimeout(initializeDashboard, retryAfter * 1000);
+            return;
+        }
+        const dashboard = await response.json();
         
-        // Load all visualizations
-        await Promise.all([
-            loadReleaseTrend(),
-            loadAlbumTypes(),
-            loadMusicGenres(),
-            loadTopAlbumTypes(),
-            loadTopArtists(),
-            loadWordCloud(),
-            loadSentiment()
-        ]);
+        renderOverview(dashboard.overview);
+        renderReleaseTrend(dashboard.release_trend);
+        renderAlbumTypes(dashboard.album_types);
+        renderMusicGenres(dashboard.music_genres);
+        renderTopAlbumTypes(dashboard.top_album_types);
+        renderTopArtists(dashboard.top_artists);
+        renderWordCloud(dashboard.wordcloud);
+        renderSentiment(dashboard.sentiment);
     } catch (error) {
         console.error('Error initializing dashboard:', error);
     }
 }
 
-// Load overview statistics
-async function loadOverview() {
+// Render overview statistics
+function renderOverview(data) {
     try {
-        const response = await fetch('/api/overview');
-        const data = await response.json();
-        
         document.getElementById('total-songs').textContent = data.total_songs || 0;
         document.getElementById('total-artists').textContent = data.total_artists || 0;
         document.getElementById('total-albums').textContent = data.total_albums || 0;
@@ -145,12 +147,9 @@ async function loadOverview() {
     }
 }
 
-// Load release trend chart
-async function loadReleaseTrend() {
+// Render release trend chart
+function renderReleaseTrend(data) {
     try {
-        const response = await fetch('/api/release-trend');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '音乐发布趋势分析',
@@ -218,12 +217,9 @@ async function loadReleaseTrend() {
     }
 }
 
-// Load album types chart
-async function loadAlbumTypes() {
+// Render album types chart
+function renderAlbumTypes(data) {
     try {
-        const response = await fetch('/api/album-types');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '专辑类型分布',
@@ -267,12 +263,9 @@ async function loadAlbumTypes() {
     }
 }
 
-// Load music genres chart
-async function loadMusicGenres() {
+// Render music genres chart
+function renderMusicGenres(data) {
     try {
-        const response = await fetch('/api/music-genres');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '音乐类型占比',
@@ -326,12 +319,9 @@ async function loadMusicGenres() {
     }
 }
 
-// Load top album types chart
-async function loadTopAlbumTypes() {
+// Render top album types chart
+function renderTopAlbumTypes(data) {
     try {
-        const response = await fetch('/api/top-album-types');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '专辑类型TOP10',
@@ -390,12 +380,9 @@ async function loadTopAlbumTypes() {
     }
 }
 
-// Load top artists chart
-async function loadTopArtists() {
+// Render top artists chart
+function renderTopArtists(data) {
     try {
-        const response = await fetch('/api/top-artists');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '艺术家作品数量TOP5',
@@ -457,12 +444,9 @@ async function loadTopArtists() {
     }
 }
 
-// Load word cloud
-async function loadWordCloud() {
+// Render word cloud
+function renderWordCloud(data) {
     try {
-        const response = await fetch('/api/wordcloud');
-        const data = await response.json();
-        
         const option = {
             title: {
                 text: '音乐名称词云',
@@ -512,12 +496,9 @@ async function loadWordCloud() {
     }
 }
 
-// Load sentiment analysis
-async function loadSentiment() {
+// Render sentiment analysis
+function renderSentiment(data) {
     try {
-        const response = await fetch('/api/sentiment');
-        const data = await response.json();
-        
         // Update sentiment statistics
         document.getElementById('positive-count').textContent = data.positive || 0;
         document.getElementById('neutral-count').textContent = data.neutral || 0;
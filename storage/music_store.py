@@ -0,0 +1,894 @@
+"""
+Storage backends for crawled music data
+JSONStore keeps the original music_data.json format, JSONLinesStore writes one
+record per line so it can be appended to, and SQLiteStore stores songs and
+comments in typed, indexed tables with append and column projection.
+ShardedStore reads a directory or glob of such files (one per crawl day or
+crawler worker) in parallel and merges them, deduplicating songs by ID.
+JSON-based stores are parsed incrementally, so loading never holds the raw
+text or the full list of dicts in memory.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.request import pathname2url
+
+# Column name -> SQLite type; JSON columns hold lists and are encoded as text
+SONG_COLUMNS = {
+    'id': 'INTEGER PRIMARY KEY',
+    'name': 'TEXT',
+    'artists': 'JSON',
+    'album': 'TEXT',
+    'album_type': 'TEXT',
+    'publish_time': 'INTEGER',
+    'duration': 'INTEGER',
+    'popularity': 'INTEGER',
+    'playlists': 'JSON',
+}
+
+COMMENT_COLUMNS = {
+    'song_id': 'INTEGER',
+    'song_name': 'TEXT',
+    'content': 'TEXT',
+    'time': 'INTEGER',
+    'liked_count': 'INTEGER',
+}
+
+TABLES = {'songs': SONG_COLUMNS, 'comments': COMMENT_COLUMNS}
+
+# Compact in-memory dtypes used when building DataFrames
+COMPACT_DTYPES = {
+    'songs': {
+        'id': 'int64',
+        'album': 'category',
+        'album_type': 'category',
+        'publish_time': 'int64',
+        'duration': 'int32',
+        'popularity': 'int16',
+    },
+    'comments': {
+        'song_id': 'int64',
+        'song_name': 'category',
+        'time': 'int64',
+        'liked_count': 'int64',
+    },
+}
+
+# Columns where a missing value stays missing (a nullable dtype when there is
+# one), so it doesn't become 1970-01-01 or a popularity of 0; other columns
+# count a missing value as 0
+KEEP_MISSING = {'publish_time', 'duration', 'popularity', 'time'}
+
+# Records per DataFrame chunk while streaming
+CHUNK_SIZE = 50000
+
+# File extensions read as shards of a sharded dataset
+SHARD_EXTENSIONS = ('.json', '.jsonl', '.ndjson', '.db', '.sqlite', '.sqlite3')
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# How music data files begin: a JSON Lines record, or a JSON object whose first
+# key is a table or crawl_time (crawl state files start with "playlists")
+_JSON_LINES_HEAD = re.compile(r'\s*(\{\s*"table"\s*:|$)')
+_JSON_HEAD = re.compile(r'\s*\{\s*(\}|"(songs|comments|crawl_time)"\s*:)')
+
+# A comment is the same comment when these match (as in merge_crawled_data)
+COMMENT_KEY = ['song_id', 'time', 'content']
+
+
+def merge_crawled_data(existing: Dict, new: Dict) -> Dict:
+    """Merge a new crawl into existing data, newer song records win"""
+    songs = {song['id']: song for song in existing.get('songs', [])}
+    songs.update((song['id'], song) for song in new.get('songs', []))
+
+    comments = list(existing.get('comments', []))
+    seen = {(c['song_id'], c['time'], c['content']) for c in comments}
+    for comment in new.get('comments', []):
+        key = (comment['song_id'], comment['time'], comment['content'])
+        if key not in seen:
+            seen.add(key)
+            comments.append(comment)
+
+    return {
+        'songs': list(songs.values()),
+        'comments': comments,
+        'crawl_time': new.get('crawl_time', existing.get('crawl_time'))
+    }
+
+
+def to_category(values):
+    """
+    Categorical with categories in order of first appearance
+    (astype('category') sorts them, which reorders value_counts ties)
+    """
+    import pandas as pd
+
+    return pd.Series(pd.Categorical(values, categories=pd.unique(values.dropna())), index=values.index)
+
+
+def _fits_integer(values, dtype: str) -> bool:
+    """Whether every present value is a whole number within the range of an integer dtype"""
+    import numpy as np
+
+    present = values.dropna().to_numpy(dtype='float64')
+    limits = np.iinfo(dtype)
+    return bool(np.all(present == np.floor(present)) and
+                (present.size == 0 or (present.min() >= limits.min and present.max() <= limits.max)))
+
+
+def compact_frame(df, table: str):
+    """
+    Cast a table's columns to their compact dtypes
+    A numeric column with fractional or out of range values (e.g. an averaged
+    popularity) is kept as float64 instead of being truncated or wrapped.
+    """
+    import pandas as pd
+
+    for name, dtype in COMPACT_DTYPES[table].items():
+        if name not in df.columns:
+            continue
+        if dtype == 'category':
+            df[name] = to_category(df[name])
+            continue
+        values = pd.to_numeric(df[name], errors='coerce')
+        keep_missing = name in KEEP_MISSING and values.isna().any()
+        if not _fits_integer(values, dtype):
+            df[name] = values.astype('float64') if keep_missing else values.fillna(0).astype('float64')
+        elif keep_missing:
+            # 'int64' -> 'Int64', pandas' nullable integer of the same width
+            df[name] = values.astype(dtype.capitalize())
+        else:
+            df[name] = values.fillna(0).astype(dtype)
+    return df
+
+
+class FrameBuilder:
+    """
+    Build a compact DataFrame from records added one at a time
+    Only chunk_size dicts are alive at once; categorical chunks are aligned to
+    the union of their categories so the concatenated columns stay categorical.
+    """
+
+    def __init__(self, table: str, columns: Optional[List[str]] = None, chunk_size: int = CHUNK_SIZE):
+        self.table = table
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.batch = []
+
+    def add(self, record: Dict):
+        self.batch.append(record)
+        if len(self.batch) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        import pandas as pd
+
+        df = pd.DataFrame(self.batch)
+        self.batch = []
+        if self.columns is not None:
+            df = df[[column for column in df.columns if column in self.columns]]
+        self.chunks.append(compact_frame(df, self.table))
+
+    def frame(self):
+        if self.batch:
+            self._flush()
+        chunks, self.chunks = self.chunks, []
+        return concat_frames(chunks)
+
+
+def concat_frames(chunks: List):
+    """Concatenate compact frames, categorical columns stay categorical over the union of categories"""
+    import pandas as pd
+
+    chunks = [chunk for chunk in chunks if not chunk.empty]
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+
+    for name in chunks[0].columns:
+        if isinstance(chunks[0][name].dtype, pd.CategoricalDtype):
+            categories = chunks[0][name].cat.categories
+            for chunk in chunks[1:]:
+                if name not in chunk.columns:
+                    continue
+                new = chunk[name].cat.categories
+                categories = categories.append(new[~new.isin(categories)])
+            for chunk in chunks:
+                if name in chunk.columns:
+                    chunk[name] = chunk[name].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def frame_from_records(records: Iterable[Dict], table: str, columns: Optional[List[str]] = None,
+                       chunk_size: int = CHUNK_SIZE):
+    """Build a compact DataFrame from a stream of records"""
+    builder = FrameBuilder(table, columns, chunk_size)
+    for record in records:
+        builder.add(record)
+    return builder.frame()
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _JSONStream:
+    """Incremental reader over a JSON document, chunk_size characters at a time"""
+
+    def __init__(self, f, chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at end of file"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                return ''
+
+    def take(self, expected: str) -> str:
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Expected one of {expected!r} but found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._more():
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may be cut off
+            if end == len(self.buffer) and not self.eof and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(path: str, scalars: Optional[Dict] = None) -> Iterator[Tuple[str, Dict]]:
+    """
+    Stream (table, record) pairs out of a {"songs": [...], "comments": [...]} file
+    Top-level values that are not arrays (e.g. crawl_time) are skipped, or
+    stored in scalars when it's given.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = _JSONStream(f)
+        stream.take('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            key = stream.value()
+            stream.take(':')
+            if stream.peek() == '[':
+                stream.take('[')
+                if stream.peek() == ']':
+                    stream.take(']')
+                else:
+                    while True:
+                        yield key, stream.value()
+                        if stream.take(',]') == ']':
+                            break
+            elif scalars is not None:
+                scalars[key] = stream.value()
+            else:
+                stream.value()
+            if stream.take(',}') == '}':
+                return
+
+
+def _file_hash(paths: List[str]) -> str:
+    """SHA-1 over the contents of the given files, read in 1 MB blocks"""
+    digest = hashlib.sha1()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _projection(table: str, columns: Optional[List[str]]) -> List[str]:
+    """Known columns of a table, restricted to the requested ones"""
+    known = list(TABLES[table])
+    if columns is None:
+        return known
+    return [column for column in known if column in columns]
+
+
+class JSONStore:
+    """The original single-file JSON format"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def content_hash(self) -> str:
+        return _file_hash([self.path])
+
+    def read(self) -> Dict:
+        """Read the whole dataset as a dict of record lists, parsed record by record"""
+        data = {'songs': [], 'comments': []}
+        try:
+            for table, record in iter_json_records(self.path, data):
+                data.setdefault(table, []).append(record)
+        except FileNotFoundError:
+            print(f"Data file {self.path} not found")
+        return data
+
+    def iter_records(self, table: str, scalars: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream the records of one table without loading the whole file, see iter_json_records for scalars"""
+        for name, record in iter_json_records(self.path, scalars):
+            if name == table:
+                yield record
+
+    def read_frame(self, table: str, columns: Optional[List[str]] = None):
+        """Read one table as a compact DataFrame holding only the requested columns"""
+        return frame_from_records(self.iter_records(table), table, columns)
+
+    def read_frames(self, song_columns: Optional[List[str]] = None,
+                    comment_columns: Optional[List[str]] = None):
+        """Read songs and comments in a single streaming pass over the file"""
+        builders = {
+            'songs': FrameBuilder('songs', song_columns),
+            'comments': FrameBuilder('comments', comment_columns),
+        }
+        for table, record in iter_json_records(self.path):
+            if table in builders:
+                builders[table].add(record)
+        return builders['songs'].frame(), builders['comments'].frame()
+
+    def write(self, data: Dict):
+        """Replace the dataset"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def write_stream(self, tables: Dict[str, Iterable[Dict]], scalars: Optional[Dict] = None):
+        """
+        Replace the dataset with records written as they are read from tables
+        (in the same layout as write); scalars are written after the tables, so
+        they may be filled in while the tables are consumed
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{')
+            first_key = True
+            for table, records in tables.items():
+                f.write(f'{"" if first_key else ","}\n  {json.dumps(table)}: [')
+                first_key = False
+                first = True
+                for record in records:
+                    text = json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n    ')
+                    f.write(f'{"" if first else ","}\n    {text}')
+                    first = False
+                f.write(']' if first else '\n  ]')
+            for key, value in (scalars or {}).items():
+                text = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+                f.write(f'{"" if first_key else ","}\n  {json.dumps(key)}: {text}')
+                first_key = False
+            f.write('\n}' if not first_key else '}')
+        os.replace(tmp_path, self.path)
+
+    def append(self, data: Dict):
+        """Merge new records into the dataset"""
+        if os.path.exists(self.path):
+            data = merge_crawled_data(self.read(), data)
+        self.write(data)
+
+
+class JSONLinesStore:
+    """
+    One JSON object per line: {"table": "songs", "record": {...}}
+    Appending only adds lines; when a song ID repeats the last record wins.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def content_hash(self) -> str:
+        return _file_hash([self.path])
+
+    def iter_records(self, table: str) -> Iterator[Dict]:
+        """Stream the records of one table line by line"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('table') == table:
+                    yield entry['record']
+
+    def read(self) -> Dict:
+        """Read the whole dataset as a dict of record lists"""
+        data = {'songs': [], 'comments': []}
+        for table in TABLES:
+            data[table] = list(self.iter_records(table))
+        data['songs'] = list({song['id']: song for song in data['songs']}.values())
+        return data
+
+    def read_frame(self, table: str, columns: Optional[List[str]] = None):
+        """Read one table as a compact DataFrame holding only the requested columns"""
+        if table == 'songs' and columns is not None and 'id' not in columns:
+            df = frame_from_records(self.iter_records(table), table, list(columns) + ['id'])
+            if df.empty:
+                return df
+            return df.drop_duplicates('id', keep='last').drop(columns='id').reset_index(drop=True)
+
+        df = frame_from_records(self.iter_records(table), table, columns)
+        if table == 'songs' and not df.empty:
+            df = df.drop_duplicates('id', keep='last').reset_index(drop=True)
+        return df
+
+    def read_frames(self, song_columns: Optional[List[str]] = None,
+                    comment_columns: Optional[List[str]] = None):
+        return self.read_frame('songs', song_columns), self.read_frame('comments', comment_columns)
+
+    def _write_lines(self, f, data: Dict):
+        for table in TABLES:
+            for record in data.get(table, []):
+                f.write(json.dumps({'table': table, 'record': record}, ensure_ascii=False))
+                f.write('\n')
+
+    def write(self, data: Dict):
+        """Replace the dataset"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            self._write_lines(f, data)
+        os.replace(tmp_path, self.path)
+
+    def append(self, data: Dict, sync: bool = False):
+        """Append records to the end of the file, sync=True fsyncs before returning"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, 'a', encoding='utf-8') as f:
+            self._write_lines(f, data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class SQLiteStore:
+    """Typed, indexed tables in a single SQLite file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for writing, creates the file and its tables if needed"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            self._create_schema(conn)
+            self._initialized = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('PRAGMA journal_mode=WAL')
+        for table, columns in TABLES.items():
+            definition = ', '.join(f"{name} {'TEXT' if kind == 'JSON' else kind}"
+                                   for name, kind in columns.items())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({definition})")
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_comments_key ON comments (song_id, time, content)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_songs_publish_time ON songs (publish_time)')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.commit()
+
+    def _connect_readonly(self) -> Optional[sqlite3.Connection]:
+        """Read-only connection, None if the file doesn't exist or holds no music tables (nothing is created)"""
+        if not os.path.isfile(self.path):
+            return None
+        conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro", uri=True)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        except sqlite3.DatabaseError:
+            conn.close()
+            return None
+        if not set(TABLES) <= tables:
+            conn.close()
+            return None
+        return conn
+
+    def mtime(self) -> float:
+        # WAL mode writes land in the -wal file before a checkpoint
+        times = [os.path.getmtime(path) for path in (self.path, f"{self.path}-wal") if os.path.exists(path)]
+        return max(times) if times else 0.0
+
+    def content_hash(self) -> str:
+        return _file_hash([self.path, f"{self.path}-wal"])
+
+    def _encode(self, table: str, record: Dict) -> tuple:
+        row = []
+        for name, kind in TABLES[table].items():
+            value = record.get(name)
+            if kind == 'JSON':
+                value = json.dumps(value if value is not None else [], ensure_ascii=False)
+            row.append(value)
+        return tuple(row)
+
+    def _insert(self, conn: sqlite3.Connection, data: Dict):
+        for table, verb in (('songs', 'INSERT OR REPLACE'), ('comments', 'INSERT OR IGNORE')):
+            columns = list(TABLES[table])
+            placeholders = ', '.join('?' for _ in columns)
+            conn.executemany(
+                f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                (self._encode(table, record) for record in data.get(table, []))
+            )
+        if data.get('crawl_time') is not None:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('crawl_time', ?)", (str(data['crawl_time']),))
+
+    def append(self, data: Dict, sync: bool = True):
+        """
+        Insert new records, songs with an existing ID are replaced
+        sync=True makes the commit durable before returning (synchronous=FULL),
+        otherwise a power loss can drop the latest commits but never corrupts
+        the file (synchronous=NORMAL in WAL mode)
+        """
+        conn = self._connect()
+        conn.execute(f"PRAGMA synchronous={'FULL' if sync else 'NORMAL'}")
+        with conn:
+            self._insert(conn, data)
+        conn.close()
+
+    def write(self, data: Dict):
+        """Replace the dataset"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM songs')
+            conn.execute('DELETE FROM comments')
+            self._insert(conn, data)
+        conn.close()
+
+    def iter_records(self, table: str, scalars: Optional[Dict] = None) -> Iterator[Dict]:
+        """Stream the records of one table row by row, crawl_time goes into scalars when it's given"""
+        conn = self._connect_readonly()
+        if conn is None:
+            return
+        schema = TABLES[table]
+        columns = list(schema)
+        try:
+            for row in conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"):
+                record = dict(zip(columns, row))
+                for name in columns:
+                    if schema[name] == 'JSON':
+                        record[name] = json.loads(record[name]) if record[name] else []
+                yield record
+            if scalars is not None:
+                try:
+                    row = conn.execute("SELECT value FROM meta WHERE key = 'crawl_time'").fetchone()
+                except sqlite3.OperationalError:  # no meta table
+                    row = None
+                if row:
+                    scalars['crawl_time'] = float(row[0])
+        finally:
+            conn.close()
+
+    def read(self) -> Dict:
+        """Read the whole dataset as a dict of record lists"""
+        data = {}
+        for table in TABLES:
+            data[table] = list(self.iter_records(table, data))
+        return data
+
+    def read_frame(self, table: str, columns: Optional[List[str]] = None):
+        """Read one table as a DataFrame, only the requested columns are loaded"""
+        import pandas as pd
+
+        columns = _projection(table, columns)
+        if not columns:
+            return pd.DataFrame()
+        conn = self._connect_readonly()
+        if conn is None:
+            return pd.DataFrame()
+        try:
+            df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid", conn)
+        finally:
+            conn.close()
+        if df.empty:
+            return pd.DataFrame()
+
+        for name in columns:
+            if TABLES[table][name] == 'JSON':
+                df[name] = [json.loads(value) if value else [] for value in df[name]]
+        return compact_frame(df, table)
+
+    def read_frames(self, song_columns: Optional[List[str]] = None,
+                    comment_columns: Optional[List[str]] = None):
+        return self.read_frame('songs', song_columns), self.read_frame('comments', comment_columns)
+
+
+def is_shard_pattern(path: str) -> bool:
+    """Whether a data path names several shards: a directory or a glob pattern"""
+    return os.path.isdir(path) or any(char in path for char in '*?[')
+
+
+def is_music_store(path: str) -> bool:
+    """
+    Whether a file holds music data in one of the store formats
+    SQLite files must have the songs and comments tables, JSON files must start
+    like a dataset, so crawl state, label caches, HTTP caches and term indexes
+    in the same directory are not taken for shards. Nothing is written.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SHARD_EXTENSIONS or not os.path.isfile(path):
+        return False
+    try:
+        if extension in SQLITE_EXTENSIONS:
+            conn = SQLiteStore(path)._connect_readonly()
+            if conn is None:
+                return False
+            conn.close()
+            return True
+        with open(path, encoding='utf-8') as f:
+            head = f.read(4096)
+    except (OSError, sqlite3.Error, UnicodeDecodeError):
+        return False
+    pattern = _JSON_LINES_HEAD if extension in JSON_LINES_EXTENSIONS else _JSON_HEAD
+    return pattern.match(head) is not None
+
+
+def _shard_candidates(path: str) -> List[str]:
+    """Files of a directory or glob pattern that may be shards, sorted by name"""
+    pattern = os.path.join(path, '*') if os.path.isdir(path) else path
+    # Term indexes live next to the data, see analysis/term_index.py
+    return sorted(match for match in glob.glob(pattern) if not match.endswith('.terms.db'))
+
+
+def shard_paths(path: str) -> List[str]:
+    """Music data files of a directory or glob pattern, sorted by name (later shards are newer)"""
+    return [match for match in _shard_candidates(path) if is_music_store(match)]
+
+
+def data_exists(path: str) -> bool:
+    """Whether there is any data at a path, a file or a directory/glob of shards"""
+    return bool(shard_paths(path)) if is_shard_pattern(path) else os.path.exists(path)
+
+
+def _read_shard(args) -> Tuple:
+    """Songs and comments frames of one shard (runs in a worker process)"""
+    path, song_columns, comment_columns = args
+    return open_store(path).read_frames(song_columns, comment_columns)
+
+
+def _with_columns(columns: Optional[List[str]], required: List[str]) -> Optional[List[str]]:
+    """A column projection widened to include the required columns"""
+    if columns is None:
+        return None
+    return list(columns) + [column for column in required if column not in columns]
+
+
+class ShardedStore:
+    """
+    A directory or glob of data files read as one dataset
+    Shards are parsed in parallel, one per worker process, and concatenated
+    in name order. A song ID in several shards keeps its record from the last
+    one, comments repeated across shards are kept once.
+    """
+
+    def __init__(self, path: str, processes: Optional[int] = None):
+        self.path = path
+        self.processes = processes or os.cpu_count() or 1
+        # (directory mtime, shard paths) of the last listing
+        self._listing: Optional[Tuple[int, List[str]]] = None
+        # Path -> (mtime, size, is a music file), so unchanged files aren't reopened
+        self._checked: Dict[str, Tuple[int, int, bool]] = {}
+
+    def _directory(self) -> Optional[str]:
+        """The directory holding the shards, None when the pattern spans several"""
+        if os.path.isdir(self.path):
+            return self.path
+        directory = os.path.dirname(self.path) or '.'
+        return None if any(char in directory for char in '*?[') else directory
+
+    def _is_music_store(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        checked = self._checked.get(path)
+        if checked is None or checked[:2] != (stat.st_mtime_ns, stat.st_size):
+            checked = (stat.st_mtime_ns, stat.st_size, is_music_store(path))
+            self._checked[path] = checked
+        return checked[2]
+
+    def paths(self) -> List[str]:
+        """The shards, listed again only when the directory changed (a shard was added, removed or replaced)"""
+        directory = self._directory()
+        try:
+            stamp = os.stat(directory).st_mtime_ns if directory is not None else None
+        except OSError:
+            stamp = None
+        if stamp is not None and self._listing is not None and self._listing[0] == stamp:
+            return list(self._listing[1])
+
+        candidates = _shard_candidates(self.path)
+        self._checked = {path: checked for path, checked in self._checked.items() if path in candidates}
+        paths = [path for path in candidates if self._is_music_store(path)]
+        self._listing = (stamp, paths) if stamp is not None else None
+        return list(paths)
+
+    def mtime(self) -> float:
+        # Adding or removing a shard changes the directory's mtime; the shards
+        # themselves are only stat'ed, refresh_if_changed calls this per request
+        directory = self._directory()
+        times = [open_store(path).mtime() for path in self.paths()]
+        if directory is not None and os.path.isdir(directory):
+            times.append(os.path.getmtime(directory))
+        return max(times) if times else 0.0
+
+    def content_hash(self) -> str:
+        digest = hashlib.sha1()
+        for path in self.paths():
+            digest.update(f"{os.path.basename(path)}:{open_store(path).content_hash()}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def read(self) -> Dict:
+        """Read the whole dataset as a dict of record lists, merged shard by shard"""
+        data = {'songs': [], 'comments': []}
+        for path in self.paths():
+            data = merge_crawled_data(data, open_store(path).read())
+        return data
+
+    def read_frames(self, song_columns: Optional[List[str]] = None,
+                    comment_columns: Optional[List[str]] = None):
+        """Read every shard (in parallel with processes > 1) and merge songs and comments"""
+        paths = self.paths()
+        song_read = _with_columns(song_columns, ['id'])
+        comment_read = _with_columns(comment_columns, COMMENT_KEY)
+        tasks = [(path, song_read, comment_read) for path in paths]
+        if self.processes > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(paths))) as pool:
+                frames = list(pool.map(_read_shard, tasks))
+        else:
+            frames = [_read_shard(task) for task in tasks]
+
+        songs = concat_frames([shard_songs for shard_songs, _ in frames])
+        if 'id' in songs.columns:
+            songs = songs.drop_duplicates('id', keep='last').reset_index(drop=True)
+        if song_columns is not None and 'id' not in song_columns and 'id' in songs.columns:
+            songs = songs.drop(columns='id')
+
+        comments = concat_frames([shard_comments for _, shard_comments in frames])
+        key = [column for column in COMMENT_KEY if column in comments.columns]
+        if len(key) == len(COMMENT_KEY) and len(frames) > 1:
+            comments = comments.drop_duplicates(key, keep='first').reset_index(drop=True)
+        if comment_columns is not None:
+            comments = comments.drop(columns=[column for column in COMMENT_KEY
+                                              if column in comments.columns and column not in comment_columns])
+        return songs, comments
+
+    def write(self, data: Dict):
+        raise ValueError(f"A sharded dataset is read-only, write to one shard's file instead of {self.path}")
+
+    def append(self, data: Dict, sync: bool = False):
+        raise ValueError(f"A sharded dataset is read-only, append to one shard's file instead of {self.path}")
+
+
+def open_store(path: str):
+    """Pick a backend from the file extension, a directory or glob is a sharded dataset"""
+    if is_shard_pattern(path):
+        return ShardedStore(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in SQLITE_EXTENSIONS:
+        return SQLiteStore(path)
+    if extension in JSON_LINES_EXTENSIONS:
+        return JSONLinesStore(path)
+    return JSONStore(path)
+
+
+def is_writable(path: str) -> bool:
+    """Whether a dataset can be written or appended to at a path (a directory or glob of shards can't)"""
+    return not is_shard_pattern(path)
+
+
+def is_appendable(store) -> bool:
+    """Whether records can be appended to a store in place, without rewriting it"""
+    return isinstance(store, (JSONLinesStore, SQLiteStore))
+
+
+def convert_store(source: str, target: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Copy a dataset between backends, e.g. music_data.json -> music_data.db or .jsonl
+    JSON and SQLite sources are copied chunk_size records at a time; .jsonl
+    files and shards are read whole, since their songs must be deduplicated
+    """
+    if not is_writable(target):
+        raise ValueError(f"Can't convert into {target}, a directory or glob of shards is read-only")
+    started = time.time()
+    source_store, target_store = open_store(source), open_store(target)
+    counts = dict.fromkeys(TABLES, 0)
+
+    def records(table: str, scalars: Dict) -> Iterator[Dict]:
+        for record in source_store.iter_records(table, scalars):
+            counts[table] += 1
+            yield record
+
+    if isinstance(source_store, (JSONStore, SQLiteStore)):
+        scalars = {}
+        if isinstance(target_store, JSONStore):
+            target_store.write_stream({table: records(table, scalars) for table in TABLES}, scalars)
+        else:
+            target_store.write({'songs': [], 'comments': []})
+            for table in TABLES:
+                chunk = []
+                for record in records(table, scalars):
+                    chunk.append(record)
+                    if len(chunk) >= chunk_size:
+                        target_store.append({table: chunk})
+                        chunk = []
+                target_store.append(dict(scalars, **{table: chunk}))
+    else:
+        data = source_store.read()
+        target_store.write(data)
+        counts = {table: len(data.get(table, [])) for table in TABLES}
+    print(f"Converted {counts['songs']} songs and {counts['comments']} comments "
+          f"from {source} to {target} in {time.time() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert music data between storage backends')
+    parser.add_argument('source', help='e.g. data/music_data.json')
+    parser.add_argument('target', help='e.g. data/music_data.db')
+    args = parser.parse_args()
+
+    convert_store(args.source, args.target)
@@ -0,0 +1,93 @@
+"""
+Resumable and incremental crawling with CrawlState, against the local NetEase stub
+"""
+import pytest
+
+from benchmarks.netease_stub import NetEaseStub
+from crawler.crawl_state import CrawlState
+from crawler.dedup import CommentSamplingPolicy
+from crawler.netease_crawler import NetEaseMusicCrawler
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def stub():
+    stub = NetEaseStub(song_count=200, tracks_per_playlist=10, comments_per_song=8).start()
+    yield stub
+    stub.stop()
+
+
+def make_crawler(stub):
+    return NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=1000, burst=100)
+
+
+def crawl(crawler, state=None, incremental=False):
+    return crawler.crawl_music_data(num_playlists=6, songs_per_playlist=10, state=state, incremental=incremental,
+                                    checkpoint_every=1, comment_policy=CommentSamplingPolicy(every_n=3),
+                                    comments_per_song=5)
+
+
+def test_interrupted_crawl_resumes_where_it_stopped(stub, tmp_path):
+    expected = crawl(make_crawler(stub))
+    path = str(tmp_path / 'state.json')
+
+    crawler = make_crawler(stub)
+    requested = []
+    get_playlist_detail = crawler.get_playlist_detail
+
+    def fail_on_fourth(playlist_id):
+        requested.append(playlist_id)
+        if len(requested) == 4:
+            raise Interrupted()
+        return get_playlist_detail(playlist_id)
+
+    crawler.get_playlist_detail = fail_on_fourth
+    with pytest.raises(Interrupted):
+        crawl(crawler, CrawlState(path))
+
+    state = CrawlState(path)
+    assert state.run['playlists'] == ['1', '2', '3']
+    resumed = make_crawler(stub)
+    requested = []
+    resumed.get_playlist_detail = lambda playlist_id: requested.append(playlist_id) or get_playlist_detail(playlist_id)
+    data = crawl(resumed, state)
+
+    # Only the unfinished playlists are fetched again, the result covers the whole run
+    assert requested == ['4', '5', '6']
+    assert sorted(song['id'] for song in data['songs']) == sorted(song['id'] for song in expected['songs'])
+    assert len(data['comments']) == len(expected['comments'])
+    assert CrawlState(path).run is None
+
+
+def test_incremental_crawl_skips_unchanged_playlists_and_known_songs(stub, tmp_path):
+    path = str(tmp_path / 'state.json')
+    first = crawl(make_crawler(stub), CrawlState(path))
+    assert first['songs']
+    state = CrawlState(path)
+    assert state.songs == {str(song['id']) for song in first['songs']}
+
+    requests = stub.requests
+    assert crawl(make_crawler(stub), CrawlState(path), incremental=True)['songs'] == []
+    # Only the hot playlist list is requested
+    assert stub.requests == requests + 1
+
+    # A playlist with a new update time is crawled again, its known songs are not
+    state = CrawlState(path)
+    state.playlists['2'] = -1
+    state.save()
+    requests = stub.requests
+    data = crawl(make_crawler(stub), CrawlState(path), incremental=True)
+    assert stub.requests == requests + 2
+    assert data['songs'] == [] and data['comments'] == []
+    assert CrawlState(path).playlists['2'] == 2
+
+
+def test_comment_offsets_continue_across_runs(tmp_path):
+    state = CrawlState(str(tmp_path / 'state.json'))
+    state.start_run()
+    state.add_comments(7, [{'content': 'a'}, {'content': 'b'}])
+    state.save()
+    assert CrawlState(state.path).comment_offset(7) == 2
@@ -0,0 +1,110 @@
+"""
+Crawler tests against the local NetEase stub (benchmarks/netease_stub.py)
+"""
+import time
+from collections import Counter
+
+import pytest
+
+from benchmarks.netease_stub import NetEaseStub
+from crawler.dedup import CommentSamplingPolicy
+from crawler.netease_crawler import NetEaseMusicCrawler
+from crawler.rate_limiter import HostRateLimiter, TokenBucket
+
+
+@pytest.fixture(scope='module')
+def stub():
+    stub = NetEaseStub(song_count=300, tracks_per_playlist=15, comments_per_song=25).start()
+    yield stub
+    stub.stop()
+
+
+def crawl(stub, concurrent: bool):
+    crawler = NetEaseMusicCrawler(base_url=stub.base_url, max_workers=4, rate_limit=1000, burst=100)
+    # Sample every song, which songs every_n picks depends on arrival order
+    return crawler.crawl_music_data(num_playlists=6, songs_per_playlist=15, concurrent=concurrent,
+                                    comment_policy=CommentSamplingPolicy(every_n=1), comments_per_song=30)
+
+
+def test_sequential_and_concurrent_crawls_collect_the_same_data(stub):
+    sequential = crawl(stub, concurrent=False)
+    concurrent = crawl(stub, concurrent=True)
+
+    for data in (sequential, concurrent):
+        ids = [song['id'] for song in data['songs']]
+        assert ids and len(ids) == len(set(ids))
+        keys = [(comment['song_id'], comment['time'], comment['content']) for comment in data['comments']]
+        assert len(keys) == len(set(keys))
+
+    def songs(data):
+        return {song['id']: dict(song, playlists=sorted(song['playlists'])) for song in data['songs']}
+
+    def comments(data):
+        return Counter(tuple(sorted(comment.items())) for comment in data['comments'])
+
+    assert songs(sequential) == songs(concurrent)
+    assert comments(sequential) == comments(concurrent)
+    # comments_per_song=30 pages past the stub's 25 comments per song
+    assert len(sequential['comments']) == 25 * len(sequential['songs'])
+
+
+def test_5xx_is_retried_with_backoff(monkeypatch):
+    stub = NetEaseStub(song_count=50, failures=2).start()
+    sleeps = []
+    monkeypatch.setattr('crawler.netease_crawler.random.uniform', lambda low, high: 1.0)
+    monkeypatch.setattr('crawler.netease_crawler.time.sleep', sleeps.append)
+    try:
+        crawler = NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=1000, burst=100,
+                                      max_retries=2, backoff=0.5)
+        assert len(crawler.get_hot_playlists(limit=3)) == 3
+        assert stub.requests == 3
+        assert sleeps == [0.5, 1.0]
+
+        # One failure more than the retries: the last 503 is returned
+        stub.failures = 3
+        stub.failed.clear()
+        sleeps.clear()
+        assert crawler.get_hot_playlists(limit=3) == []
+        assert stub.requests == 6 and sleeps == [0.5, 1.0]
+    finally:
+        stub.stop()
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=50, burst=5)
+    started = time.monotonic()
+    for _ in range(15):
+        bucket.acquire()
+    # The burst goes at once, the other 10 tokens take 10 / 50 s
+    assert time.monotonic() - started >= 10 / 50 * 0.9
+
+
+def test_crawler_requests_are_paced_per_host(stub):
+    crawler = NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=40, burst=2)
+    started = time.monotonic()
+    for playlist_id in range(1, 11):
+        crawler.get_playlist_detail(str(playlist_id))
+    assert time.monotonic() - started >= 8 / 40 * 0.9
+
+    limiter = HostRateLimiter(rate=1, burst=1)
+    limiter.acquire('http://a.example/x')
+    started = time.monotonic()
+    limiter.acquire('http://b.example/x')
+    # Another host has its own bucket and doesn't wait
+    assert time.monotonic() - started < 0.5
+
+
+def test_truncated_playlists_are_completed_with_batched_song_details():
+    full = NetEaseStub(song_count=300, tracks_per_playlist=15).start()
+    truncated = NetEaseStub(song_count=300, tracks_per_playlist=15, inline_tracks=4).start()
+    try:
+        expected = NetEaseMusicCrawler(base_url=full.base_url, rate_limit=1000, burst=100)
+        crawler = NetEaseMusicCrawler(base_url=truncated.base_url, rate_limit=1000, burst=100)
+        for playlist_id in ('1', '2'):
+            tracks = crawler.fetch_playlist_tracks(playlist_id, limit=12)
+            assert tracks == expected.fetch_playlist_tracks(playlist_id, limit=12) and len(tracks) == 12
+        # One playlist request and one song detail batch per playlist
+        assert truncated.requests == 4
+    finally:
+        full.stop()
+        truncated.stop()
@@ -0,0 +1,23 @@
+"""
+Cross-playlist song deduplication
+"""
+from crawler.dedup import SongIndex
+
+
+def test_song_in_several_playlists_is_kept_once():
+    index = SongIndex()
+    song, is_new = index.add({'id': 1, 'name': 'a'}, 'p1')
+    assert is_new
+    again, is_new = index.add({'id': 1, 'name': 'a (other playlist)'}, 'p2')
+    assert not is_new and again is song
+    index.add({'id': 1, 'name': 'a'}, 'p2')
+    assert index.songs() == [{'id': 1, 'name': 'a', 'playlists': ['p1', 'p2']}]
+    assert len(index) == 1 and 1 in index
+
+
+def test_streaming_index_returns_copies():
+    index = SongIndex(keep_records=False)
+    first, _ = index.add({'id': 1}, 'p1')
+    second, _ = index.add({'id': 1}, 'p2')
+    assert first['playlists'] == ['p1'] and second['playlists'] == ['p1', 'p2']
+    assert index.songs() == []
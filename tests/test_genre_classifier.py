@@ -0,0 +1,45 @@
+"""
+Regression tests for the vectorized genre classifier
+"""
+import numpy as np
+import pandas as pd
+
+from analysis.genre_classifier import DEFAULT_GENRE_KEYWORDS, OTHER_GENRE, GenreClassifier
+
+
+def classify_row(name, album):
+    """The original row-wise classification of str(name) + ' ' + str(album)"""
+    text = f"{name} {album}".lower()
+    for genre, keywords in DEFAULT_GENRE_KEYWORDS.items():
+        if any(keyword.lower() in text for keyword in keywords):
+            return genre
+    return OTHER_GENRE
+
+
+def test_missing_names_and_albums():
+    names = pd.Series(['Rock Song', None, '安静', np.nan, 'Jazz Night', None], dtype=object)
+    albums = pd.Series([None, '流行金曲', None, 'Rock 合集', None, None], dtype=object)
+    genres = GenreClassifier().classify(names, albums)
+    assert genres.tolist() == ['摇滚', '流行', OTHER_GENRE, '摇滚', '爵士', OTHER_GENRE]
+
+
+def test_missing_album_does_not_borrow_another_albums_genre():
+    # The last distinct album is a rock album; a song without an album must not inherit it
+    names = pd.Series(['a', 'b'], dtype=object)
+    albums = pd.Series([None, 'Rock 合集'], dtype=object)
+    assert GenreClassifier().classify(names, albums).tolist() == [OTHER_GENRE, '摇滚']
+
+
+def test_matches_row_wise_classification():
+    rng = np.random.default_rng(0)
+    words = ['Pop', 'rock', '民谣', 'EDM', 'Hip-Hop', '爵士', '情歌', 'Live', None]
+    names = pd.Series(rng.choice(np.array(words, dtype=object), 500), dtype=object)
+    albums = pd.Series(rng.choice(np.array(words, dtype=object), 500), dtype=object)
+    expected = [classify_row(name, album) for name, album in zip(names, albums)]
+    assert GenreClassifier().classify(names, albums).tolist() == expected
+
+
+def test_categorical_albums_with_missing_values():
+    names = pd.Series(['a', 'b', None], dtype=object)
+    albums = pd.Series(['Rock 合集', None, 'Jazz'], dtype='category')
+    assert GenreClassifier().classify(names, albums).tolist() == ['摇滚', OTHER_GENRE, '爵士']
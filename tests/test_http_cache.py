@@ -0,0 +1,100 @@
+"""
+The crawler's HTTP response cache, against the local NetEase stub
+"""
+import time
+
+import pytest
+import requests
+
+from benchmarks.netease_stub import NetEaseStub
+from crawler.http_cache import HTTPCache
+from crawler.netease_crawler import NetEaseMusicCrawler
+
+
+@pytest.fixture
+def stub():
+    stub = NetEaseStub(song_count=100, tracks_per_playlist=5, comments_per_song=10).start()
+    yield stub
+    stub.stop()
+
+
+def make_crawler(stub, cache):
+    return NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=1000, burst=100, cache=cache)
+
+
+def response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    return response
+
+
+def test_comments_are_revalidated_with_etag(stub, tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'))
+    crawler = make_crawler(stub, cache)
+    first = crawler.get_song_comments('1', limit=10)
+    # Comment pages have a TTL of 0, the second request is conditional
+    second = crawler.get_song_comments('1', limit=10)
+    assert first == second and first['comments']
+    assert stub.requests == 2 and stub.not_modified == 1
+    assert cache.stats['misses'] == 1 and cache.stats['revalidated'] == 1
+
+
+def test_entries_are_served_until_their_ttl_runs_out(stub, tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'), ttls={'/api/playlist/detail': 0.3})
+    crawler = make_crawler(stub, cache)
+    detail = crawler.get_playlist_detail('1')
+    assert crawler.get_playlist_detail('1') == detail
+    assert stub.requests == 1 and cache.stats['hits'] == 1
+
+    time.sleep(0.4)
+    assert crawler.get_playlist_detail('1') == detail
+    assert stub.requests == 2 and stub.not_modified == 1
+    # The 304 renewed the entry
+    assert crawler.get_playlist_detail('1') == detail
+    assert stub.requests == 2 and cache.stats['hits'] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'), max_bytes=250)
+    for name in 'abc':
+        cache.store('/api/song/detail', f"http://x/{name}", response(b'x' * 100))
+        time.sleep(0.01)
+    # Two bodies fit, the oldest goes
+    assert cache.lookup('http://x/a') is None
+    cache.store('/api/song/detail', 'http://x/a', response(b'x' * 100))
+    assert [name for name in 'abc' if cache.lookup(f"http://x/{name}")] == ['a', 'c']
+    assert cache.bytes == 200 and cache.stats['evictions'] == 2
+
+
+def test_touched_entry_outlives_older_ones(tmp_path):
+    cache = HTTPCache(str(tmp_path / 'cache.db'), max_bytes=250)
+    cache.store('/api/song/detail', 'http://x/a', response(b'x' * 100))
+    time.sleep(0.01)
+    cache.store('/api/song/detail', 'http://x/b', response(b'x' * 100))
+    time.sleep(0.01)
+    cache._touch('http://x/a')
+    time.sleep(0.01)
+    cache.store('/api/song/detail', 'http://x/c', response(b'x' * 100))
+    assert cache.lookup('http://x/a') is not None
+    assert cache.lookup('http://x/b') is None
+    assert cache.lookup('http://x/c') is not None
+
+
+def test_offline_replay_needs_no_server(stub, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    crawler = make_crawler(stub, HTTPCache(path))
+    data = crawler.crawl_music_data(num_playlists=3, songs_per_playlist=5)
+    assert data['songs']
+
+    requests_before = stub.requests
+    replay = make_crawler(stub, HTTPCache(path, offline=True))
+    replayed = replay.crawl_music_data(num_playlists=3, songs_per_playlist=5)
+    assert stub.requests == requests_before
+    assert replayed['songs'] == data['songs'] and replayed['comments'] == data['comments']
+
+    # A miss fails instead of going to the network
+    with pytest.raises(requests.ConnectionError):
+        replay.cache.request('/api/playlist/detail', f"{stub.base_url}/api/playlist/detail", {'id': 99},
+                             {}, lambda headers: pytest.fail('offline cache sent a request'))
+    assert stub.requests == requests_before
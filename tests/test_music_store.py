@@ -0,0 +1,106 @@
+"""
+Tests for the storage backends
+"""
+import pytest
+
+from crawler.pipeline import StoreSink
+from storage.music_store import ShardedStore, convert_store, is_appendable, is_writable, open_store
+
+
+def test_sharded_store_is_read_only(tmp_path):
+    open_store(str(tmp_path / 'a.jsonl')).write({'songs': [{'id': 1, 'name': 'a'}], 'comments': []})
+    store = open_store(str(tmp_path))
+    assert isinstance(store, ShardedStore)
+    assert not is_writable(str(tmp_path)) and not is_appendable(store)
+    with pytest.raises(ValueError):
+        store.write({'songs': [], 'comments': []})
+    with pytest.raises(ValueError):
+        store.append({'songs': [], 'comments': []})
+    with pytest.raises(ValueError):
+        StoreSink(str(tmp_path))
+    with pytest.raises(ValueError):
+        convert_store(str(tmp_path / 'a.jsonl'), str(tmp_path / '*.db'))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a.jsonl']
+
+
+def test_sharded_mtime_reopens_only_new_shards(tmp_path, monkeypatch):
+    import storage.music_store as music_store
+
+    for name in ('a.jsonl', 'b.db'):
+        open_store(str(tmp_path / name)).write({'songs': [{'id': 1, 'name': name}], 'comments': []})
+    (tmp_path / 'crawl_state.json').write_text('{"playlists": {}}', encoding='utf-8')
+    opened = []
+    is_music_store = music_store.is_music_store
+    monkeypatch.setattr(music_store, 'is_music_store', lambda path: opened.append(path) or is_music_store(path))
+
+    store = ShardedStore(str(tmp_path))
+    first = store.mtime()
+    assert len(opened) == 3 and len(store.paths()) == 2
+    opened.clear()
+    assert store.mtime() == first and opened == []
+
+    open_store(str(tmp_path / 'c.jsonl')).write({'songs': [{'id': 2, 'name': 'c'}], 'comments': []})
+    store.mtime()
+    assert opened == [str(tmp_path / 'c.jsonl')]
+    assert [path.rsplit('/', 1)[1] for path in store.paths()] == ['a.jsonl', 'b.db', 'c.jsonl']
+
+
+def test_sqlite_append_sync_sets_synchronous(tmp_path, monkeypatch):
+    import sqlite3
+
+    statements = []
+    connect = sqlite3.connect
+
+    def traced(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(sqlite3, 'connect', traced)
+    store = open_store(str(tmp_path / 'music.db'))
+    store.append({'songs': [{'id': 1, 'name': 'a'}], 'comments': []}, sync=False)
+    store.append({'songs': [{'id': 2, 'name': 'b'}], 'comments': []})
+    assert [s for s in statements if s.startswith('PRAGMA synchronous')] == [
+        'PRAGMA synchronous=NORMAL', 'PRAGMA synchronous=FULL']
+    assert [song['id'] for song in store.read()['songs']] == [1, 2]
+
+
+def test_convert_round_trip_streams_chunks(tmp_path):
+    data = {
+        'songs': [{'id': i, 'name': f"歌{i}", 'artists': ['a', 'b'], 'album': 'x', 'album_type': 'EP',
+                   'publish_time': i * 1000, 'duration': 200000, 'popularity': i % 100, 'playlists': [1]}
+                  for i in range(1, 8)],
+        'comments': [{'song_id': i % 7 + 1, 'song_name': 'x', 'content': f"评论{i}", 'time': i, 'liked_count': i}
+                     for i in range(11)],
+        'crawl_time': 1700000000.5,
+    }
+    source = str(tmp_path / 'music.json')
+    open_store(source).write(data)
+    paths = [source]
+    for name in ('music.db', 'music.jsonl', 'copy.db', 'copy.json'):
+        paths.append(str(tmp_path / name))
+        convert_store(paths[-2], paths[-1], chunk_size=3)
+    tables = {table: data[table] for table in ('songs', 'comments')}
+    for path in paths[1:]:
+        read = open_store(path).read()
+        assert {table: read[table] for table in tables} == tables
+    assert open_store(paths[1]).read()['crawl_time'] == data['crawl_time']
+    # JSON to SQLite to JSON keeps crawl_time; .jsonl has nowhere to keep it
+    convert_store(paths[1], str(tmp_path / 'back.json'))
+    with open(source, encoding='utf-8') as f, open(tmp_path / 'back.json', encoding='utf-8') as g:
+        assert f.read() == g.read()
+
+
+def test_compact_frame_keeps_fractional_and_missing_values():
+    import pandas as pd
+
+    from storage.music_store import compact_frame
+
+    df = compact_frame(pd.DataFrame({'id': [1, 2, 3], 'popularity': [95, None, 40]}), 'songs')
+    assert str(df['popularity'].dtype) == 'Int16' and df['popularity'].isna().tolist() == [False, True, False]
+    df = compact_frame(pd.DataFrame({'id': [1, 2, 3], 'popularity': [95.5, None, 40]}), 'songs')
+    assert df['popularity'].dtype == 'float64' and df['popularity'].iloc[0] == 95.5
+    df = compact_frame(pd.DataFrame({'id': [1, 2], 'popularity': [7.25, 40000], 'duration': [1.0, 2.0]}), 'songs')
+    assert df['popularity'].tolist() == [7.25, 40000.0] and str(df['duration'].dtype) == 'int32'
+    df = compact_frame(pd.DataFrame({'song_id': [1], 'liked_count': [None]}), 'comments')
+    assert df['liked_count'].tolist() == [0] and str(df['liked_count'].dtype) == 'int64'
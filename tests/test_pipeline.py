@@ -0,0 +1,54 @@
+"""
+Streaming a crawl into a store with CrawlPipeline
+"""
+import pytest
+
+from benchmarks.netease_stub import NetEaseStub
+from crawler.crawl_state import CrawlState
+from crawler.netease_crawler import NetEaseMusicCrawler
+from crawler.pipeline import CrawlPipeline, StoreSink
+from storage.music_store import open_store
+
+
+@pytest.fixture
+def stub():
+    stub = NetEaseStub(song_count=200, tracks_per_playlist=10, comments_per_song=8).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.mark.parametrize('extension', ['jsonl', 'db'])
+def test_store_is_flushed_before_each_checkpoint(stub, tmp_path, extension):
+    path = str(tmp_path / f"music.{extension}")
+    state = CrawlState(str(tmp_path / 'state.json'))
+    sink = StoreSink(path, batch_size=1000)
+    events = []
+    flush, save = sink.flush, state.save
+
+    def logged_flush(sync=False, **extra):
+        events.append(('flush', sync))
+        flush(sync=sync, **extra)
+
+    def checked_save():
+        # Everything the state says was collected is already in the store
+        stored = {str(song['id']) for song in open_store(path).read()['songs']}
+        assert state.songs <= stored
+        events.append(('save', len(state.songs)))
+        save()
+
+    sink.flush = logged_flush
+    state.save = checked_save
+    crawler = NetEaseMusicCrawler(base_url=stub.base_url, rate_limit=1000, burst=100)
+    stats = CrawlPipeline(crawler, sink, state, checkpoint_every=2).run(num_playlists=6, songs_per_playlist=10)
+
+    saves = [i for i, event in enumerate(events) if event[0] == 'save']
+    # Every 2nd of 6 playlists, the final checkpoint, then finish_run's save
+    assert len(saves) == 5 and stats['checkpoints'] == 4
+    for i in saves[:4]:
+        assert events[i - 1] == ('flush', True)
+    assert len(open_store(path).read()['songs']) == stats['songs'] > 0
+
+
+def test_sink_rejects_stores_it_cannot_append_to(tmp_path):
+    with pytest.raises(ValueError):
+        StoreSink(str(tmp_path / 'music.json'))
@@ -0,0 +1,24 @@
+"""
+Tests for the sampling profiler's handling of the process-wide switch interval
+"""
+import sys
+
+from monitoring.profiler import SamplingProfiler
+
+
+def test_overlapping_profilers_restore_the_original_switch_interval():
+    original = sys.getswitchinterval()
+    first = SamplingProfiler(interval=0.001).start()
+    second = SamplingProfiler(interval=0.002).start()
+    first.stop()
+    assert sys.getswitchinterval() == min(original, 0.002)
+    second.stop()
+    assert sys.getswitchinterval() == original
+
+
+def test_stop_twice_is_harmless():
+    original = sys.getswitchinterval()
+    profiler = SamplingProfiler(interval=0.001).start()
+    profiler.stop()
+    profiler.stop()
+    assert sys.getswitchinterval() == original
@@ -0,0 +1,84 @@
+"""
+The batched, cached API path of SentimentAnalyzer, with a stand-in for the HTTP session
+"""
+import json
+import re
+
+from analysis.label_cache import LabelCache
+from analysis.sentiment_analyzer import SentimentAnalyzer
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        if isinstance(self.body, str):
+            raise ValueError('not JSON')
+        return self.body
+
+
+class FakeSession:
+    """Labels every comment positive, unless a comment names a failure to return instead"""
+
+    def __init__(self):
+        self.chunks = []
+        self.verify = True
+
+    def post(self, url, headers, data, timeout):
+        prompt = json.loads(data)['messages'][1]['content']
+        comments = re.findall(r'^\d+\. (.*)$', prompt, re.MULTILINE)
+        self.chunks.append(comments)
+        if any('bad json' in comment for comment in comments):
+            return FakeResponse(200, '<html>502 Bad Gateway</html>')
+        if any('rejected' in comment for comment in comments):
+            return FakeResponse(400, {})
+        content = json.dumps({'labels': ['positive'] * len(comments)})
+        return FakeResponse(200, {'choices': [{'message': {'content': f"```json\n{content}\n```"}}]})
+
+
+def make_analyzer(tmp_path, chunk_size=3):
+    analyzer = SentimentAnalyzer(chunk_size=chunk_size, max_workers=2, max_retries=1, backoff=0,
+                                 label_cache=LabelCache(str(tmp_path / 'labels.db')))
+    analyzer.session = FakeSession()
+    return analyzer
+
+
+def test_comments_are_sent_in_chunks_once_each(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    comments = [f"评论{i}" for i in range(7)] + ['评论0', None]
+    assert analyzer.classify_comments(comments) == ['positive'] * 9
+    chunks = analyzer.session.chunks
+    assert [len(chunk) for chunk in chunks] == [3, 3, 2]
+    assert sorted(comment for chunk in chunks for comment in chunk) == sorted([f"评论{i}" for i in range(7)] + [''])
+
+
+def test_cached_labels_are_not_requested_again(tmp_path):
+    analyzer = make_analyzer(tmp_path)
+    analyzer.classify_comments(['一', '二'])
+    analyzer.session.chunks.clear()
+    assert analyzer.classify_comments(['二', '三', '一']) == ['positive'] * 3
+    assert analyzer.session.chunks == [['三']]
+
+
+def test_failed_chunks_fall_back_to_the_scorer_and_are_retried_later(tmp_path):
+    analyzer = make_analyzer(tmp_path, chunk_size=2)
+    comments = ['好', '一般', 'bad json 太难听了', '讨厌 bad json', 'rejected 难听', '还行']
+    labels = analyzer.classify_comments(comments)
+    assert labels[:2] == ['positive', 'positive']
+    # Non-JSON and rejected chunks are labeled by the rule-based scorer
+    assert labels[2:] == list(analyzer.scorer.label(analyzer.scorer.score(comments[2:])))
+    # The non-JSON chunk was retried, the 400 was not
+    assert len(analyzer.session.chunks) == 4
+
+    # Fallback labels aren't cached, the API is asked again
+    analyzer.session.chunks.clear()
+    analyzer.classify_comments(comments)
+    assert sorted(comment for chunk in analyzer.session.chunks for comment in chunk) == sorted(
+        comments[2:] + comments[2:4])
+
+
+def test_verify_is_configurable():
+    assert SentimentAnalyzer().session.verify is True
+    assert SentimentAnalyzer(verify='/etc/ssl/ca.pem').session.verify == '/etc/ssl/ca.pem'
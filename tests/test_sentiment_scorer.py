@@ -0,0 +1,33 @@
+"""
+Negation handling of the lexicon sentiment scorer
+"""
+import pytest
+
+from analysis.sentiment_scorer import SentimentScorer
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('很喜欢这种风格', 'positive'),
+    ('不太喜欢', 'negative'),
+    ('并不喜欢', 'negative'),
+    ('没有人不喜欢', 'positive'),
+    ('不是不好', 'positive'),
+    ('这首歌好不好', 'positive'),
+    ('好听好不好！', 'positive'),
+    ('不好不差', 'neutral'),
+    ('我不知道为什么不喜欢', 'negative'),
+    ('不讨厌', 'positive'),
+    ('一般般吧', 'neutral'),
+])
+def test_negation_scope(text, expected):
+    scorer = SentimentScorer()
+    assert scorer.label(scorer.score([text]))[0] == expected
+
+
+def test_negation_does_not_cross_comments():
+    scorer = SentimentScorer()
+    assert list(scorer.label(scorer.score(['没有', '不', '喜欢', '不喜欢']))) == [
+        'neutral', 'neutral', 'positive', 'negative']
+    # Scoring a batch gives the same labels as one comment at a time
+    texts = ['没有人不喜欢', '好不好', '不', '好', '并不喜欢', '不是不好']
+    assert list(scorer.score(texts)) == [scorer.score([text])[0] for text in texts]
@@ -0,0 +1,148 @@
+"""
+Production entry point for the dashboard
+The data is loaded once in the master process before the workers are forked,
+so the frames and precomputed responses are shared copy-on-write instead of
+being loaded again by every worker.
+
+With gunicorn:
+    gunicorn -c gunicorn.conf.py wsgi:app
+Without extra dependencies (pre-forked Werkzeug servers):
+    python wsgi.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import threading
+import time
+from typing import List
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app import app, startup
+
+
+class RequestHandler(WSGIRequestHandler):
+    """Request handler that drops idle keep-alive connections so workers can stop"""
+
+    timeout = 15
+    access_log = False
+
+    def log_request(self, *args, **kwargs):
+        if self.access_log:
+            super().log_request(*args, **kwargs)
+
+
+class PreforkServer:
+    """
+    A listening socket shared by forked worker processes, each running a threaded server
+    The master watches the data file; when it changes, the master loads the
+    new snapshot and replaces the workers so they inherit it.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8000, workers: int = 4):
+        self.workers = workers
+        self.server = make_server(host, port, app, threaded=True, request_handler=RequestHandler)
+        # Workers race for connections; the losers go back to select() instead of blocking in accept()
+        self.server.socket.setblocking(False)
+        # Finish in-flight requests on shutdown
+        self.server.daemon_threads = False
+        self.pids: List[int] = []
+        self.running = True
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+
+        # Worker: serve until the master asks us to stop
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=self.server.shutdown, daemon=True).start())
+        try:
+            self.server.serve_forever()
+        finally:
+            os._exit(0)
+
+    def _start_workers(self) -> List[int]:
+        # Keep the loaded objects out of the collector's way so it doesn't
+        # touch (and copy) their pages in the workers
+        gc.freeze()
+        return [self._spawn() for _ in range(self.workers)]
+
+    def _stop(self, *_):
+        self.running = False
+
+    def _reap(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if pid in self.pids:
+                self.pids.remove(pid)
+                if self.running:
+                    print(f"Worker {pid} exited, starting a new one")
+                    self.pids.append(self._spawn())
+
+    def _wait_until_ready(self):
+        """Answer health checks from the master while the data loads, then return the reloader"""
+        # Workers are forked only after the load so they share the data
+        self.server.timeout = 0.2
+        while startup.loading:
+            self.server.handle_request()
+        return startup.wait()
+
+    def serve_forever(self):
+        print(f"Listening on http://{self.server.server_address[0]}:{self.server.server_port}, loading data")
+        reloader = self._wait_until_ready()
+        # The master polls the data file itself, workers never run a watcher thread
+        reloader.stop()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self.pids = self._start_workers()
+        print(f"Serving on http://{self.server.server_address[0]}:{self.server.server_port} "
+              f"with {self.workers} workers (master {os.getpid()})")
+
+        next_check = time.monotonic() + reloader.interval
+        while self.running:
+            time.sleep(0.5)
+            self._reap()
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + reloader.interval
+                try:
+                    swapped = reloader.check()
+                except Exception as e:
+                    print(f"Error watching {reloader.data_file}: {e}")
+                    swapped = False
+                if swapped and self.running:
+                    old = self.pids
+                    self.pids = self._start_workers()
+                    for pid in old:
+                        os.kill(pid, signal.SIGTERM)
+
+        for pid in self.pids:
+            os.kill(pid, signal.SIGTERM)
+        for pid in self.pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the dashboard with pre-forked workers')
+    parser.add_argument('--host', default=os.environ.get('MUSIC_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('MUSIC_PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('MUSIC_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--access-log', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    RequestHandler.access_log = args.access_log
+    PreforkServer(args.host, args.port, args.workers).serve_forever()
+
+
+if __name__ == '__main__':
+    main()